@@ -0,0 +1,89 @@
+"""
+Benchmark of the board synchronization time (`Dcs5Controller.init_controller_and_board`), full and
+differential (only the settings that differ are sent).
+
+The board is replaced by a responder thread on a socket pair which answers every command after a
+configurable processing delay.
+
+Usage: python benchmarks/bench_command_sync.py [board_latency_ms ...]
+"""
+import logging
+import re
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from dcs5.controller import Dcs5Controller
+
+DEFAULT_CONFIGS = Path(__file__).resolve().parents[1].joinpath('dcs5/default_configs')
+CONFIG_PATH = DEFAULT_CONFIGS.joinpath('xt_controller_configuration.json')
+DEVICES_SPECIFICATIONS_PATH = DEFAULT_CONFIGS.joinpath('xt_devices_specification.json')
+
+REPEAT = 5
+
+
+def board_reply(command: str) -> list:
+    match command:
+        case '&a#':
+            return ['%a#']
+        case 'b#':
+            return ['%b:DCS5,0200,XT#']
+        case '&u#':
+            return ['%u:1#']
+        case '&q#':
+            return ['%q:80,0#']
+        case '&t#':
+            return ['%t,22,40#']
+        case '&pl,0#':
+            return ['HostApp=DCSLinkstream', '%pl,0#']
+    tag, args = re.fullmatch(r'&(\w+?)(?:,(.*))?#', command).groups()
+    if args is None:
+        return [f'%{tag}#']
+    separator = ':' if tag in ('sn', 'di', 'dm', 'dn') else ','
+    return [f'%{tag}{separator}{args}#']
+
+
+def run_board(sock: socket.socket, latency: float):
+    buffer = ""
+    while data := sock.recv(1024):
+        buffer += data.decode()
+        *commands, buffer = buffer.split('#')
+        for command in commands:
+            time.sleep(latency)
+            for reply in board_reply(command + '#'):
+                sock.sendall((reply + '\r').encode())
+
+
+def sync_time(latency: float, full: bool) -> float:
+    controller = Dcs5Controller(CONFIG_PATH, DEVICES_SPECIFICATIONS_PATH)
+    controller_socket, board_socket = socket.socketpair()
+    controller.client.attach(controller_socket, 1)
+    threading.Thread(target=run_board, args=(board_socket, latency), daemon=True).start()
+
+    controller.start_listening()
+    controller.wait_for_initialization_ping()
+    times = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        controller.init_controller_and_board(full=full)
+        times.append(time.perf_counter() - start)
+        assert controller.is_sync
+    controller.stop_listening()
+    controller.client.close()
+    return min(times)
+
+
+def main(*latencies_ms: float):
+    logging.disable(logging.CRITICAL)
+    for latency_ms in latencies_ms or (0, 5, 20):
+        print(f"board latency {latency_ms:5.1f} ms : "
+              f"full sync {sync_time(latency_ms / 1000, full=True) * 1000:7.1f} ms, "
+              f"differential sync {sync_time(latency_ms / 1000, full=False) * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main(*map(float, sys.argv[1:]))
@@ -0,0 +1,108 @@
+"""
+Benchmark of the board connection time (`BluetoothClient.connect`).
+
+The board is replaced by a TCP server listening on one port of the RFCOMM range (`TcpClient`). Each connection
+attempt on a port is delayed to emulate the RFCOMM connection latency.
+
+Compared:
+    sequential : ports tried one after another (previous behavior).
+    probe      : ports probed concurrently (no cached port).
+    cached     : the last connected port is tried first.
+
+Usage: python benchmarks/bench_connect.py [board_port] [port_latency_ms]
+"""
+import logging
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import *
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from dcs5.bluetooth_client import TcpClient
+
+HOST = '127.0.0.1'
+REPEAT = 5
+
+
+class SlowTcpClient(TcpClient):
+    def __init__(self, base_port: int, latency: float):
+        super().__init__(base_port)
+        self.latency = latency
+
+    def _connect_port(self, port, timeout):
+        time.sleep(self.latency)
+        return super()._connect_port(port, timeout)
+
+
+def sequential_connect(client: SlowTcpClient, timeout: float):
+    for port in range(client.min_port, client.max_port + 1):
+        sock, _ = client._connect_port(port, timeout)
+        if sock is not None:
+            client.attach(sock, port)
+            return
+
+
+def find_base_port(board_port: int) -> Tuple[socket.socket, int]:
+    """Returns a listening server and the base port for which the server is on RFCOMM port `board_port`."""
+    while True:
+        server = socket.create_server((HOST, 0))
+        base_port = server.getsockname()[1] - board_port
+        if base_port > 1024:
+            return server, base_port
+        server.close()
+
+
+def accept_forever(server: socket.socket):
+    while True:
+        conn, _ = server.accept()
+        conn.close()
+
+
+def measure(connect) -> float:
+    times = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        client = connect()
+        times.append(time.perf_counter() - start)
+        assert client.is_connected
+        client.close()
+    return min(times)
+
+
+def main(board_port: int = 17, latency_ms: float = 100):
+    logging.disable(logging.CRITICAL)
+    server, base_port = find_base_port(board_port)
+    threading.Thread(target=accept_forever, args=(server,), daemon=True).start()
+    latency = latency_ms / 1000
+
+    def sequential():
+        client = SlowTcpClient(base_port, latency)
+        client.mac_address = HOST
+        sequential_connect(client, timeout=1)
+        return client
+
+    def probe():
+        client = SlowTcpClient(base_port, latency)
+        client.connect(HOST, timeout=1)
+        return client
+
+    cached_client = SlowTcpClient(base_port, latency)
+    cached_client.connect(HOST, timeout=1)
+    cached_client.close()
+
+    def cached():
+        cached_client.connect(HOST, timeout=1)
+        return cached_client
+
+    print(f"board on port {board_port}, {latency_ms:.0f} ms per port attempt")
+    print(f"sequential : {measure(sequential) * 1000:7.1f} ms")
+    print(f"probe      : {measure(probe) * 1000:7.1f} ms")
+    print(f"cached     : {measure(cached) * 1000:7.1f} ms")
+    print(f"stats      : {cached_client.connect_stats}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:2]), *map(float, sys.argv[2:3]))
@@ -0,0 +1,152 @@
+"""
+Reconnect and recovery benchmark: faults are injected between the controller and the board simulator.
+
+The controller is connected with a TcpClient to the simulator (`BoardSimulator.listen`) through a FaultInjector
+(`client.socket_wrapper`), with the auto reconnect and the liveness monitoring running. For each scenario, the faults
+are injected once the board is connected and synchronized, and the following times are measured from the injection:
+    detect    : the client is closed (end of stream, OSError or missed pings).
+    reconnect : the client is connected and listening again.
+    resync    : the board is synchronized again (`is_sync`).
+
+Faults that do not close the connection are reported as `tolerated` if a ping succeeds at the end of the scenario
+window, `not recovered` otherwise.
+
+Usage: python benchmarks/bench_faults.py [latency_ms] [scenario ...]
+"""
+import json
+import logging
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from dcs5.bluetooth_client import TcpClient
+from dcs5.controller import Dcs5Controller, COMMAND_TIMEOUT
+from dcs5.simulator import BoardSimulator, FaultInjector, VirtualBoard
+from dcs5.simulator import faults
+
+DEFAULT_CONFIGS = Path(__file__).resolve().parents[1].joinpath('dcs5/default_configs')
+READY_TIMEOUT = 30  # seconds for the board to be connected and synchronized before a scenario.
+SETTLE_TIME = 1
+
+SCENARIOS = {  # name: (faults, window in seconds)
+    'reset': ([faults.reset()], 15),
+    'error-104-recv': ([faults.error(104)], 15),
+    'error-110-send': ([faults.error(110, direction='send')], 15),
+    'error-113-recv': ([faults.error(113)], 15),
+    'board-off-5s': ([faults.refuse(5, errno=112), faults.reset()], 30),
+    'drop-pings': ([faults.drop(count=3, match='%a#')], 20),  # tolerated while other replies are received.
+    'stall-3s': ([faults.stall(3)], 15),
+    'stall-forever': ([faults.stall(None)], 60),
+    'delay-1s': ([faults.delay(1, count=3)], 15),
+    'duplicate': ([faults.duplicate(count=3)], 15),
+    'split': ([faults.split(0.2, count=3)], 15),
+    'drop-commands': ([faults.drop(count=3, direction='send')], 20),
+}
+
+
+def make_config(directory: Path, host: str) -> Path:
+    config = json.loads(DEFAULT_CONFIGS.joinpath('xt_controller_configuration.json').read_text())
+    config['launch_settings']['keyboard_backend'] = 'null'
+    config['client']['mac_address'] = host
+    path = directory.joinpath('controller_configuration.json')
+    path.write_text(json.dumps(config))
+    return path
+
+
+class Timeline:
+    """Times of the detection, reconnection and resynchronization after `start`."""
+    def __init__(self, controller: Dcs5Controller):
+        self.controller = controller
+        self.start = None
+        self.detect = self.reconnect = self.resync = None
+        self.done = threading.Event()
+        controller.client.disconnect_callbacks.append(self._on_disconnect)
+        controller.state_callbacks.append(self._on_state)
+
+    def reset(self):
+        self.detect = self.reconnect = self.resync = None
+        self.done.clear()
+        self.start = time.monotonic()
+
+    def _on_disconnect(self):
+        if self.start is not None and self.detect is None:
+            self.detect = time.monotonic() - self.start
+
+    def _on_state(self):
+        if self.detect is None:
+            return
+        if self.reconnect is None and self.controller.client.is_connected and self.controller.is_listening:
+            self.reconnect = time.monotonic() - self.start
+        elif self.reconnect is not None and self.resync is None and self.controller.is_sync:
+            self.resync = time.monotonic() - self.start
+            self.done.set()
+
+
+def wait_ready(controller: Dcs5Controller) -> bool:
+    deadline = time.monotonic() + READY_TIMEOUT
+    while time.monotonic() < deadline:
+        if controller.client.is_connected and controller.is_listening and controller.is_sync:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def milliseconds(value: float) -> str:
+    return f"{value * 1000:8.1f} ms" if value is not None else f"{'-':>11}"
+
+
+def run_scenario(controller: Dcs5Controller, injector: FaultInjector, timeline: Timeline, name: str) -> str:
+    scenario_faults, window = SCENARIOS[name]
+    if not wait_ready(controller):
+        return f"{name:16}: board not ready"
+    time.sleep(SETTLE_TIME)
+    injector.clear()
+
+    timeline.reset()
+    injector.inject(*scenario_faults)
+    timeline.done.wait(window)
+
+    if timeline.detect is not None:
+        outcome = 'resynchronized' if timeline.resync is not None else 'not recovered'
+    else:
+        try:
+            controller.c_ping().result(timeout=COMMAND_TIMEOUT)
+            outcome = 'tolerated'
+        except Exception:
+            outcome = 'not recovered'
+    return (f"{name:16}: detect {milliseconds(timeline.detect)}, reconnect {milliseconds(timeline.reconnect)}, "
+            f"resync {milliseconds(timeline.resync)}  {outcome}")
+
+
+def main(latency_ms: float = 10, names: list = None):
+    logging.disable(logging.CRITICAL)
+    simulator = BoardSimulator(VirtualBoard('xt'), latency=latency_ms / 1000)
+    host, port = simulator.listen()
+    injector = FaultInjector()
+    client = TcpClient(base_port=port - 1)
+    client.socket_wrapper = injector.wrap
+
+    with tempfile.TemporaryDirectory() as directory:
+        controller = Dcs5Controller(make_config(Path(directory), host),
+                                    DEFAULT_CONFIGS.joinpath('xt_devices_specification.json'), client=client)
+    timeline = Timeline(controller)
+    controller.connect()
+
+    print(f"simulator latency {latency_ms:g} ms, times from the fault injection")
+    for name in names or SCENARIOS:
+        print(run_scenario(controller, injector, timeline, name), flush=True)
+    print(f"reconnections: {controller.reconnect_stats}")
+    print(f"injector     : {injector.stats}")
+
+    controller.close_client()
+    controller.output_sinks.close()
+    injector.close()
+    simulator.close()
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 10, sys.argv[2:])
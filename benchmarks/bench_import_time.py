@@ -0,0 +1,73 @@
+"""
+Import-time budget of the command line interface and the headless controller.
+
+Each module is imported in a fresh interpreter (`python -X importtime`) and the best of `repeat` runs is compared to
+its budget. The GUI, keyboard and Marel packages must not be imported: they are imported when they are used.
+For reference, the import times of these packages are measured too (if installed).
+
+Exits with status 1 if a budget is exceeded or a lazy package is imported.
+
+Usage: python benchmarks/bench_import_time.py [repeat]
+"""
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+IMPORT_BUDGETS = {  # seconds
+    'dcs5.cli': 0.2,  # `dcs5 status`, `dcs5 sync`, ...
+    'dcs5.controller': 0.25,
+    'dcs5.control_api': 0.3,  # `dcs5 run --headless`
+}
+LAZY_PACKAGES = ['PySimpleGUI', 'pyautogui', 'pyperclip', 'marel_marine_scale_controller']
+
+CHECK_LAZY_IMPORTS = (
+    "import sys; "
+    "print(','.join(name for name in {lazy} if name in sys.modules))"
+)
+
+
+def import_time(module: str) -> tuple:
+    """Returns (cumulative import time in seconds, lazy packages imported)."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}; ' + CHECK_LAZY_IMPORTS.format(lazy=LAZY_PACKAGES)],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise ImportError(result.stderr.strip().splitlines()[-1])
+    for line in reversed(result.stderr.splitlines()):
+        _, cumulative, name = line.split('|')  # import time: self [us] | cumulative | imported package
+        if name.strip() == module:
+            return int(cumulative) / 1e6, [name for name in result.stdout.strip().split(',') if name]
+    raise ValueError(f'{module} not found in the import times.')
+
+
+def main(repeat: int = 5):
+    failed = False
+    print(f"best of {repeat} cold imports")
+    for module, budget in IMPORT_BUDGETS.items():
+        times, lazy_imported = [], []
+        for _ in range(repeat):
+            seconds, lazy_imported = import_time(module)
+            times.append(seconds)
+        best = min(times)
+        status = 'ok'
+        if best > budget:
+            status, failed = 'OVER BUDGET', True
+        if lazy_imported:
+            status, failed = f'IMPORTS {lazy_imported}', True
+        print(f"{module:18}: {best * 1000:7.1f} ms (budget {budget * 1000:5.0f} ms) {status}")
+
+    for package in LAZY_PACKAGES:
+        try:
+            seconds = min(import_time(package)[0] for _ in range(repeat))
+            print(f"{package:30}: {seconds * 1000:7.1f} ms (imported when used)")
+        except ImportError:
+            print(f"{package:30}: not installed")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:2]))
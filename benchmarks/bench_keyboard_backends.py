@@ -0,0 +1,148 @@
+"""
+Benchmark and check of the keyboard backends in an X server (Xvfb).
+
+A window of the benchmark receives the keystrokes: for each backend, `KeyboardEmulator.write('372', 'enter')` is
+repeated and the received keys are compared with the expected keys (`3`, `7`, `2`, `Return`).
+
+Measured:
+    call      : time spent in the write call (best of `repeat`).
+    delivery  : time from the write call to the reception of the last key press by the window (median).
+
+Compared:
+    legacy    : one pyautogui call per value with the global pause (previous behavior).
+    null      : no output (emulator overhead, nothing is received).
+    pyautogui : pyautogui backend, batched without the global pause.
+    xtest     : XTest backend.
+
+Requires python3-xlib and pyautogui. Without a display (`DISPLAY`), the benchmark runs itself in `xvfb-run`.
+Exits with status 1 if a backend is unavailable or the received keys do not match.
+
+Usage: python benchmarks/bench_keyboard_backends.py [repeat] [key_delay_ms]
+"""
+import logging
+import os
+import select
+import shutil
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from dcs5.keyboard_backends import X11_KEYSYM_NAMES
+from dcs5.keyboard_emulator import KeyboardEmulator
+
+VALUES = ('372', 'enter')
+LEGACY_PAUSE = 0.01  # pyautogui.PAUSE set by the previous keyboard emulator.
+RECEIVE_TIMEOUT = 2  # seconds
+
+
+class KeyReceiver:
+    """X window with the input focus, recording the keysyms of the key presses."""
+    def __init__(self):
+        from Xlib import X, XK, display as xdisplay
+
+        self.X = X
+        self.display = xdisplay.Display()
+        screen = self.display.screen()
+        self.window = screen.root.create_window(
+            0, 0, 200, 100, 0, screen.root_depth, event_mask=X.KeyPressMask | X.StructureNotifyMask
+        )
+        self.window.map()
+        while self.display.next_event().type != X.MapNotify:
+            pass
+        self.window.set_input_focus(X.RevertToParent, X.CurrentTime)
+        self.display.sync()
+        self.expected = []  # keysyms of VALUES
+        for value in VALUES:
+            if value in X11_KEYSYM_NAMES:
+                self.expected.append(XK.string_to_keysym(X11_KEYSYM_NAMES[value]))
+            else:
+                self.expected += [ord(char) for char in value]
+
+    def clear(self):
+        while self.display.pending_events():
+            self.display.next_event()
+
+    def receive(self, count: int, timeout: float = RECEIVE_TIMEOUT) -> list:
+        """Keysyms of the next `count` key presses (fewer on timeout)."""
+        keysyms = []
+        deadline = time.monotonic() + timeout
+        while len(keysyms) < count:
+            while self.display.pending_events() and len(keysyms) < count:
+                event = self.display.next_event()
+                if event.type == self.X.KeyPress:
+                    index = 1 if event.state & self.X.ShiftMask else 0
+                    keysyms.append(self.display.keycode_to_keysym(event.detail, index))
+            if len(keysyms) < count:
+                if (remaining := deadline - time.monotonic()) <= 0:
+                    break
+                select.select([self.display], [], [], remaining)
+        return keysyms
+
+
+def measure(write, receiver: KeyReceiver, repeat: int, expect_keys: bool) -> dict:
+    calls, deliveries, mismatches = [], [], 0
+    for _ in range(repeat):
+        receiver.clear()
+        start = time.perf_counter()
+        write()
+        calls.append(time.perf_counter() - start)
+        if expect_keys:
+            keysyms = receiver.receive(len(receiver.expected))
+            deliveries.append(time.perf_counter() - start)
+            mismatches += keysyms != receiver.expected
+    return {'call': min(calls), 'delivery': statistics.median(deliveries) if deliveries else None,
+            'mismatches': mismatches}
+
+
+def run_in_xvfb():
+    if os.environ.get('DISPLAY'):
+        return
+    if shutil.which('xvfb-run') is None:
+        sys.exit('No display and xvfb-run not found.')
+    os.execvp('xvfb-run', ['xvfb-run', '-a', sys.executable, *sys.argv])
+
+
+def main(repeat: int = 20, key_delay_ms: float = 0):
+    run_in_xvfb()
+    logging.disable(logging.CRITICAL)
+    import pyautogui as pag
+    from dcs5.keyboard_backends import PyautoguiBackend, RecordingBackend, XTestBackend
+
+    receiver = KeyReceiver()
+    key_delay = key_delay_ms / 1000
+    pag.PAUSE = LEGACY_PAUSE
+    pag.FAILSAFE = False  # No fail-safe corner check on the pointer position, as the pyautogui backend.
+
+    def legacy_write():
+        for value in VALUES:
+            with pag.hold([]):
+                if pag.isValidKey(value):
+                    pag.press(value)
+                else:
+                    pag.write(value)
+
+    failed = False
+    results = {'legacy': measure(legacy_write, receiver, repeat, expect_keys=True)}
+    for name, backend in {'null': RecordingBackend, 'pyautogui': PyautoguiBackend, 'xtest': XTestBackend}.items():
+        try:
+            emulator = KeyboardEmulator(key_delay=key_delay, backend=backend())
+        except Exception as err:
+            print(f"{name:10}: unavailable ({err})")
+            failed = True
+            continue
+        results[name] = measure(lambda: emulator.write(*VALUES), receiver, repeat, expect_keys=name != 'null')
+
+    print(f"write {' + '.join(VALUES)} x {repeat} (key delay {key_delay_ms:g} ms, legacy pause {LEGACY_PAUSE * 1000:g} ms)")
+    for name, result in results.items():
+        delivery = f"{result['delivery'] * 1000:8.3f} ms" if result['delivery'] is not None else f"{'-':>11}"
+        status = 'ok' if result['mismatches'] == 0 else f"{result['mismatches']}/{repeat} MISMATCHED"
+        failed |= result['mismatches'] > 0
+        print(f"{name:10}: call {result['call'] * 1000:8.3f} ms, delivery {delivery}  {status}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:2]), *map(float, sys.argv[2:3]))
@@ -0,0 +1,94 @@
+"""
+Microbenchmark of the board message decoding.
+
+Compares `dcs5.protocol.decode` with the former decoding path (uncompiled regex alternation in
+`SocketListener._decode_board_message` followed by the `in` checks and `re.findall` chain of
+`CommandHandler._process_commands`).
+
+Usage: python benchmarks/bench_protocol.py [number_of_frames]
+"""
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from dcs5 import protocol
+
+FRAMES = [
+    "%l,451#\r", "%s,12#\r", "%l,680#\r", "%k,01#\r", "%hs,3#\r",
+    "%a#\r", "%di:9#\r", "%dm:50#\r", "%dn:50#\r", "%la,95#\r",
+    "%q:87,0#\r", "%t,22,41#\r", "%u:1#\r", "%sn:0#\r", "%pl,0#\r",
+]
+
+
+def legacy_decode(value: str):
+    patterns = [
+        "%t,([0-9])#",
+        "%l,([0-9]*)#",
+        "%s,(-?\\d+)#",
+        "%hs,([0-9])#",
+        "%k,([0-9]{2})#",
+    ]
+    match = re.findall("|".join(patterns), value)
+    if len(match) > 0:
+        if match[0][1] != "":
+            return 'length', int(match[0][1])
+        elif match[0][2] != "":
+            return 'swipe', int(match[0][2])
+        elif match[0][3] != "":
+            return 'controller_box_key', match[0][3]
+        elif match[0][4] != "":
+            return 'controller_box_key', match[0][4]
+    else:
+        return legacy_process_solicited(value)
+
+
+def legacy_process_solicited(received: str):
+    if "%a#" in received:
+        return 'ping', None
+    elif "%pl," in received:
+        return 'pl', re.findall(f"%pl,(\\d)#\r", received)
+    elif "%sn:" in received:
+        return 'sn', re.findall(f"%sn:(\\d)#\r", received)
+    elif "%di:" in received:
+        return 'di', re.findall(f"%di:(\\d+)#\r", received)
+    elif "%dm:" in received:
+        return 'dm', re.findall(f"%dm:(\\d+)#\r", received)
+    elif "%dn:" in received:
+        return 'dn', re.findall(f"%dn:(\\d+)#\r", received)
+    elif "%b:" in received:
+        return 'b', re.findall("%b:(.*)#", received)
+    elif "%q:" in received:
+        return 'q', re.findall("%q:(\\d+),(\\d+)#", received)
+    elif "%qe:" in received:
+        return 'qe', re.findall("%qe:(\\d+)#", received)
+    elif "%t," in received:
+        return 't', re.findall("%t,(\\d+),(\\d+)#", received)
+    elif "%u:" in received:
+        return 'u', re.findall("%u:(\\d)#", received)
+    elif "%la," in received:
+        return 'la', re.findall("%la,(\\d+)#", received)
+    return None, None
+
+
+def frames_per_second(decoder, frames) -> float:
+    start = time.perf_counter()
+    for frame in frames:
+        decoder(frame)
+    return len(frames) / (time.perf_counter() - start)
+
+
+def main(number_of_frames: int = 200_000):
+    frames = (FRAMES * (number_of_frames // len(FRAMES) + 1))[:number_of_frames]
+    legacy = frames_per_second(legacy_decode, frames)
+    codec = frames_per_second(protocol.decode, frames)
+    print(f"frames           : {number_of_frames}")
+    print(f"legacy decoder   : {legacy:12,.0f} frames/s")
+    print(f"protocol.decode  : {codec:12,.0f} frames/s")
+    print(f"speedup          : {codec / legacy:12.2f} x")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,94 @@
+"""
+Benchmark of the event publisher (`EventPublisher`) with many local tcp subscribers.
+
+Subscribers read the events in a single reader thread. One extra subscriber never reads: its backlog fills up
+and it is disconnected without slowing down the others.
+
+Measured:
+    publish   : time of a `publish` call (listener side).
+    latency   : time between the `publish` call and the reception of the event by a subscriber.
+    delivered : events received by the reading subscribers.
+
+Usage: python benchmarks/bench_publisher.py [subscribers] [events]
+"""
+import json
+import logging
+import selectors
+import socket
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from dcs5.event_publisher import EventPublisher
+
+BACKLOG = 64 * 1024
+EVENT_INTERVAL = 0.0001  # seconds between published events
+
+
+def read_subscribers(subscribers, expected: int, latencies: list, done: threading.Event):
+    selector = selectors.DefaultSelector()
+    buffers = {}
+    for sock in subscribers:
+        selector.register(sock, selectors.EVENT_READ)
+        buffers[sock] = b''
+    received = 0
+    while received < expected:
+        events = selector.select(timeout=5)
+        if not events:
+            break
+        for key, _ in events:
+            data = key.fileobj.recv(65536)
+            now = time.perf_counter()
+            *lines, buffers[key.fileobj] = (buffers[key.fileobj] + data).split(b'\n')
+            for line in lines:
+                latencies.append(now - float(line[len(b'{"sent": '):line.index(b',')]))
+            received += len(lines)
+    done.set()
+
+
+def main(number_of_subscribers: int = 50, number_of_events: int = 2000):
+    logging.disable(logging.CRITICAL)
+    publisher = EventPublisher(port=0, backlog=BACKLOG)
+
+    subscribers = [socket.create_connection(publisher.address) for _ in range(number_of_subscribers)]
+    slow_subscriber = socket.socket()
+    slow_subscriber.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    slow_subscriber.connect(publisher.address)
+    while publisher.stats.subscribers < number_of_subscribers + 1:
+        time.sleep(0.01)
+
+    latencies, done = [], threading.Event()
+    reader = threading.Thread(
+        target=read_subscribers, args=(subscribers, number_of_subscribers * number_of_events, latencies, done)
+    )
+    reader.start()
+
+    padding = 'x' * 100  # about the size of an OutputEvent
+    publish_times = []
+    for index in range(number_of_events):
+        start = time.perf_counter()
+        publisher.publish(json.dumps({'sent': start, 'index': index, 'padding': padding}))
+        publish_times.append(time.perf_counter() - start)
+        time.sleep(EVENT_INTERVAL)
+    done.wait(10)
+    reader.join()
+
+    latencies.sort()
+    print(f"{number_of_subscribers} subscribers + 1 slow subscriber, {number_of_events} events")
+    print(f"publish   : mean {statistics.mean(publish_times) * 1e6:7.1f} us, max {max(publish_times) * 1e6:7.1f} us")
+    print(f"latency   : p50 {latencies[len(latencies) // 2] * 1000:7.3f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:7.3f} ms")
+    print(f"delivered : {len(latencies)} / {number_of_subscribers * number_of_events}")
+    print(f"stats     : {publisher.stats}")
+
+    for sock in subscribers + [slow_subscriber]:
+        sock.close()
+    publisher.close()
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
@@ -0,0 +1,93 @@
+"""
+Benchmark of the controller against the board simulator (socket pair, no Bluetooth).
+
+Measured:
+    sync       : full board synchronization (`init_controller_and_board(full=True)`).
+    ping       : command round trip (`c_ping`), sequential.
+    lengths    : latency between the scheduled time of a simulated length and its output event, and throughput.
+
+The default xt configuration is used with the `null` keyboard backend (no keystrokes). The keyboard output is still
+paced by the key delay. When the keyboard output cannot keep up, its queue fills up and the keyboard actions are
+dropped (`keyboard` stats). The listener does not wait.
+
+Usage: python benchmarks/bench_simulator.py [latency_ms] [rate] [lengths] [key_delay_ms]
+"""
+import json
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from dcs5.controller import Dcs5Controller
+from dcs5.simulator import BoardSimulator, VirtualBoard, random_lengths
+
+DEFAULT_CONFIGS = Path(__file__).resolve().parents[1].joinpath('dcs5/default_configs')
+PINGS = 200
+
+
+def make_config(directory: Path) -> Path:
+    config = json.loads(DEFAULT_CONFIGS.joinpath('xt_controller_configuration.json').read_text())
+    config['launch_settings']['keyboard_backend'] = 'null'
+    path = directory.joinpath('controller_configuration.json')
+    path.write_text(json.dumps(config))
+    return path
+
+
+def percentiles(values: list) -> str:
+    values = sorted(values)
+    return (f"p50 {values[len(values) // 2] * 1000:7.3f} ms, p99 {values[int(len(values) * 0.99)] * 1000:7.3f} ms, "
+            f"max {values[-1] * 1000:7.3f} ms")
+
+
+def main(latency_ms: float = 0, rate: float = 20, number_of_lengths: int = 200,
+         key_delay_ms: float = None):
+    logging.disable(logging.CRITICAL)
+    with tempfile.TemporaryDirectory() as directory:
+        controller = Dcs5Controller(make_config(Path(directory)),
+                                    DEFAULT_CONFIGS.joinpath('xt_devices_specification.json'))
+    if key_delay_ms is not None:  # Defaults to `launch_settings/key_delay`.
+        controller.keyboard_emulator.key_delay = key_delay_ms / 1000
+    simulator = BoardSimulator(VirtualBoard('xt'), latency=latency_ms / 1000)
+    controller.client.attach(simulator.connect_socketpair(), port=1)
+
+    start = time.perf_counter()
+    controller.init_controller_and_board(full=True)
+    sync_time = time.perf_counter() - start
+    controller.start_listening()
+    controller.change_board_output_mode('length')
+
+    ping_times = []
+    for _ in range(PINGS):
+        start = time.perf_counter()
+        controller.c_ping().result(timeout=5)
+        ping_times.append(time.perf_counter() - start)
+
+    received = []
+    controller.output_callbacks.append(lambda event: received.append(time.monotonic()))
+    start = time.monotonic()
+    simulator.play(random_lengths(number_of_lengths, seed=0), rate).result()
+    deadline = time.monotonic() + 5
+    while len(received) < number_of_lengths and time.monotonic() < deadline:
+        time.sleep(0.01)
+    latencies = [receive_time - (start + (index + 1) / rate) for index, receive_time in enumerate(received)]
+
+    print(f"simulator latency {latency_ms:g} ms, {number_of_lengths} lengths at {rate:g}/s, "
+          f"key delay {controller.keyboard_emulator.key_delay * 1000:g} ms")
+    print(f"sync      : {sync_time * 1000:7.1f} ms (synchronized: {controller.is_sync})")
+    print(f"ping      : {percentiles(ping_times)}")
+    print(f"lengths   : {percentiles(latencies)}")
+    print(f"throughput: {len(received) / (received[-1] - start):7.1f} lengths/s, "
+          f"{len(received)}/{number_of_lengths} received")
+    print(f"keyboard  : {controller.keyboard_output.stats}")
+    print(f"simulator : {simulator.stats}")
+
+    controller.close_client()
+    controller.output_sinks.close()
+    simulator.close()
+
+
+if __name__ == "__main__":
+    main(*map(float, sys.argv[1:3]), *map(int, sys.argv[3:4]), *map(float, sys.argv[4:5]))
@@ -21,9 +21,21 @@ LOG_FILES_PATH = Path(LOCAL_FILE_PATH).joinpath("logs/")
 
 ### CONFIG PATH ###
 CONFIG_FILES_PATH = Path(LOCAL_FILE_PATH).joinpath("configs/")
+CONTROLLER_CONFIGURATION_FILE_NAME = 'controller_configuration.json'  # name use in the config
+DEVICES_SPECIFICATION_FILE_NAME = 'devices_specification.json'  # name use in the config
+
+### USER SETTINGS (selected configuration) ###
+USER_SETTING_FILE = 'user_settings.json'
+
+### CONTROLLER SNAPSHOT ###
+CONTROLLER_SNAPSHOT_PATH = Path(LOCAL_FILE_PATH).joinpath("controller_snapshot.json")
 
 Path(LOCAL_FILE_PATH).mkdir(parents=True, exist_ok=True)
 LOG_FILES_PATH.mkdir(parents=True, exist_ok=True)
 CONFIG_FILES_PATH.mkdir(parents=True, exist_ok=True)
 
+### CONTROL API ###
+CONTROL_API_HOST = '127.0.0.1'
+CONTROL_API_PORT = 8765
+
 PRINT_COMMAND = "PRINT "
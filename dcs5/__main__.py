@@ -0,0 +1,3 @@
+from dcs5.cli import cli
+
+cli()
@@ -1,26 +1,61 @@
 import logging
-import platform
+import select
+import selectors
 import socket
 import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import *
+
+from dcs5.protocol import BOARD_MSG_ENCODING
+from dcs5.selector_loop import Waker
 
-MONITORING_DELAY = 2  # WINDOWS ONLY
-BOARD_MSG_ENCODING = 'UTF-8'
 BUFFER_SIZE = 1024
 
+PORT_PROBE_TIMEOUT = 5  # seconds to connect to the cached port or to a port when probing the ports.
+PORT_PROBE_CONCURRENCY = 3  # ports connected at the same time when probing.
+
+SOCKET_SELECTOR_KEY = 'socket'
+WAKEUP_SELECTOR_KEY = 'wakeup'
+
+
+@dataclass
+class ConnectStats:
+    attempts: int = 0
+    successes: int = 0
+    cache_hits: int = 0  # connections made on the cached port.
+    cache_misses: int = 0
+    probes: int = 0  # concurrent probing of the ports.
+    last_port: int = None
+    last_duration: float = None  # seconds
+    total_duration: float = 0
+
+    @property
+    def mean_duration(self) -> Optional[float]:
+        return self.total_duration / self.attempts if self.attempts > 0 else None
+
 
 class BluetoothClient:
     """RFCOMM ports goes from 1 to 30."""
     min_port = 1
     max_port = 30
     reconnection_delay = 5
+    probe_timeout = PORT_PROBE_TIMEOUT
+    probe_concurrency = PORT_PROBE_CONCURRENCY
 
     def __init__(self):
         self.mac_address: str = None
         self.port: int = None
+        self.port_cache: Dict[str, int] = {}  # mac address -> last connected port
+        self.connect_stats = ConnectStats()
         self.socket: socket.socket = None
         self.default_timeout = 0.1
         self._is_connected = False
+        self.disconnected = threading.Event()  # Set while the client is not connected.
+        self.disconnected.set()
+        self.disconnect_callbacks: List[Callable[[], None]] = []  # Called (from the closing thread) on close.
+        self.socket_wrapper: Callable[[socket.socket], socket.socket] = None  # Wraps the new sockets (e.g. faults).
         self.error_msg = ""
         self.errors = {
             0: 'Socket timeout',
@@ -30,10 +65,14 @@ class BluetoothClient:
             4: 'Connection broken',
             5: 'Device Unavailable',
             6: 'Client closed',
+            7: 'Device busy',
             99: 'Unknown Error',
         }
 
-        self._socket_spam_thread: threading.Thread = None
+        # The waker is used to interrupt a blocking `wait_receive`.
+        self._selector = selectors.DefaultSelector()
+        self._waker = Waker()
+        self._selector.register(self._waker, selectors.EVENT_READ, WAKEUP_SELECTOR_KEY)
 
     @property
     def socket_timeout(self):
@@ -47,40 +86,120 @@ class BluetoothClient:
         self.socket.settimeout(value)
 
     def connect(self, mac_address: str = None, timeout: int = None):
+        """Connect to the board.
+
+        The last port connected with `mac_address` (port_cache) is tried first. If it fails, the other ports are
+        probed, `probe_concurrency` ports at a time, and the first port to connect is used. Each port is given
+        `timeout`, at most `probe_timeout`, to connect.
+        """
         self.mac_address = mac_address
-        timeout = timeout or self.default_timeout
+        timeout = min(timeout or self.default_timeout, self.probe_timeout)
         logging.info(f'Attempting to connect to board. Timeout: {timeout} seconds')
+        start_time = time.perf_counter()
+        self.connect_stats.attempts += 1
 
-        for port in range(self.min_port, self.max_port + 1):  # check for all available ports
-            self.socket = socket.socket(socket.AF_BLUETOOTH, socket.SOCK_STREAM, socket.BTPROTO_RFCOMM)
-            self.socket.settimeout(timeout)
-            try:
-                logging.info(f'port: {port}')
-                self.socket.connect((self.mac_address, port))
-                self.port = port
-                self._is_connected = True
-                logging.info(f'Connected to port {self.port}')
-                logging.info(f'Socket name: {self.socket.getsockname()}')
-
-                if platform.system() == 'Windows':
-                    self.start_connection_spam_thread()
-                break
+        sock, port, err_code = None, None, 1
+        ports = list(range(self.min_port, self.max_port + 1))
+        if (cached_port := self.port_cache.get(self.mac_address)) in ports:  # Stale ports (e.g. snapshot) are ignored.
+            logging.info(f'port (cached): {cached_port}')
+            sock, err_code = self._connect_port(cached_port, timeout)
+            if sock is not None:
+                port = cached_port
+                self.connect_stats.cache_hits += 1
+            else:
+                self.connect_stats.cache_misses += 1
+                ports.remove(cached_port)
+
+        if sock is None and err_code not in (2, 3):  # Probing is pointless if the device is not found or bluetooth is off.
+            self.connect_stats.probes += 1
+            sock, port, err_code = self._probe_ports(ports, timeout)
+
+        if sock is not None:
+            self.attach(sock, port)
+            self.port_cache[self.mac_address] = port
+            self.connect_stats.successes += 1
+            self.connect_stats.last_port = port
+            logging.info(f'Connected to port {self.port}')
+            logging.info(f'Socket name: {self.socket.getsockname()}')
+        else:
+            if err_code == 1:
+                logging.error('No available ports were found.')
+            self.error_msg = self.errors[err_code]
+
+        self.connect_stats.last_duration = time.perf_counter() - start_time
+        self.connect_stats.total_duration += self.connect_stats.last_duration
+        logging.info(f'Connection attempt duration: {self.connect_stats.last_duration:.3f} seconds')
 
-            except PermissionError:
-                logging.info('Client.connect: PermissionError')
-                self.error_msg = 'Permission error'
-                pass
+    def _make_socket(self) -> socket.socket:
+        return socket.socket(socket.AF_BLUETOOTH, socket.SOCK_STREAM, socket.BTPROTO_RFCOMM)
 
-            except OSError as err:
-                if (err_code := self._process_os_error_code(err)) == 1:
-                    if port == self.max_port:
-                        logging.error('No available ports were found.')
-                        self.error_msg = self.errors[err_code]
-                else:
-                    self.error_msg = self.errors[err_code]
-                    break
+    def _address(self, port: int) -> tuple:
+        return self.mac_address, port
 
+    def _connect_port(self, port: int, timeout: float) -> Tuple[Optional[socket.socket], Optional[int]]:
+        """Returns the connected socket, or None and the error code."""
+        sock = self._make_socket()
+        if self.socket_wrapper is not None:
+            sock = self.socket_wrapper(sock)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(self._address(port))
+            return sock, None
+        except PermissionError:
+            logging.info(f'Client.connect: PermissionError (port {port})')
+            sock.close()
+            return None, 1
+        except OSError as err:
+            sock.close()
+            return None, self._process_os_error_code(err)
+
+    def _probe_ports(self, ports: List[int], timeout: float) -> Tuple[Optional[socket.socket], Optional[int], int]:
+        """Connect to the ports, `probe_concurrency` ports at a time.
+
+        Returns the socket and port of the first port to connect, or None, None and the most relevant error code.
+        The ports not tried yet are cancelled and the sockets connected after the first one are closed. Ports that
+        were busy (e.g. the device was connecting on another port) are tried again, one at a time.
+        """
+        logging.info(f'Probing ports {ports[0]}-{ports[-1]}. Timeout: {timeout} seconds')
+        executor = ThreadPoolExecutor(max_workers=min(len(ports), self.probe_concurrency),
+                                      thread_name_prefix='port probe')
+        futures = {executor.submit(self._connect_port, port, timeout): port for port in ports}
+
+        err_codes, busy_ports = set(), []
+        for future in as_completed(futures):
+            sock, err_code = future.result()
+            if sock is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+                for other in futures:
+                    if other is not future:
+                        other.add_done_callback(_close_probe_socket)
+                return sock, futures[future], None
+            if err_code == 7:
+                busy_ports.append(futures[future])
+            err_codes.add(err_code)
+        executor.shutdown(wait=False)
+
+        for port in sorted(busy_ports):
+            sock, err_code = self._connect_port(port, timeout)
+            if sock is not None:
+                return sock, port, None
+            err_codes.add(err_code)
+
+        if len(device_errors := err_codes - {0, 1}) > 0:
+            return None, None, min(device_errors)
+        return None, None, 1 if 1 in err_codes else 0
+
+    def attach(self, sock: socket.socket, port: int = None):
+        """Use an already connected socket as the client socket.
+
+        Any connected stream socket can be used (e.g. a `socket.socketpair()` end for testing).
+        """
+        self.socket = sock
         self.socket.settimeout(self.default_timeout)
+        self.port = port
+        self._selector.register(self.socket, selectors.EVENT_READ, SOCKET_SELECTOR_KEY)
+        self._is_connected = True
+        self.disconnected.clear()
 
     def send(self, command: str):
         try:
@@ -91,31 +210,72 @@ class BluetoothClient:
             self.close()
 
     def receive(self):
+        return self.receive_bytes().decode(BOARD_MSG_ENCODING)
+
+    def receive_bytes(self) -> bytes:
         try:
-            return self.socket.recv(BUFFER_SIZE).decode(BOARD_MSG_ENCODING)
+            data = self.socket.recv(BUFFER_SIZE)
         except OSError as err:
-            if err_code := self._process_os_error_code(err) != 0:
+            if (err_code := self._process_os_error_code(err)) != 0:
                 self.error_msg = self.errors[err_code]
                 self.close()
-            return ""
+            return b""
+
+        if not data:  # An empty read means that the remote end closed the connection.
+            logging.error('Connection closed by the device.')
+            self.error_msg = self.errors[4]
+            self.close()
+        return data
+
+    def wait_receive(self, timeout: float = None) -> bytes:
+        """Block until data is received on the socket or `wake_up` is called.
+
+        Parameters
+        ----------
+        timeout :
+            Maximum time to wait in seconds. None waits indefinitely.
+
+        Returns
+        -------
+        The received (undecoded) data or empty bytes on timeout or wake-up.
+        """
+        try:
+            events = self._selector.select(timeout)
+        except (OSError, ValueError):  # The socket was closed by another thread.
+            return b""
+
+        data_ready = False
+        for key, _ in events:
+            if key.data == WAKEUP_SELECTOR_KEY:
+                self._waker.drain()
+            elif key.data == SOCKET_SELECTOR_KEY:
+                data_ready = True
+
+        if data_ready and self._is_connected:
+            return self.receive_bytes()
+        return b""
+
+    def wake_up(self):
+        """Interrupt a thread blocked in `wait_receive`."""
+        self._waker.wake_up()
 
     def clear(self):
-        while self.receive() != "":
-            continue
+        """Discard the data already received. Does not wait for more data."""
+        while self._is_connected and len(select.select([self.socket], [], [], 0)[0]) > 0:
+            if len(self.receive_bytes()) == 0:
+                break
 
     def close(self):
+        try:
+            self._selector.unregister(self.socket)
+        except (KeyError, ValueError):
+            pass
         self.socket.close()
         self._is_connected = False
-
-    def start_connection_spam_thread(self):
-        self._socket_spam_thread = threading.Thread(target=self._spam_socket, name='spam', daemon=True)
-        self._socket_spam_thread.start()
-
-    def _spam_socket(self):
-        """This is to raise a connection OSError if the connection is lost."""
-        while self._is_connected:
-            self.send(" ")  # A Space is not a recognized command. Thus nothing is return.
-            time.sleep(MONITORING_DELAY)
+        self.disconnected.set()
+        self.wake_up()
+        for callback in self.disconnect_callbacks:
+            callback()
 
     def _process_os_error_code(self, err) -> int:
         """
@@ -132,6 +292,7 @@ class BluetoothClient:
         4: Connection broken
         5: Device Unavailable
         6: Client closed.
+        7: Device busy
         99: Unknown Error
 
         """
@@ -141,9 +302,12 @@ class BluetoothClient:
             case 9:
                 logging.error(f'Bad file descriptor. (err{err.errno})')
                 return 6
+            case 11:
+                logging.error(f'Device busy. (err{err.errno})')
+                return 7
             case 16:
-                logging.error(f'Port unavailable. (err{err.errno})')
-                return 1
+                logging.error(f'Device busy. (err{err.errno})')
+                return 7
             case 22:
                 logging.error(f'Port does not exist. (err{err.errno})')
                 return 1
@@ -168,6 +332,12 @@ class BluetoothClient:
             case 113:
                 logging.error(f'Bluetooth turned off. (err{err.errno})')
                 return 3
+            case 114:
+                logging.error(f'Device busy. (err{err.errno})')
+                return 7
+            case 115:
+                logging.error(f'Device busy. (err{err.errno})')
+                return 7
             case 10022:
                 logging.error(f'Bluetooth turned off. (err{err.errno})')
                 return 3
@@ -195,3 +365,25 @@ class BluetoothClient:
             case _:
                 logging.error(f'OSError (new): {err.errno}')
                 return 99
+
+
+def _close_probe_socket(future: Future):
+    if not future.cancelled() and (sock := future.result()[0]) is not None:
+        sock.close()
+
+
+class TcpClient(BluetoothClient):
+    """Client for a TCP stand-in of the board (e.g. a simulator).
+
+    The `mac_address` is the host and RFCOMM port `n` is TCP port `base_port + n`.
+    """
+
+    def __init__(self, base_port: int):
+        super().__init__()
+        self.base_port = base_port
+
+    def _make_socket(self) -> socket.socket:
+        return socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+    def _address(self, port: int) -> tuple:
+        return self.mac_address, self.base_port + port
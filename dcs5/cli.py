@@ -0,0 +1,228 @@
+"""
+This module contains the `dcs5` command line interface.
+
+    dcs5 run              Start the application (GUI).
+    dcs5 run --headless   Start the controller without the GUI. The controller is scripted with the control API.
+    dcs5 status           Print the state of the running controller.
+    dcs5 sync             Synchronize the board of the running controller.
+    dcs5 calibrate PT     Calibrate a point of the board of the running controller.
+    dcs5 simulate         Serve a virtual board (see simulator) on a local tcp port or a pty.
+
+`status`, `sync` and `calibrate` are requests to the control API of a headless controller (see control_api).
+
+Only the modules required by the command are imported: PySimpleGUI (GUI), pyautogui (keyboard backend) and the
+Marel package (Marel listening) are imported when they are used.
+"""
+import json
+import logging
+import signal
+import threading
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import *
+
+import click
+
+from dcs5 import VERSION, LOCAL_FILE_PATH, CONTROLLER_SNAPSHOT_PATH, CONTROLLER_CONFIGURATION_FILE_NAME, \
+    DEVICES_SPECIFICATION_FILE_NAME, USER_SETTING_FILE, CONTROL_API_HOST, CONTROL_API_PORT
+from dcs5.controller_configurations import VALID_KEYBOARD_BACKENDS
+from dcs5.utils import json2dict
+
+CONNECTION_RETRY_DELAY = 10  # seconds between the connection attempts of the headless controller.
+SIMULATOR_PORT = 9001  # RFCOMM port 1 of `TcpClient(base_port=9000)`
+
+
+def selected_configs_path() -> Optional[str]:
+    """Configuration directory selected in the application (user settings)."""
+    user_settings_path = Path(LOCAL_FILE_PATH).joinpath(USER_SETTING_FILE)
+    if not user_settings_path.exists():
+        return None
+    configs_path = json2dict(str(user_settings_path)).get('configs_path')
+    return configs_path.strip('*') if configs_path else None
+
+
+def api_request(host: str, port: int, method: str, path: str, params: dict = None, timeout: float = 60) -> dict:
+    """Send a request to the control API. Exits with an error message if the request fails."""
+    request = urllib.request.Request(
+        f'http://{host}:{port}{path}',
+        data=json.dumps(params).encode('utf-8') if params is not None else None,
+        method=method,
+        headers={'Content-Type': 'application/json'},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as err:
+        raise click.ClickException(json.loads(err.read()).get('error', str(err)))
+    except (urllib.error.URLError, OSError) as err:
+        raise click.ClickException(
+            f'Controller unreachable at {host}:{port} ({getattr(err, "reason", err)}). Is `dcs5 run --headless` running?'
+        )
+
+
+def echo_status(status: dict):
+    board = status.pop('board', {})
+    width = max(map(len, [*status, *board]))
+    for key, value in status.items():
+        click.echo(f'{key:<{width}} : {value}')
+    click.echo('board:')
+    for key, value in board.items():
+        if value is not None:
+            click.echo(f'  {key:<{width}} : {value}')
+
+
+api_options = [
+    click.option('--host', default=CONTROL_API_HOST, show_default=True, help='Control API host.'),
+    click.option('--port', default=CONTROL_API_PORT, show_default=True, help='Control API port.'),
+]
+
+
+def with_api_options(command: Callable) -> Callable:
+    for option in reversed(api_options):
+        command = option(command)
+    return command
+
+
+@click.group()
+@click.version_option(VERSION)
+def cli():
+    """BigFin Dcs5 Board Controller."""
+
+
+@cli.command()
+@click.option('--headless', is_flag=True, help='Without the GUI. The controller is scripted with the control API.')
+@click.option('--configs', type=click.Path(exists=True, file_okay=False),
+              help='Configuration directory. Defaults to the configuration selected in the application.')
+@click.option('--debug', is_flag=True, help='Debug logging.')
+@click.option('--keyboard-backend', type=click.Choice(VALID_KEYBOARD_BACKENDS), default='null', show_default=True,
+              help='Keyboard backend of the headless controller (replaces the configured backend).')
+@with_api_options
+def run(headless: bool, configs: str, debug: bool, keyboard_backend: str, host: str, port: int):
+    """Start the application."""
+    if not headless:
+        from dcs5.gui import main
+        main()
+        return
+
+    from dcs5.logger import init_logging
+    from dcs5.controller import Dcs5Controller
+    from dcs5.controller_configurations import ConfigError
+    from dcs5.control_api import ControlApi
+
+    configs = configs or selected_configs_path()
+    if configs is None:
+        raise click.UsageError('No configuration selected. Use --configs.')
+
+    level = 'DEBUG' if debug else 'INFO'
+    init_logging(stdout_level=level, file_level=level, write=True)
+    try:
+        controller = Dcs5Controller(
+            Path(configs).joinpath(CONTROLLER_CONFIGURATION_FILE_NAME),
+            Path(configs).joinpath(DEVICES_SPECIFICATION_FILE_NAME),
+            snapshot_path=CONTROLLER_SNAPSHOT_PATH,
+            keyboard_backend=keyboard_backend,
+        )
+    except ConfigError as err:
+        raise click.ClickException(f'Error in the configurations files ({configs}): {err}')
+
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+    api = ControlApi(controller, host, port)
+    api.start()
+    try:
+        # Once connected, the controller reconnects by itself (auto reconnect).
+        while not stop.is_set() and not controller.client.is_connected:
+            controller.connect()
+            if not controller.client.is_connected:
+                logging.info(f'Connection failed. Next attempt in {CONNECTION_RETRY_DELAY} seconds.')
+                stop.wait(CONNECTION_RETRY_DELAY)
+        stop.wait()
+    finally:
+        api.close()
+        controller.close_client()
+        controller.output_sinks.close()
+
+
+@cli.command()
+@click.option('--json', 'as_json', is_flag=True, help='Print the JSON response.')
+@with_api_options
+def status(as_json: bool, host: str, port: int):
+    """Print the state of the running controller."""
+    response = api_request(host, port, 'GET', '/status')
+    if as_json:
+        click.echo(json.dumps(response, indent=2))
+    else:
+        echo_status(response)
+
+
+@cli.command()
+@click.option('--full', is_flag=True, help='Send every setting to the board.')
+@with_api_options
+def sync(full: bool, host: str, port: int):
+    """Synchronize the board settings."""
+    response = api_request(host, port, 'POST', '/sync', {'full': full})
+    click.echo(f"Fields fixed: {response['fixed']}")
+    if not response['state']['sync']:
+        raise click.ClickException('Board synchronization failed.')
+    click.echo('Board synchronized.')
+
+
+@cli.command()
+@click.argument('pt', type=click.IntRange(1, 2))
+@with_api_options
+def calibrate(pt: int, host: str, port: int):
+    """Calibrate the point PT (1 or 2) of the board."""
+    position = api_request(host, port, 'GET', '/status')['board'][f'cal_pt_{pt}']
+    click.echo(f'Calibration of point {pt}: set the stylus down at {position} mm.')
+    response = api_request(host, port, 'POST', '/calibrate', {'pt': pt}, timeout=None)
+    if response['result'] != 1:
+        raise click.ClickException(f'Calibration of point {pt} failed.')
+    click.echo(f'Point {pt} calibrated.')
+
+
+@cli.command()
+@click.option('--model', type=click.Choice(['xt', 'micro']), default='xt', show_default=True)
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--port', default=SIMULATOR_PORT, show_default=True, help='Tcp port (0 for a free port).')
+@click.option('--pty', is_flag=True, help='Serve on a pseudo-terminal instead of a tcp port.')
+@click.option('--latency', default=0., show_default=True, help='Reply latency (ms).')
+@click.option('--jitter', default=0., show_default=True, help='Random additional reply latency (ms).')
+@click.option('--seed', type=int, help='Seed of the jitter.')
+@click.option('--auto-calibration', type=float, help='Calibrations complete after this delay (seconds).')
+@click.option('--script', type=click.Path(exists=True, dir_okay=False), help='Stream script played once connected.')
+@click.option('--rate', default=1., show_default=True, help='Script events per second.')
+@click.option('--repeat', default=1, show_default=True, help='Number of times the script is played.')
+def simulate(model: str, host: str, port: int, pty: bool, latency: float, jitter: float, seed: int,
+             auto_calibration: float, script: str, rate: float, repeat: int):
+    """Serve a virtual board. Stops with Ctrl+C."""
+    from dcs5.simulator import BoardSimulator, VirtualBoard, load_script
+
+    events = load_script(script) * repeat if script else []
+    simulator = BoardSimulator(VirtualBoard(model), latency / 1000, jitter / 1000, seed, auto_calibration)
+    if pty:
+        click.echo(f'Virtual {model} board on {simulator.open_pty()}')
+    else:
+        host, port = simulator.listen(host, port)
+        click.echo(f'Virtual {model} board on {host}:{port} (TcpClient(base_port={port - 1}), port 1)')
+
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        if events:
+            while not stop.is_set() and simulator.connection is None:
+                stop.wait(0.1)
+            if not stop.is_set():
+                click.echo(f'Playing {len(events)} events at {rate:g} events/s.')
+                simulator.play(events, rate)
+        stop.wait()
+    finally:
+        simulator.close()
+        click.echo(f'{simulator.stats}')
+
+
+if __name__ == '__main__':
+    cli()
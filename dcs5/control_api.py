@@ -0,0 +1,421 @@
+"""
+This module contains the local control API of the Dcs5Controller (HTTP and WebSocket).
+
+The API runs an asyncio event loop in its own thread. The controller methods are called in the loop executor, so
+slow operations (connect, sync, calibrate) never block the API, and the listener only pays a
+`call_soon_threadsafe` for each state change or output event streamed to the WebSocket clients.
+
+HTTP (JSON bodies and responses):
+    GET  /status                             Controller and board state.
+    POST /connect                            Connect, synchronize and start listening.
+    POST /disconnect
+    POST /restart
+    POST /sync                               Synchronize the board settings. {"full": false}
+    POST /output_mode   {"mode": "top"}      top, length or bottom.
+    POST /stylus        {"stylus": "pen"}    A stylus of the devices specifications.
+    POST /units         {"units": "mm"}      mm or cm.
+    POST /backlight     {"level": 95}
+    POST /mute          {"muted": true}
+    POST /auto_enter    {"enabled": true}
+    POST /calibrate     {"pt": 1}            Waits for the end of the calibration (cancelled after `timeout` seconds,
+                                             default CALIBRATION_TIMEOUT).
+
+Only local pages may use the API: requests with an `Origin` header that is not local (e.g. a script of another web
+site in the browser of the operator) are rejected (403) and the POST requests must be `Content-Type:
+application/json` (415), which a cross-site form cannot send without a CORS preflight.
+
+WebSocket (GET /ws): JSON text messages streamed to the clients:
+    {"type": "state", "state": {...}}         The controller state changed (same content as /status).
+    {"type": "output", "event": {...}}        Output event (see output_sinks.OutputEvent).
+    {"type": "calibration", "progress": {...}}
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import struct
+import threading
+from dataclasses import asdict
+from functools import partial
+from http import HTTPStatus
+from typing import *
+from urllib.parse import urlsplit
+
+from dcs5 import CONTROL_API_HOST, CONTROL_API_PORT
+from dcs5.controller import Dcs5Controller, CalibrationProgress
+from dcs5.output_sinks import OutputEvent
+
+WEBSOCKET_QUEUE_SIZE = 256  # messages waiting to be sent to a WebSocket client before it is disconnected.
+MAX_REQUEST_BODY = 64 * 1024
+CALIBRATION_TIMEOUT = 300  # seconds to wait for the stylus before a calibration is cancelled.
+LOCAL_ORIGIN_HOSTS = {'localhost', '127.0.0.1', '::1'}
+
+WEBSOCKET_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+WS_TEXT, WS_CLOSE, WS_PING, WS_PONG = 0x1, 0x8, 0x9, 0xA
+
+
+class ApiError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def controller_status(controller: Dcs5Controller) -> dict:
+    return {
+        'connected': controller.client.is_connected,
+        'listening': controller.is_listening,
+        'sync': controller.is_sync,
+        'muted': controller.is_muted,
+        'calibrating': controller.is_calibrating(),
+        'mac_address': controller.config.client.mac_address,
+        'output_mode': controller.output_mode,
+        'length_units': controller.length_units,
+        'stylus': controller.stylus,
+        'auto_enter': controller.auto_enter,
+        'backlighting_level': controller.persistent_backlight_level,
+        'board': asdict(controller.internal_board_state),
+    }
+
+
+class ControlApi:
+    def __init__(self, controller: Dcs5Controller, host: str = CONTROL_API_HOST, port: int = CONTROL_API_PORT):
+        """
+        Parameters
+        ----------
+        controller :
+        host :
+        port :
+            Address of the API. A free port is used if `port` is 0 (see `address`).
+        """
+        self.controller = controller
+        self.host = host
+        self.port = port
+        self.loop: asyncio.AbstractEventLoop = None
+        self.thread: threading.Thread = None
+        self.server: asyncio.AbstractServer = None
+        self.websockets: Set[asyncio.Queue] = set()
+        self._state_pending = False
+
+        self.routes: Dict[Tuple[str, str], Callable[[dict], Awaitable[Any]]] = {
+            ('GET', '/status'): self._status,
+            ('POST', '/connect'): self._connect,
+            ('POST', '/disconnect'): self._disconnect,
+            ('POST', '/restart'): self._restart,
+            ('POST', '/sync'): self._sync,
+            ('POST', '/output_mode'): self._output_mode,
+            ('POST', '/stylus'): self._stylus,
+            ('POST', '/units'): self._units,
+            ('POST', '/backlight'): self._backlight,
+            ('POST', '/mute'): self._mute,
+            ('POST', '/auto_enter'): self._auto_enter,
+            ('POST', '/calibrate'): self._calibrate,
+        }
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.server.sockets[0].getsockname()[:2]
+
+    def start(self):
+        """Start the API thread. Returns once the server is listening."""
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='control api', daemon=True)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self._start_server(), self.loop).result()
+
+        self.controller.state_callbacks.append(self._on_state_changed)
+        self.controller.output_callbacks.append(self._on_output)
+        self.controller.calibration_callbacks.append(self._on_calibration)
+        logging.info(f'Control API started (http://{self.address[0]}:{self.address[1]}).')
+
+    def close(self):
+        self.controller.state_callbacks.remove(self._on_state_changed)
+        self.controller.output_callbacks.remove(self._on_output)
+        self.controller.calibration_callbacks.remove(self._on_calibration)
+        asyncio.run_coroutine_threadsafe(self._stop_server(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        logging.info('Control API stopped.')
+
+    async def _start_server(self):
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+
+    async def _stop_server(self):
+        self.server.close()
+        for queue in list(self.websockets):
+            queue.put_nowait(None)
+        await self.server.wait_closed()
+
+    ### CONTROLLER CALLBACKS (controller threads) ###
+
+    def _call_soon(self, callback: Callable, *args):
+        try:
+            self.loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:  # Event loop closed.
+            pass
+
+    def _on_state_changed(self):
+        if self.websockets and not self._state_pending:
+            self._state_pending = True  # State changes are coalesced until the loop sends the state.
+            self._call_soon(self._broadcast_state)
+
+    def _on_output(self, event: OutputEvent):
+        if self.websockets:
+            self._call_soon(self._broadcast_message, 'output', 'event', event)
+
+    def _on_calibration(self, progress: CalibrationProgress):
+        if self.websockets:
+            self._call_soon(self._broadcast_message, 'calibration', 'progress', progress)
+
+    ### EVENT LOOP ###
+
+    def _broadcast_state(self):
+        self._state_pending = False
+        self._broadcast({'type': 'state', 'state': controller_status(self.controller)})
+
+    def _broadcast_message(self, message_type: str, name: str, value: Any):
+        self._broadcast({'type': message_type, name: asdict(value)})
+
+    def _broadcast(self, message: dict):
+        data = json.dumps(message, default=str)
+        for queue in list(self.websockets):
+            try:
+                queue.put_nowait(data)
+            except asyncio.QueueFull:
+                logging.warning('WebSocket client too slow. Disconnected.')
+                self.websockets.discard(queue)
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+    async def _run(self, function: Callable, *args) -> Any:
+        """Run a controller method in the executor."""
+        return await self.loop.run_in_executor(None, partial(function, *args))
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            method, target, headers, body = await self._read_request(reader)
+            path = urlsplit(target).path
+            self._check_origin(headers)
+            if path == '/ws' and headers.get('upgrade', '').lower() == 'websocket':
+                await self._websocket(reader, writer, headers)
+                return
+            status, response = await self._route(method, path, headers, body)
+            self._write_response(writer, status, response)
+            await writer.drain()
+        except (ApiError, ValueError) as err:
+            status = err.status if isinstance(err, ApiError) else HTTPStatus.BAD_REQUEST
+            self._write_response(writer, status, {'error': str(err)})
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader) -> Tuple[str, str, Dict[str, str], bytes]:
+        request_line = (await reader.readline()).decode('latin-1').strip()
+        if not request_line:
+            raise asyncio.IncompleteReadError(b'', None)
+        method, target, _ = request_line.split(' ', 2)
+        headers = {}
+        while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length', 0))
+        if length > MAX_REQUEST_BODY:
+            raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, 'Request body too large.')
+        return method, target, headers, await reader.readexactly(length)
+
+    @staticmethod
+    def _check_origin(headers: Dict[str, str]):
+        """Rejects the requests of web pages that are not local (cross-site requests and WebSocket hijacking).
+        Clients that are not browsers (cli, scripts) do not send an `Origin`."""
+        if (origin := headers.get('origin')) is None:
+            return
+        try:
+            host = urlsplit(origin).hostname
+        except ValueError:
+            host = None
+        if host not in LOCAL_ORIGIN_HOSTS:
+            raise ApiError(HTTPStatus.FORBIDDEN, f'Origin not allowed: {origin}')
+
+    async def _route(self, method: str, path: str, headers: Dict[str, str], body: bytes) -> Tuple[HTTPStatus, Any]:
+        if (handler := self.routes.get((method, path))) is None:
+            if any(route_path == path for _, route_path in self.routes):
+                raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, f'{method} not allowed on {path}.')
+            raise ApiError(HTTPStatus.NOT_FOUND, f'Unknown path: {path}')
+        if method == 'POST' and headers.get('content-type', '').partition(';')[0].strip().lower() != 'application/json':
+            raise ApiError(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, 'POST requests must be `Content-Type: application/json`.')
+        params = json.loads(body) if body else {}
+        if not isinstance(params, dict):
+            raise ApiError(HTTPStatus.BAD_REQUEST, 'The request body must be a JSON object.')
+        try:
+            return HTTPStatus.OK, await handler(params)
+        except ApiError:
+            raise
+        except Exception as err:
+            logging.error(f'Control API {method} {path}: {err}')
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(err)}
+
+    @staticmethod
+    def _write_response(writer: asyncio.StreamWriter, status: HTTPStatus, response: Any):
+        body = json.dumps(response, default=str).encode('utf-8')
+        writer.write(
+            f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+            f'Content-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'Connection: close\r\n\r\n'.encode('latin-1') + body
+        )
+
+    ### ROUTES ###
+
+    @staticmethod
+    def _param(params: dict, name: str, types: Union[type, Tuple[type, ...]], choices: Iterable = None) -> Any:
+        value = params.get(name)
+        if not isinstance(value, types) or (choices is not None and value not in choices):
+            if isinstance(choices, range):
+                expected = f'an integer in [{choices.start}, {choices.stop - 1}]'
+            elif choices is not None:
+                expected = f'one of {list(choices)}'
+            else:
+                expected = f'{types}'
+            raise ApiError(HTTPStatus.BAD_REQUEST, f'Invalid or missing `{name}`. Expected {expected}.')
+        return value
+
+    async def _status(self, params: dict) -> dict:
+        return controller_status(self.controller)
+
+    async def _connect(self, params: dict) -> dict:
+        await self._run(self.controller.connect)
+        return controller_status(self.controller)
+
+    async def _disconnect(self, params: dict) -> dict:
+        await self._run(self.controller.close_client)
+        return controller_status(self.controller)
+
+    async def _restart(self, params: dict) -> dict:
+        await self._run(self.controller.restart)
+        return controller_status(self.controller)
+
+    async def _sync(self, params: dict) -> dict:
+        full = self._param(params, 'full', bool) if 'full' in params else False
+        fields = await self._run(self.controller.init_controller_and_board, full)
+        return {'fixed': fields, 'state': controller_status(self.controller)}
+
+    async def _output_mode(self, params: dict) -> dict:
+        mode = self._param(params, 'mode', str, ['top', 'length', 'bottom'])
+        await self._run(self.controller.change_board_output_mode, mode)
+        return controller_status(self.controller)
+
+    async def _stylus(self, params: dict) -> dict:
+        stylus = self._param(params, 'stylus', str, self.controller.devices_specifications.stylus_offset.keys())
+        await self._run(self.controller.change_stylus, stylus)
+        return controller_status(self.controller)
+
+    async def _units(self, params: dict) -> dict:
+        units = self._param(params, 'units', str, ['mm', 'cm'])
+        if units == 'mm':
+            await self._run(self.controller.change_length_units_mm)
+        else:
+            await self._run(self.controller.change_length_units_cm)
+        return controller_status(self.controller)
+
+    async def _backlight(self, params: dict) -> dict:
+        max_level = self.controller.control_box_parameters.max_backlighting_level
+        level = self._param(params, 'level', int, range(0, max_level + 1))
+        await self._run(self.controller.c_set_backlighting_level, level)
+        return controller_status(self.controller)
+
+    async def _mute(self, params: dict) -> dict:
+        if self._param(params, 'muted', bool):
+            await self._run(self.controller.mute_board)
+        else:
+            await self._run(self.controller.unmute_board)
+        return controller_status(self.controller)
+
+    async def _auto_enter(self, params: dict) -> dict:
+        await self._run(self.controller.set_auto_enter, self._param(params, 'enabled', bool))
+        return controller_status(self.controller)
+
+    async def _calibrate(self, params: dict) -> dict:
+        pt = self._param(params, 'pt', int, [1, 2])
+        timeout = self._param(params, 'timeout', (int, float)) if 'timeout' in params else CALIBRATION_TIMEOUT
+        calibration = asyncio.wrap_future(await self._run(self.controller.start_calibration, pt))
+        try:
+            # Shielded: cancelling the wrapped future would cancel the controller future.
+            return {'pt': pt, 'result': await asyncio.wait_for(asyncio.shield(calibration), timeout)}
+        except asyncio.TimeoutError:
+            self.controller.cancel_calibration(pt)
+            if await calibration == 1:  # Received in the meantime.
+                return {'pt': pt, 'result': 1}
+            raise ApiError(HTTPStatus.GATEWAY_TIMEOUT,
+                           f'Point {pt} calibration still in progress after {timeout} seconds. Calibration cancelled.')
+
+    ### WEBSOCKET ###
+
+    async def _websocket(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, headers: Dict[str, str]):
+        if (key := headers.get('sec-websocket-key')) is None:
+            raise ApiError(HTTPStatus.BAD_REQUEST, 'Missing Sec-WebSocket-Key.')
+        accept = base64.b64encode(hashlib.sha1(key.encode('latin-1') + WEBSOCKET_GUID).digest()).decode('latin-1')
+        writer.write(
+            'HTTP/1.1 101 Switching Protocols\r\n'
+            'Upgrade: websocket\r\n'
+            'Connection: Upgrade\r\n'
+            f'Sec-WebSocket-Accept: {accept}\r\n\r\n'.encode('latin-1')
+        )
+        queue = asyncio.Queue(maxsize=WEBSOCKET_QUEUE_SIZE)
+        queue.put_nowait(json.dumps({'type': 'state', 'state': controller_status(self.controller)}, default=str))
+        self.websockets.add(queue)
+        receiving = asyncio.create_task(self._receive_frames(reader, writer, queue))
+        try:
+            while (message := await queue.get()) is not None:
+                writer.write(self._frame(WS_TEXT, message.encode('utf-8')))
+                await writer.drain()
+            writer.write(self._frame(WS_CLOSE, b''))
+            await writer.drain()
+        finally:
+            self.websockets.discard(queue)
+            receiving.cancel()
+
+    async def _receive_frames(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, queue: asyncio.Queue):
+        """Answers the pings. The messages sent by the clients are ignored."""
+        try:
+            while True:
+                opcode, payload = await self._read_frame(reader)
+                if opcode == WS_CLOSE:
+                    break
+                if opcode == WS_PING:
+                    writer.write(self._frame(WS_PONG, payload))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        self.websockets.discard(queue)
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    @staticmethod
+    async def _read_frame(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+        first, second = await reader.readexactly(2)
+        length = second & 0x7F
+        if length == 126:
+            length, = struct.unpack('!H', await reader.readexactly(2))
+        elif length == 127:
+            length, = struct.unpack('!Q', await reader.readexactly(8))
+        if length > MAX_REQUEST_BODY:
+            raise ConnectionError('WebSocket frame too large.')
+        mask = await reader.readexactly(4) if second & 0x80 else None
+        payload = await reader.readexactly(length)
+        if mask is not None:
+            payload = bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload))
+        return first & 0x0F, payload
+
+    @staticmethod
+    def _frame(opcode: int, payload: bytes) -> bytes:
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('!BB', 0x80 | opcode, length)
+        elif length < 1 << 16:
+            header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+        return header + payload
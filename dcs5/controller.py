@@ -11,39 +11,98 @@ References
 
 """
 
+import copy
+import heapq
 import logging
-import re
+import random
 import threading
+from collections import deque
+from contextlib import contextmanager
 import time
-from dataclasses import dataclass
-from itertools import cycle
-from queue import Queue
+from concurrent.futures import Future, CancelledError, TimeoutError as FutureTimeoutError, wait
+from dataclasses import dataclass, field
+from itertools import count, cycle
 from typing import *
 
-import pyautogui as pag
-
-from dcs5 import PRINT_COMMAND
+from dcs5 import PRINT_COMMAND, protocol
 from dcs5.bluetooth_client import BluetoothClient
+from dcs5.protocol import BoardMessageFramer
 from dcs5.keyboard_emulator import KeyboardEmulator
+from dcs5.keyboard_backends import make_keyboard_backend
+from dcs5.output_sinks import OutputSinks, OutputEvent, make_output_sink
+from dcs5.keyboard_output import KeyboardOutput
 
 from dcs5.controller_configurations import load_config, ControllerConfiguration, ConfigError
+from dcs5.link_monitor import RttEstimator
+from dcs5.controller_snapshot import ControllerSnapshot, BoardSnapshot, SnapshotWriter, config_hash, load_snapshot
 from dcs5.devices_specifications import load_devices_specification, DevicesSpecifications
 from dcs5.control_box_parameters import XtControlBoxParameters, MicroControlBoxParameters
-from marel_marine_scale_controller.marel_controller import MarelController
-
-BOARD_MESSAGE_DELIMITER = "\r"
 
-pag.FAILSAFE = False
+if TYPE_CHECKING:  # The Marel package is imported when the Marel listening is started.
+    from marel_marine_scale_controller.marel_controller import MarelController
 
 BOARD_STATE_MONITORING_SLEEP = 5
 
-AFTER_SENT_SLEEP = 0.01  # lower value might send message too quickly.
+# Send pacing: commands are sent no faster than the board acknowledges them.
+INITIAL_SEND_INTERVAL = 0.01  # lower value might send message too quickly.
+MIN_SEND_INTERVAL = 0.002
+MAX_SEND_INTERVAL = 0.1
+SEND_INTERVAL_SMOOTHING = 0.2  # weight of a new acknowledgement interval in the moving average.
+
+# Seconds to receive the replies of a sent command. The timeout is derived from the ping round-trip time within these
+# bounds. COMMAND_TIMEOUT is used until the first ping reply.
+COMMAND_TIMEOUT = 5
+MIN_COMMAND_TIMEOUT = 1
+
+# Liveness: a ping is sent when nothing was received for PING_INTERVAL seconds. The link is dead after
+# PING_MAX_MISSED pings without reply.
+PING_INTERVAL = 2
+PING_MAX_MISSED = 3
+
+INITIALIZATION_TIMEOUT = 5
+
+# Command priorities (lowest value is sent first).
+PRIORITY_INTERACTIVE = 0  # user actions
+PRIORITY_SYNC = 1  # board synchronization
+PRIORITY_TELEMETRY = 2  # board state monitoring
+
+STYLUS_QUIET_WINDOW = 1  # seconds after a stylus input during which telemetry commands are held back.
+SWIPE_HOLD_TIMEOUT = 2  # seconds after a swipe during which telemetry is held back waiting for its length.
+
+LISTENING_STOP_TIMEOUT = 1  # seconds to wait for the listening threads to pause or stop.
+
+# Auto reconnect: the first attempt is immediate, then the delay doubles up to RECONNECT_MAX_DELAY.
+RECONNECT_INITIAL_DELAY = 1
+RECONNECT_MAX_DELAY = 60
+RECONNECT_JITTER = 0.5  # delays are randomly reduced by up to this fraction.
+RECONNECT_TIMEOUT = 10
+
 
-HANDLER_SLEEP = 0.01
+@dataclass
+class CalibrationProgress:
+    """Calibration progress event.
+
+    `status`:
+        'started' : calibration command sent.
+        'ready' : the board waits for the stylus at `position` mm.
+        'calibrated' : point calibrated.
+        'exited' : calibration exited on the board.
+        'failed' : no reply from the board, or the calibration was interrupted (disconnection).
+        'cancelled' : no result within the `calibrate` timeout.
+    """
+    pt: int
+    status: str
+    position: int = None
 
-LISTENER_SLEEP = 0.005
 
-CONNECTION_MONITOR_SLEEP = 1
+@dataclass
+class ReconnectStats:
+    disconnections: int = 0
+    attempts: int = 0
+    successes: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    last_downtime: float = None  # seconds from the disconnection to the reconnection.
 
 
 @dataclass
@@ -70,6 +129,15 @@ class InternalBoardState:
     backlighting_sensitivity: int = None
 
 
+# InternalBoardState field holding the value set by the commands of a given key.
+COMMAND_STATE_FIELDS = {
+    'la': 'backlighting_level',
+    'di': 'stylus_settling_delay',
+    'dm': 'stylus_max_deviation',
+    'dn': 'number_of_reading',
+}
+
+
 class Dcs5Controller:
     dynamic_stylus_settings: bool
     output_mode: str
@@ -80,18 +148,36 @@ class Dcs5Controller:
     stylus_cyclical_list: Generator
     auto_enter: bool
 
-    def __init__(self, config_path: str, devices_specifications_path: str):
+    def __init__(self, config_path: str, devices_specifications_path: str, snapshot_path: str = None,
+                 client: BluetoothClient = None, keyboard_backend: str = None):
         """
 
         Parameters
         ----------
         config_path
         devices_specifications_path
-        control_box_settings_path
+        snapshot_path :
+            Warm-start snapshot file. The snapshot is restored on creation and saved when the state changes.
+            No snapshot is used if None.
+        client :
+            Client used to connect to the board. Defaults to a BluetoothClient.
+        keyboard_backend :
+            Keyboard backend used instead of the configured one (`launch_settings/keyboard_backend`).
         """
         self.config_path = config_path
+        self.keyboard_backend = keyboard_backend
         self.devices_specifications_path = devices_specifications_path
+        self.snapshot_path = snapshot_path
+        self.snapshot: ControllerSnapshot = None
+        self._saved_snapshot: ControllerSnapshot = None  # Last snapshot queued to the snapshot writer.
+        self._snapshot_lock = threading.Lock()
+        self.snapshot_writer: SnapshotWriter = None
+        self._restored_board_state: Dict[str, Any] = {}  # InternalBoardState fields kept by the first full sync.
+        self._restored_backlight_level = False  # True if the first full sync keeps the backlight of the snapshot.
+        self.state_callbacks: List[Callable[[], None]] = []  # Called when the controller state changes.
+        self.output_callbacks: List[Callable[[OutputEvent], None]] = []  # Called with every output event.
         self.config: ControllerConfiguration = None
+        self.config_hash: str = None
         self.devices_specifications: DevicesSpecifications = None
         self.control_box_parameters: Union[XtControlBoxParameters, MicroControlBoxParameters] = None
         self._load_configs()
@@ -100,19 +186,33 @@ class Dcs5Controller:
         self.command_thread: threading.Thread = None
 
         self.board_state_monitoring_thread: threading.Thread = None
+        self.liveness_thread: threading.Thread = None
+        self.rtt = RttEstimator(COMMAND_TIMEOUT, MIN_COMMAND_TIMEOUT, COMMAND_TIMEOUT)  # ping round-trip time
         self.auto_reconnect_thread: threading.Thread = None
         self.auto_reconnect = False
-        self.listener_handler_sync_barrier = threading.Barrier(2)
-        self.listening_stopped_barrier = threading.Barrier(3)
-        self.ping_event_check = threading.Event()
-
-        self.client = BluetoothClient()
-        self.keyboard_emulator = KeyboardEmulator()
+        self.auto_reconnect_stop: threading.Event = threading.Event()
+        self.reconnect_stats = ReconnectStats()
+        # The listening threads run until `listening_stop` is set and pause while `is_listening` is False.
+        self.listening_condition = threading.Condition()
+        self.listening_stop: threading.Event = None
+
+        self.client = client or BluetoothClient()
+        # The configured backend is created by `_set_board_settings` (pyautogui is only imported if it is used).
+        self.keyboard_emulator = KeyboardEmulator(backend=make_keyboard_backend('null'))
+        self.keyboard_output = KeyboardOutput()  # Keyboard actions are executed in order by the keyboard thread.
+        self.output_sinks = OutputSinks()  # Measurements and key presses outputs.
         self.internal_board_state = InternalBoardState()  # Board Current State
 
         self.socket_listener = SocketListener(self)
         self.command_handler = CommandHandler(self)
 
+        # Calibration runs in the listener: the calibration messages resolve `calibration_future` (1 or 0).
+        self.calibration_lock = threading.Lock()
+        self.calibration_pt: int = None
+        self.calibration_future: Future = None
+        self.calibration_callbacks: List[Callable[[CalibrationProgress], None]] = []
+        self.client.disconnect_callbacks.append(lambda: self._end_calibration(0, 'failed'))
+
         self.is_sync = False  # True if the Dcs5Controller board settings are the same as the Board Internal Settings.
         self.is_listening = False  # listening to the keyboard on the connected socket.
         self.is_muted = False  # Message are processed but keyboard input are suppress.
@@ -120,6 +220,7 @@ class Dcs5Controller:
         self.persistent_backlight_level: int = None # Used to save backlight value when MODE key is lit.
 
         self._set_board_settings()
+        self._set_output_sinks()
 
         self.controller_commands = [
             "CHANGE_STYLUS",
@@ -133,10 +234,12 @@ class Dcs5Controller:
             "DELETE_LAST"
             ]
 
-        self.marel: MarelController = None
+        self.marel: 'MarelController' = None
         self.marel_thread: threading.Thread = None
         self.controller_commands += ["WEIGHT"]
 
+        self._restore_snapshot()
+
     def _load_configs(self):
         if (devices_spec := load_devices_specification(self.devices_specifications_path)) is None:
             raise ConfigError(f'Error in {self.devices_specifications_path}. File could not be loaded.')
@@ -165,11 +268,16 @@ class Dcs5Controller:
                     f'reading_profiles/{key}/max_deviation outside range {(self.control_box_parameters.min_max_deviation, self.control_box_parameters.max_max_deviation)}')
 
         self.config = config
+        self.config_hash = config_hash(self.config_path, self.devices_specifications_path)
 
     def reload_configs(self):
         self.is_sync = False
+        self.persistent_backlight_level = None
+        self._restored_backlight_level = False
         self._load_configs()
         self._set_board_settings()
+        self._set_output_sinks()
+        self._state_changed()
 
     def _set_board_settings(self):
         self.dynamic_stylus_settings = self.config.launch_settings.dynamic_stylus_mode
@@ -178,13 +286,105 @@ class Dcs5Controller:
         self.length_units = self.config.launch_settings.length_units
         self.stylus: str = self.config.launch_settings.stylus
         self.auto_enter = self.config.launch_settings.auto_enter
+        self.keyboard_emulator.paste_threshold = self.config.launch_settings.paste_threshold
+        self.keyboard_emulator.key_delay = self.config.launch_settings.key_delay
+        keyboard_backend = self.keyboard_backend or self.config.launch_settings.keyboard_backend
+        if self.keyboard_emulator.backend.name != keyboard_backend:
+            self.keyboard_emulator.backend = make_keyboard_backend(keyboard_backend)
         self.stylus_offset = self.devices_specifications.stylus_offset[self.stylus]
         self.stylus_cyclical_list = cycle(list(self.devices_specifications.stylus_offset.keys()))
 
+    def _set_output_sinks(self):
+        """(Re)create the output sinks of the configuration."""
+        self.output_sinks.close()
+        for sink_config in self.config.output_sinks:
+            try:
+                sink = make_output_sink(
+                    sink_config.type, self.to_keyboard, path=sink_config.path, host=sink_config.host,
+                    port=sink_config.port, protocol=sink_config.protocol, batch_size=sink_config.batch_size,
+                    backlog=sink_config.backlog
+                )
+            except OSError as err:
+                logging.error(f'Output sink {sink_config.type} could not be created: {err}')
+                continue
+            self.output_sinks.add(sink)
+            logging.info(f'Output sink added: {sink_config.type}')
+
+    def _restore_snapshot(self):
+        """Restore the board state of the configured mac address and, if the configs did not change, the runtime
+        settings from the snapshot file."""
+        if self.snapshot_path is None:
+            return
+        self.snapshot = load_snapshot(self.snapshot_path) or ControllerSnapshot()
+        self._saved_snapshot = copy.deepcopy(self.snapshot)
+        self.snapshot_writer = SnapshotWriter(self.snapshot_path)
+
+        if (board := self.snapshot.boards.get(self.config.client.mac_address)) is not None:
+            self._restored_board_state = {
+                'firmware': board.firmware, 'cal_pt_1': board.cal_pt_1, 'cal_pt_2': board.cal_pt_2,
+                'calibrated': board.calibrated,
+            }
+            for name, value in self._restored_board_state.items():
+                setattr(self.internal_board_state, name, value)
+            if board.port is not None:
+                self.client.port_cache[self.config.client.mac_address] = board.port
+            logging.info(f'Board state restored from snapshot: {board}')
+
+        settings = self.snapshot.runtime_settings
+        if self.snapshot.config_hash != self.config_hash:
+            logging.info('Configs changed since the last snapshot. Runtime settings not restored.')
+        elif settings.stylus not in self.devices_specifications.stylus_offset:
+            logging.info('Invalid snapshot runtime settings. Runtime settings not restored.')
+        else:
+            self.dynamic_stylus_settings = settings.dynamic_stylus_settings
+            self.output_mode = settings.output_mode
+            self.length_units = settings.length_units
+            self.auto_enter = settings.auto_enter
+            self.persistent_backlight_level = settings.backlighting_level
+            self._restored_backlight_level = settings.backlighting_level is not None
+            self.stylus = settings.stylus
+            self.stylus_offset = self.devices_specifications.stylus_offset[self.stylus]
+            while next(self.stylus_cyclical_list) != self.stylus:  # cycling resumes after the restored stylus.
+                pass
+            logging.info(f'Runtime settings restored from snapshot: {settings}')
+
+    def _state_changed(self):
+        """Call the state callbacks and queue the snapshot to be saved if the runtime settings or the board state
+        changed (see SnapshotWriter)."""
+        for callback in self.state_callbacks:
+            callback()
+        if self.snapshot_path is None:
+            return
+        with self._snapshot_lock:
+            settings = self.snapshot.runtime_settings
+            settings.dynamic_stylus_settings = self.dynamic_stylus_settings
+            settings.output_mode = self.output_mode
+            settings.length_units = self.length_units
+            settings.stylus = self.stylus
+            settings.auto_enter = self.auto_enter
+            settings.backlighting_level = self.persistent_backlight_level
+            self.snapshot.config_hash = self.config_hash
+
+            board = self.snapshot.boards.setdefault(self.config.client.mac_address, BoardSnapshot())
+            if self.internal_board_state.firmware is not None:
+                board.firmware = self.internal_board_state.firmware
+            if self.internal_board_state.calibrated is not None:
+                board.calibrated = self.internal_board_state.calibrated
+            if self.internal_board_state.cal_pt_1 is not None:
+                board.cal_pt_1 = self.internal_board_state.cal_pt_1
+            if self.internal_board_state.cal_pt_2 is not None:
+                board.cal_pt_2 = self.internal_board_state.cal_pt_2
+            if self.client.port is not None:
+                board.port = self.client.port
+
+            if self.snapshot != self._saved_snapshot:
+                self._saved_snapshot = copy.deepcopy(self.snapshot)
+                self.snapshot_writer.save(self._saved_snapshot)
+
     def connect(self):
         """Start Client, initialize and start listening"""
         self.start_client()
-        self.init_controller_and_board()
+        self.init_controller_and_board(full=True)
         self.start_listening()
 
     def restart(self):
@@ -199,191 +399,427 @@ class Dcs5Controller:
             logging.info("Client Already Connected.")
         else:
             self.is_sync = False  # If the board is Disconnected. Set sync flag to False.
-            self.client.connect(self.config.client.mac_address, timeout=30)
+            self._stop_auto_reconnect_thread()  # Only one thread connects the client.
+            if not self.client.is_connected:
+                self.client.connect(self.config.client.mac_address, timeout=30)
 
             if self.client.is_connected:
+                self._state_changed()
                 self.start_auto_reconnect_thread()
 
     def close_client(self):
         """"Should only be called from the thread main thread."""
+        self.auto_reconnect = False
+        self.auto_reconnect_stop.set()
         if self.client.is_connected:
-            self.auto_reconnect = False
             self.stop_listening()
             self.client.close()
             logging.info('Client Closed.')
         else:
             logging.info('Client Already Closed')
+        self._stop_listening_threads()
+        self._state_changed()
+        if self.snapshot_writer is not None:
+            self.snapshot_writer.flush()
 
     def start_auto_reconnect_thread(self):
+        """Start the reconnection supervisor. Does nothing if the supervisor is running."""
         self.auto_reconnect = True
-        self.auto_reconnect_thread = threading.Thread(target=self.monitor_connection,
+        if self.auto_reconnect_thread is not None and self.auto_reconnect_thread.is_alive() \
+                and not self.auto_reconnect_stop.is_set():
+            return
+        self.auto_reconnect_stop = threading.Event()  # One stop event per supervisor thread.
+        self.auto_reconnect_thread = threading.Thread(target=self.monitor_connection, args=(self.auto_reconnect_stop,),
                                                       name="auto reconnect", daemon=True)
         self.auto_reconnect_thread.start()
         logging.info('Auto Reconnect Thread Started')
 
-    def monitor_connection(self):
-        while self.auto_reconnect is True:
-            while self.client.is_connected:
-                time.sleep(CONNECTION_MONITOR_SLEEP)
+    def _stop_auto_reconnect_thread(self):
+        """Stop the reconnection supervisor and wait for the reconnection attempt in progress (if any).
+
+        Only called while the client is not connected: a supervisor waiting for a disconnection is not woken up by
+        its stop event.
+        """
+        self.auto_reconnect_stop.set()
+        if self.auto_reconnect_thread is not None and self.auto_reconnect_thread is not threading.current_thread():
+            self.auto_reconnect_thread.join()
+
+    def monitor_connection(self, stop: threading.Event):
+        """Reconnection supervisor.
+
+        Waits for the client disconnection then reconnects with a capped exponential backoff (with jitter) between
+        attempts. The client tries the last connected port first. Listening and board synchronization are resumed
+        after the reconnection.
+
+        The board may have been turned off or rebooted during the disconnection and its settings cannot be read
+        back. The InternalBoardState is cleared: every setting is resent and the calibration state and board stats
+        are queried again. The backlight level set by the user is kept.
+
+        Parameters
+        ----------
+        stop :
+            Stops the supervisor when set.
+        """
+        while not stop.is_set():
+            self.client.disconnected.wait()
+            if stop.is_set():
+                break
+            disconnection_time = time.monotonic()
+            self.reconnect_stats.disconnections += 1
+            self.is_sync = False
+            self.internal_board_state = InternalBoardState()
+            logging.info(f'Connection lost: {self.client.error_msg}. Internal Board State Values cleared.')
+
             was_listening = self.is_listening
             self.stop_listening()
 
-            if self.auto_reconnect is True:
-                while not self.client.is_connected:
-                    logging.info('Attempting to reconnect.')
-                    self.client.connect(self.config.client.mac_address, timeout=30)
-                    time.sleep(.25)
+            attempt = 0
+            while not self.client.is_connected and not stop.wait(self._reconnect_delay(attempt)):
+                attempt += 1
+                self._reconnect(attempt, disconnection_time)
 
-            if was_listening:
+            if self.client.is_connected and was_listening and not stop.is_set():
                 self.start_listening()
                 self.init_controller_and_board()
+        logging.info('Auto Reconnect Thread Stopped')
 
-    def start_listening(self):
+    def _reconnect(self, attempt: int, disconnection_time: float):
+        """Reconnection attempt number `attempt`. The reconnect stats are updated."""
+        self.reconnect_stats.attempts += 1
+        logging.info(f'Attempting to reconnect. Attempt {attempt}.')
+        self.client.connect(self.config.client.mac_address, timeout=RECONNECT_TIMEOUT)
         if self.client.is_connected:
-            logging.info(f"Active Threads: {threading.active_count()} {threading.enumerate()}")
-            if not self.is_listening:
-                logging.info('Starting Threads.')
+            self.reconnect_stats.successes += 1
+            self.reconnect_stats.consecutive_failures = 0
+            self.reconnect_stats.last_downtime = time.monotonic() - disconnection_time
+            logging.info(f'Reconnected after {attempt} attempt(s) and '
+                         f'{self.reconnect_stats.last_downtime:.1f} seconds. Stats: {self.reconnect_stats}')
+        else:
+            self.reconnect_stats.failures += 1
+            self.reconnect_stats.consecutive_failures += 1
+            logging.info(f'Reconnection attempt {attempt} failed: {self.client.error_msg}')
 
-                self.is_listening = True
-                self.command_thread = threading.Thread(target=self.command_handler.processes_queues, name='command handler',
-                                                       daemon=True)
-                self.command_thread.start()
+    @staticmethod
+    def _reconnect_delay(attempt: int) -> float:
+        """Delay before the reconnection attempt following `attempt` failed attempts."""
+        if attempt == 0:
+            return 0
+        delay = min(RECONNECT_INITIAL_DELAY * 2 ** (attempt - 1), RECONNECT_MAX_DELAY)
+        return delay * random.uniform(1 - RECONNECT_JITTER, 1)
 
-                self.listen_thread = threading.Thread(target=self.socket_listener.listen, name='listener', daemon=True)
-                self.listen_thread.start()
+    def start_listening(self):
+        """Resume the listening threads. They are (re)created if they are not running or did not pause."""
+        if self.client.is_connected:
+            if not self.is_listening:
+                start_time = time.perf_counter()
+                if not self._listening_threads_paused():
+                    self._stop_listening_threads()
+                    self._start_listening_threads()
 
-                if isinstance(self.board_state_monitoring_thread, threading.Thread):
-                    if not self.board_state_monitoring_thread.is_alive():
-                        self.start_board_state_monitoring_thread()
-                else:
-                    self.start_board_state_monitoring_thread()
+                self.socket_listener.reset()
+                self.command_handler.clear_queues()
+                with self.listening_condition:
+                    self.is_listening = True
+                    self.listening_condition.notify_all()
+                logging.info(f'Listening started ({(time.perf_counter() - start_time) * 1000:.1f} ms).')
+                self._state_changed()
 
-                self.change_board_output_mode('length')
+                self.change_board_output_mode(self.output_mode)
 
         else:
             logging.info('Cannot start listening, board is not connected.')
 
     def stop_listening(self):
+        """Pause the listening threads. Waits at most LISTENING_STOP_TIMEOUT seconds for them to pause."""
         if self.is_listening:
-            self.is_listening = False
-            barrier_value = self.listening_stopped_barrier.wait()
-            logging.info(f"Wait Called. Wait value: {barrier_value}.")
+            start_time = time.perf_counter()
+            with self.listening_condition:
+                self.is_listening = False
+            self.client.wake_up()
+            self.command_handler.wake_up()
+
+            if self._listening_threads_paused(timeout=LISTENING_STOP_TIMEOUT):
+                logging.info(f'Listening stopped ({(time.perf_counter() - start_time) * 1000:.1f} ms).')
+            else:
+                logging.error(f'Listening threads did not pause within {LISTENING_STOP_TIMEOUT} seconds. '
+                              f'They will be replaced.')
+            self._state_changed()
 
     def restart_listening(self):
         self.stop_listening()
         self.start_listening()
 
-    def start_board_state_monitoring_thread(self):
-        self.board_state_monitoring_thread = threading.Thread(target=self.monitor_board_state,
-                                                              name='monitoring',
-                                                              daemon=True)  # FIXME uncomment
-        self.board_state_monitoring_thread.start()
+    def wait_for_listening(self, stop: threading.Event, paused: threading.Event = None) -> bool:
+        """Called by the listening threads. Blocks while listening is paused.
+
+        Parameters
+        ----------
+        stop :
+            Stop event of the calling thread.
+        paused :
+            Set while the calling thread is paused.
 
-    def monitor_board_state(self):
-        while self.is_listening:
-            self.c_get_battery_level()
+        Returns
+        -------
+        False if the thread has to stop.
+        """
+        with self.listening_condition:
+            if not self.is_listening and not stop.is_set():
+                if paused is not None:
+                    paused.set()
+                self.listening_condition.wait_for(lambda: self.is_listening or stop.is_set())
+                if paused is not None:
+                    paused.clear()
+        return not stop.is_set()
+
+    def _start_listening_threads(self):
+        logging.info('Starting Threads.')
+        self.listening_stop = threading.Event()
+        self.socket_listener.paused.clear()
+        self.command_handler.paused.clear()
+        self.listen_thread = threading.Thread(target=self.socket_listener.listen, args=(self.listening_stop,),
+                                              name='listener', daemon=True)
+        self.command_thread = threading.Thread(target=self.command_handler.processes_queues,
+                                               args=(self.listening_stop,), name='command handler', daemon=True)
+        self.board_state_monitoring_thread = threading.Thread(target=self.monitor_board_state,
+                                                              args=(self.listening_stop,), name='monitoring',
+                                                              daemon=True)
+        self.liveness_thread = threading.Thread(target=self.monitor_liveness, args=(self.listening_stop,),
+                                                name='liveness', daemon=True)
+        for thread in self._listening_threads():
+            thread.start()
+
+    def _stop_listening_threads(self):
+        """Stop the listening threads. Each thread is joined for at most LISTENING_STOP_TIMEOUT seconds."""
+        if self.listening_stop is None:
+            return
+        start_time = time.perf_counter()
+        with self.listening_condition:
+            self.listening_stop.set()
+            self.listening_condition.notify_all()
+        self.client.wake_up()
+        self.command_handler.clear_queues()  # Releases the threads waiting on command futures.
+        for thread in self._listening_threads():
+            thread.join(LISTENING_STOP_TIMEOUT)
+            if thread.is_alive():
+                logging.error(f'Thread {thread.name} did not stop within {LISTENING_STOP_TIMEOUT} seconds.')
+        self.listening_stop = None
+        logging.info(f'Listening threads stopped ({(time.perf_counter() - start_time) * 1000:.1f} ms).')
+
+    def _listening_threads(self) -> List[threading.Thread]:
+        return [self.listen_thread, self.command_thread, self.board_state_monitoring_thread, self.liveness_thread]
+
+    def _listening_threads_paused(self, timeout: float = 0) -> bool:
+        """True if the listener and command handler threads are running and paused."""
+        if self.listening_stop is None or not all(thread.is_alive() for thread in self._listening_threads()):
+            return False
+        deadline = time.monotonic() + timeout
+        return (self.socket_listener.paused.wait(timeout)
+                and self.command_handler.paused.wait(max(deadline - time.monotonic(), 0)))
+
+    def monitor_board_state(self, stop: threading.Event):
+        futures = []
+        while self.wait_for_listening(stop):
+            futures = self._queue_telemetry(futures)
+            stop.wait(BOARD_STATE_MONITORING_SLEEP)
+
+    def _queue_telemetry(self, futures: List[Future]) -> List[Future]:
+        """Queue the telemetry commands if the previous ones (`futures`) are done. Returns the telemetry futures.
+
+        Telemetry held back during measurements is not requeued.
+        """
+        if all(future.done() for future in futures):
+            futures = [self.c_get_battery_level(), self.c_get_temperature_humidity()]
             if self.devices_specifications.control_box.model == "micro":
-                self.c_get_battery_time_to_empty()
-            self.c_get_temperature_humidity()
-            time.sleep(BOARD_STATE_MONITORING_SLEEP)
+                futures.append(self.c_get_battery_time_to_empty())
+        return futures
+
+    def monitor_liveness(self, stop: threading.Event):
+        """Ping the board when nothing was received for PING_INTERVAL seconds.
+
+        The client is closed after PING_MAX_MISSED consecutive pings without reply, which triggers the auto reconnect.
+        The board is not pinged during a calibration: the link is kept quiet.
+        """
+        missed = 0
+        while self.wait_for_listening(stop):
+            if self.is_calibrating() or time.monotonic() - self.socket_listener.last_receive_time < PING_INTERVAL:
+                missed = 0
+            else:
+                with self.command_handler.priority(PRIORITY_SYNC):
+                    future = self.c_ping()
+                self._wait_for_reply(future, stop, timeout=COMMAND_TIMEOUT + PING_INTERVAL)
+                if stop.is_set():
+                    break
+                if not self.is_listening or self.is_calibrating():  # Paused or calibrating while waiting for the reply.
+                    missed = 0
+                    continue
+                if (missed := self._ping_result(future, missed)) >= PING_MAX_MISSED:
+                    missed = 0
+            stop.wait(PING_INTERVAL)
+        logging.info(f'Liveness monitoring stopped. RTT: {self.rtt.summary()}')
+
+    def _wait_for_reply(self, future: Future, stop: threading.Event, timeout: float):
+        """Wait for `future` until it is done, `stop` is set or `timeout` seconds."""
+        future.add_done_callback(lambda _: self._notify_listening())
+        with self.listening_condition:
+            self.listening_condition.wait_for(lambda: future.done() or stop.is_set(), timeout=timeout)
+
+    def _notify_listening(self):
+        with self.listening_condition:
+            self.listening_condition.notify_all()
+
+    def _ping_result(self, future: Future, missed: int) -> int:
+        """Returns the number of consecutive missed pings. The client is closed at PING_MAX_MISSED.
+
+        A cancelled ping (queues cleared when listening restarts) is not counted.
+        """
+        if future.cancelled():
+            return missed
+        if future.done() and future.exception() is None:
+            return 0
+        missed += 1
+        logging.warning(f'Ping missed ({missed}/{PING_MAX_MISSED}).')
+        if missed >= PING_MAX_MISSED:
+            logging.error(f'Board not responding. Link closed. RTT: {self.rtt.summary()}')
+            self.client.error_msg = self.client.errors[4]
+            self.client.close()
+        return missed
 
     def unmute_board(self):
         """Unmute board shout output"""
         if self.is_muted:
             self.is_muted = False
             logging.info('Board unmuted')
+            self._state_changed()
 
     def mute_board(self):
         """Mute board shout output"""
         if not self.is_muted:
             self.is_muted = True
             logging.info('Board muted')
+            self._state_changed()
 
     def set_auto_enter(self, value=True):
         """Set the dcs5 and marel controller auto_enter"""
         self.auto_enter = value
         if self.marel is not None:
             self.marel.auto_enter = value
+        self._state_changed()
+
+    def init_controller_and_board(self, full: bool = False) -> List[str]:
+        """Synchronize the board settings with the controller settings.
+
+        The InternalBoardState holds the settings acknowledged by the board since the connection. Only the settings
+        that differ from the reading profile and launch settings are sent, followed by a ping. A full synchronization
+        clears the InternalBoardState first and sends every setting. The first full synchronization keeps the board
+        state restored from the snapshot (calibration and firmware), which is then not queried, and the backlight
+        level restored from the snapshot.
 
-    def init_controller_and_board(self):
-        """Initialization measuring board.
+        Parameters
+        ----------
+        full :
+            If True, the InternalBoardState is cleared and every setting is sent.
+
+        Returns
+        -------
+        Names of the InternalBoardState fields that were sent to the board.
         """
         logging.info('Initializing Board.')
 
-        self.internal_board_state = InternalBoardState()
         self.is_sync = False
-        logging.info('Internal Board State Values cleared. is_sync set to False')
-
         was_listening = self.is_listening
-        self.restart_listening()
-
-        self.c_set_backlighting_level(0)
-
-        reading_profile = self.config.reading_profiles[
-            self.config.output_modes.mode_reading_profiles[self.output_mode]
-        ]
-
-        # SET DEFAULT VALUES
-        self.c_set_interface(0)
-
-        self.c_set_stylus_detection_message(False) # could be True and it should/would work fine but the up/down msg are not used.
-
-        # SET USER VALUES
-        self.c_set_stylus_settling_delay(reading_profile.settling_delay)
-        self.c_set_stylus_max_deviation(reading_profile.max_deviation)
-        self.c_set_stylus_number_of_reading(reading_profile.number_of_reading)
-
-        self.c_set_backlighting_level(self.config.launch_settings.backlighting_level)
-
-        self.c_check_calibration_state()
-        self.c_get_board_stats()
-
-        if self.wait_for_initialization_ping(timeout=5) is True:
-            if (
-                    self.internal_board_state.board_interface == "Dcs5LinkStream" and
-                    self.internal_board_state.stylus_status_msg == "disable" and
-                    self.internal_board_state.stylus_settling_delay == reading_profile.settling_delay and
-                    self.internal_board_state.stylus_max_deviation == reading_profile.max_deviation and
-                    self.internal_board_state.number_of_reading == reading_profile.number_of_reading and
-                    self.internal_board_state.backlighting_level == self.persistent_backlight_level
-            ):
+        if full is True:
+            self.internal_board_state = InternalBoardState(**self._restored_board_state)
+            self._restored_board_state = {}
+            logging.info('Internal Board State Values cleared. is_sync set to False')
+            self.restart_listening()
+        else:
+            self.start_listening()
+
+        targets = self._board_sync_targets(full)
+        self._restored_backlight_level = False
+        fixed = [name for name, (value, _) in targets.items() if getattr(self.internal_board_state, name) != value]
+
+        with self.command_handler.priority(PRIORITY_SYNC):
+            futures = [targets[name][1]() for name in fixed]
+            if self.internal_board_state.calibrated is None:
+                futures.append(self.c_check_calibration_state())
+            if self.internal_board_state.firmware is None:
+                futures.append(self.c_get_board_stats())
+            futures.append(self.c_ping())
+        futures = [future for future in futures if future is not None]
+
+        done, not_done = wait(futures, timeout=INITIALIZATION_TIMEOUT)
+        failed = [future for future in done if future.cancelled() or future.exception() is not None]
+        if len(not_done) == 0 and len(failed) == 0:
+            mismatches = {
+                name: (getattr(self.internal_board_state, name), value) for name, (value, _) in targets.items()
+                if getattr(self.internal_board_state, name) != value
+            }
+            if len(mismatches) == 0:
                 self.is_sync = True
-                logging.info("Board initialization succeeded.")
+                logging.info(f"Board initialization succeeded. Fields fixed: {fixed}")
             else:
                 logging.info("Board initialization failed.")
-                state = [
-                    self.internal_board_state.sensor_mode,
-                    self.internal_board_state.stylus_status_msg,
-                    (self.internal_board_state.stylus_settling_delay, reading_profile.settling_delay),
-                    (self.internal_board_state.stylus_max_deviation, reading_profile.max_deviation),
-                    (self.internal_board_state.number_of_reading, reading_profile.number_of_reading),
-                    (self.internal_board_state.backlighting_level, self.persistent_backlight_level)]
-                logging.debug(f"Board state after initialization: {state}")
+                logging.debug(f"Board state after initialization (board, controller): {mismatches}")
         else:
-            logging.info("Ping was not received. Board initialization failed.")
+            logging.info(f"{len(not_done) + len(failed)}/{len(futures)} commands were not acknowledged. "
+                         f"Board initialization failed.")
 
         if not was_listening:
             self.stop_listening()
+        self._state_changed()
+
+        return fixed
+
+    def _board_sync_targets(self, full: bool) -> Dict[str, Tuple[Any, Callable[[], Future]]]:
+        """InternalBoardState field -> (controller value, command setting the value) in sending order.
 
-    def wait_for_initialization_ping(self, timeout=2):
-        self.c_ping()
-        self.ping_event_check.clear()
-        logging.info('Waiting for ping event.')
-        if self.ping_event_check.wait(timeout):
+        The backlight level set by the user is kept unless the synchronization is full. The first full
+        synchronization keeps the backlight level restored from the snapshot.
+        """
+        reading_profile = self.config.reading_profiles[
+            self.config.output_modes.mode_reading_profiles[self.output_mode]
+        ]
+        if self.persistent_backlight_level is None or (full is True and not self._restored_backlight_level):
+            backlight = self.config.launch_settings.backlighting_level
+        else:
+            backlight = self.persistent_backlight_level
+        return {
+            'board_interface': ("Dcs5LinkStream", lambda: self.c_set_interface(0)),
+            # could be True and it should/would work fine but the up/down msg are not used.
+            'stylus_status_msg': ("disable", lambda: self.c_set_stylus_detection_message(False)),
+            'stylus_settling_delay': (reading_profile.settling_delay,
+                                      lambda: self.c_set_stylus_settling_delay(reading_profile.settling_delay)),
+            'stylus_max_deviation': (reading_profile.max_deviation,
+                                     lambda: self.c_set_stylus_max_deviation(reading_profile.max_deviation)),
+            'number_of_reading': (reading_profile.number_of_reading,
+                                  lambda: self.c_set_stylus_number_of_reading(reading_profile.number_of_reading)),
+            'backlighting_level': (backlight, lambda: self.c_set_backlighting_level(backlight)),
+        }
+
+    def wait_for_initialization_ping(self, timeout: float = None):
+        """`timeout` defaults to the command timeout derived from the ping round-trip time."""
+        logging.info('Waiting for ping reply.')
+        try:
+            self.c_ping().result(timeout or self.rtt.timeout())
             logging.info('Initializing Ping received.')
             return True
-        logging.info('Initializing Ping not received.')
-        return False
+        except (FutureTimeoutError, CancelledError):
+            logging.info('Initializing Ping not received.')
+            return False
 
     def change_length_units_mm(self, flash=True):
         self.length_units = "mm"
         logging.info(f"Length Units Change to mm")
+        self._state_changed()
         if self.is_listening and flash is True:
             self.c_flash_fuel_gauge()
 
     def change_length_units_cm(self, flash=True):
         self.length_units = "cm"
         logging.info(f"Length Units Change to cm")
+        self._state_changed()
         if self.is_listening and flash is True:
             self.c_flash_fuel_gauge()
 
@@ -391,6 +827,7 @@ class Dcs5Controller:
         self.stylus = value
         self.stylus_offset = self.devices_specifications.stylus_offset[self.stylus]
         logging.info(f'Stylus set to {self.stylus}. Stylus offset {self.stylus_offset}')
+        self._state_changed()
         if self.is_listening and flash is True:
             self.c_flash_fuel_gauge()
 
@@ -461,6 +898,7 @@ class Dcs5Controller:
                 self.c_set_stylus_max_deviation(reading_profile.max_deviation)
                 self.c_set_stylus_number_of_reading(reading_profile.number_of_reading)
         logging.info(f'Board entry: {self.output_mode}.')
+        self._state_changed()
 
     def _mode_top(self):
         self.change_board_output_mode('top')
@@ -471,10 +909,20 @@ class Dcs5Controller:
     def _mode_bottom(self):
         self.change_board_output_mode('bottom')
 
-    def to_keyboard(self, value: Union[int, float, str]):
-        if not self.is_muted:
-            logging.info(f"Writing value: {value}")
-            self.keyboard_emulator.write(value)
+    def publish_output(self, event: OutputEvent):
+        """Send `event` to the output sinks and the output callbacks."""
+        self.output_sinks.publish(event)
+        for callback in self.output_callbacks:
+            callback(event)
+
+    def to_keyboard(self, *values: Union[int, float, str]):
+        """The values are written in a single batch."""
+        if not self.is_muted and len(values) > 0:
+            logging.info(f"Writing value: {', '.join(map(str, values))}")
+            self.keyboard_output.put(self.keyboard_emulator.write, *values)
+
+    def delete_last(self):
+        self.keyboard_output.put(self.keyboard_emulator.delete_last)
 
     def backlight_up(self):
         if self.persistent_backlight_level < self.control_box_parameters.max_backlighting_level:
@@ -506,75 +954,126 @@ class Dcs5Controller:
             "BACKLIGHT_UP": self.backlight_up,
             "BACKLIGHT_DOWN": self.backlight_down,
             "WEIGHT": self.marel_get_weight,
-            "DELETE_LAST": self.keyboard_emulator.delete_last
+            "DELETE_LAST": self.delete_last
         }
         commands[command]()
 
-    def calibrate(self, pt: int) -> int:
-        """
+    def calibrate(self, pt: int, timeout: float = None) -> int:
+        """Calibrate point `pt` and wait for the result. See `start_calibration`.
 
         Parameters
         ----------
-        pt
+        pt :
+            Calibration point (1 or 2).
+        timeout :
+            Seconds to wait for the result. Waits until the calibration ends if None. On timeout, the calibration is
+            cancelled: the controller leaves the calibration mode and processes the lengths again.
 
         Returns
         -------
         1 for good calibration
         0 for failed calibration
         """
+        future = self.start_calibration(pt)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            logging.info(f'Point {pt} calibration still in progress after {timeout} seconds. Calibration cancelled.')
+            self.cancel_calibration(pt)
+            return future.result()  # 0, unless the result was received in the meantime.
 
-        logging.info("Calibration Mode Enable.")
+    def start_calibration(self, pt: int) -> Future:
+        """Start the calibration of point `pt` without blocking.
 
-        was_listening = self.is_listening
+        The calibration is a mode of the listener: the board calibration messages (`&<pt>r#`, `&<pt>c#`, `&<pt>e#`)
+        are processed like any other message and the listening threads keep running. Each step is sent to the
+        `calibration_callbacks` as a CalibrationProgress.
 
-        self.stop_listening()
+        Returns
+        -------
+        Future resolved with 1 for good calibration and 0 for failed calibration.
+        """
+        future = Future()
+        if not self.is_listening:
+            logging.info('Cannot calibrate, the controller is not listening.')
+            future.set_result(0)
+            return future
+
+        with self.calibration_lock:
+            previous = self.calibration_future
+            self.calibration_pt, self.calibration_future = pt, future
+        if previous is not None:
+            previous.set_result(0)
 
-        self.client.clear()
-        self.client.send(f"&{pt}r#")
-        self.client.set_timeout(5)
-        msg = self.client.receive()
-        logging.info(f"Calibration message received: {msg}")
-        try:
-            if f"&{pt}r#\r" in msg:
-                pt_value = self.internal_board_state.__dict__[f"cal_pt_{pt}"]
-                logging.info(f"Calibration for point {pt}. Set stylus down at {pt_value} mm ...")
-                while True:
-                    if f'&{pt}c' in msg:
-                        logging.info(f'Point {pt} calibrated.')
-                        return 1
-                    if f'&{pt}e' in msg:
-                        logging.info(f'Point {pt} calibration exited.')
-                        return 0
-                    msg += self.client.receive()
-            else:
-                return 0
-        except KeyError:
+        logging.info("Calibration Mode Enable.")
+        self._calibration_progress(CalibrationProgress(pt, 'started'))
+        ready = self.command_handler.queue_command(protocol.start_calibration(pt), priority=PRIORITY_INTERACTIVE)
+        ready.add_done_callback(lambda _ready: self._calibration_ready(pt, _ready))
+        return future
+
+    def _calibration_ready(self, pt: int, ready: Future):
+        if ready.cancelled() or ready.exception() is not None:
             logging.info('Calibration Failed.')
-            return 0
-        finally:
-            self.client.socket.settimeout(self.client.default_timeout)
-            if was_listening:
-                self.start_listening()
+            self._end_calibration(0, 'failed', pt)
+        else:
+            position = self.internal_board_state.__dict__[f"cal_pt_{pt}"]
+            logging.info(f"Calibration for point {pt}. Set stylus down at {position} mm ...")
+            self._calibration_progress(CalibrationProgress(pt, 'ready', position))
+
+    def calibration_status(self, status: protocol.CalibrationStatus):
+        """Called by the listener on the calibration results (`&<pt>c#` or `&<pt>e#`)."""
+        if status.status == 'c':
+            logging.info(f'Point {status.pt} calibrated.')
+            self._end_calibration(1, 'calibrated', status.pt)
+            self.c_check_calibration_state()
+        else:
+            logging.info(f'Point {status.pt} calibration exited.')
+            self._end_calibration(0, 'exited', status.pt)
+
+    def cancel_calibration(self, pt: int = None):
+        """Leave the calibration mode of point `pt` (of any point if None). The calibration result is 0."""
+        self._end_calibration(0, 'cancelled', pt)
+
+    def is_calibrating(self) -> bool:
+        return self.calibration_future is not None
+
+    def _end_calibration(self, result: int, status: str, pt: int = None):
+        """Resolve the calibration future of point `pt` (of any point if None)."""
+        with self.calibration_lock:
+            if self.calibration_future is None or pt not in (None, self.calibration_pt):
+                return
+            future, pt = self.calibration_future, self.calibration_pt
+            self.calibration_pt, self.calibration_future = None, None
+        self.command_handler.wake_up()  # Telemetry held back during the calibration can be sent.
+        self._calibration_progress(CalibrationProgress(pt, status))
+        future.set_result(result)
+
+    def _calibration_progress(self, progress: CalibrationProgress):
+        for callback in self.calibration_callbacks:
+            callback(progress)
 
     def c_ping(self):
-        self.command_handler.queue_command("&a#", "%a#\r")
+        return self.command_handler.queue_command(protocol.ping())
 
     def c_get_board_stats(self):
-        self.command_handler.queue_command("b#", "regex_%b.*#\r")
+        return self.command_handler.queue_command(protocol.get_board_stats())
 
     def c_get_battery_level(self):
-        self.command_handler.queue_command('&q#', "regex_%q:\d+,\d+#\r")
+        return self.command_handler.queue_command(protocol.get_battery_level(), priority=PRIORITY_TELEMETRY)
 
     def c_get_battery_time_to_empty(self):
         """Micro Only"""
-        self.command_handler.queue_command('&qe#', "regex_%qe:\d+#\r")
+        return self.command_handler.queue_command(protocol.get_battery_time_to_empty(), priority=PRIORITY_TELEMETRY)
 
     def c_get_temperature_humidity(self):
-        self.command_handler.queue_command('&t#', "regex_%t,\d+,\d+#\r")
+        return self.command_handler.queue_command(protocol.get_temperature_humidity(), priority=PRIORITY_TELEMETRY)
 
     def c_board_initialization(self):
-        self.command_handler.queue_command("&init#", ["Setting EEPROM init flag.\r", "Rebooting in 2 seconds.\r"])
-        time.sleep(1)
+        future = self.command_handler.queue_command(protocol.board_initialization(), timeout=COMMAND_TIMEOUT)
+        try:
+            future.result(timeout=COMMAND_TIMEOUT)
+        except (FutureTimeoutError, CancelledError):
+            logging.error('Board initialization reply not received.')
         self.close_client()
 
     def c_set_interface(self, value: int):
@@ -583,12 +1082,11 @@ class Dcs5Controller:
         -----
           Only the DCS5Linkstream Interface is now supported.
         """
-        host_app = {0: 'DCSLinkstream', 1: "FEED"}[value]
-        self.command_handler.queue_command(f"&pl,{value}#", [f'HostApp={host_app}\r', f"%pl,{value}#\r"])
+        return self.command_handler.queue_command(protocol.set_interface(value))
 
     def c_flash_fuel_gauge(self):
         """For the Micro the fuel gauge is the led rings."""
-        self.command_handler.queue_command("&ra#", "%ra#\r")
+        return self.command_handler.queue_command(protocol.flash_fuel_gauge())
 
     def c_set_fuel_gauge(self, value: int, color: list = None):
         """For the Micro the fuel gauge is the led rings.
@@ -600,12 +1098,9 @@ class Dcs5Controller:
             (r, g, b, w) Int representing hex value color value.
         """
         if self.devices_specifications.control_box.model == 'xt':
-            self.command_handler.queue_command(f"&lf,{value}#", f"%lf,{value}#\r")
+            return self.command_handler.queue_command(protocol.set_fuel_gauge(value))
         else:
-            color = list(map(str, color))
-            self.command_handler.queue_command(
-                f"&lf,{value},{','.join(color)}#", f"%lf,{value},{','.join(color)}#\r"
-            )
+            return self.command_handler.queue_command(protocol.set_fuel_gauge(value, color))
 
     def c_set_fuel_gauge_temporary(self, delay: int, value: int, color: list = None):
         """For the Micro the fuel gauge is the led rings.
@@ -620,21 +1115,19 @@ class Dcs5Controller:
             (r, g, b, w) Int representing hex value color value.
         """
         if self.devices_specifications.control_box.model == 'xt':
-            self.command_handler.queue_command(f"&lt,{delay},{value}#", f"%lt,{delay},{value}#\r")
+            return self.command_handler.queue_command(protocol.set_fuel_gauge_temporary(delay, value))
         else:
-            color = list(map(str, color))
-            self.command_handler.queue_command(
-                f"&lt,{delay},{value},{','.join(color)}#", f"%lt,{delay},{value},{','.join(color)}#\r"
-            )
+            return self.command_handler.queue_command(protocol.set_fuel_gauge_temporary(delay, value, color))
 
     def c_set_backlighting_level(self, level: int, persistent=True):
         if level is None:
             level = self.control_box_parameters.max_backlighting_level
 
         if 0 <= level <= self.control_box_parameters.max_backlighting_level:
-            self.command_handler.queue_command(f'&la,{level}#', f"%la,{level}#\r")
             if persistent is True:
                 self.persistent_backlight_level = level
+                self._state_changed()
+            return self.command_handler.queue_command(protocol.set_backlighting_level(level))
         else:
             logging.warning(f"Backlighting level range: (0, {self.control_box_parameters.max_backlighting_level})")
 
@@ -642,7 +1135,7 @@ class Dcs5Controller:
         if level is None:
             level = self.control_box_parameters.max_backlighting_level
         if 0 <= level <= self.control_box_parameters.max_backlighting_level:
-            self.command_handler.queue_command(f'&lk,{level},{key}#', f"%lk,{level},{key}#\r")
+            return self.command_handler.queue_command(protocol.set_key_backlighting_level(level, key))
         else:
             logging.warning(f"Backlighting level range: (0, {self.control_box_parameters.max_backlighting_level})")
 
@@ -656,42 +1149,45 @@ class Dcs5Controller:
         """
         When disabled (false): %t0 %t1 are not sent
         """
-        self.command_handler.queue_command(f'&sn,{int(value)}#', f'%sn:{int(value)}#\r')
+        return self.command_handler.queue_command(protocol.set_stylus_detection_message(value))
 
     def c_set_stylus_settling_delay(self, value: int = 1):
         if self.control_box_parameters.min_settling_delay <= value <= self.control_box_parameters.max_settling_delay:
-            self.command_handler.queue_command(f"&di,{value}#", f"%di:{value}#\r")
+            return self.command_handler.queue_command(protocol.set_stylus_settling_delay(value))
         else:
             logging.warning(
                 f"Settling delay value range: ({self.control_box_parameters.min_settling_delay}, {self.control_box_parameters.max_settling_delay})")
 
     def c_set_stylus_max_deviation(self, value: int):
         if self.control_box_parameters.min_max_deviation <= value <= self.control_box_parameters.max_max_deviation:
-            self.command_handler.queue_command(f"&dm,{value}#", f"%dm:{value}#\r")
+            return self.command_handler.queue_command(protocol.set_stylus_max_deviation(value))
         else:
             logging.warning(
                 f"Settling delay value range: ({self.control_box_parameters.min_max_deviation}, {self.control_box_parameters.max_max_deviation})")
 
     def c_set_stylus_number_of_reading(self, value: int = 5):
-        self.command_handler.queue_command(f"&dn,{value}#", f"%dn:{value}#\r")
+        return self.command_handler.queue_command(protocol.set_stylus_number_of_reading(value))
 
     def c_restore_cal_data(self):
-        self.command_handler.queue_command("&cr,m1,m2,raw1,raw2#", None)
+        return self.command_handler.queue_command(protocol.restore_cal_data('m1', 'm2', 'raw1', 'raw2'))
 
     def c_clear_cal_data(self):
-        self.command_handler.queue_command("&ca#", None)
         self.internal_board_state.calibrated = False
+        self._state_changed()
+        return self.command_handler.queue_command(protocol.clear_cal_data())
 
     def c_check_calibration_state(self):
-        self.command_handler.queue_command('&u#', 'regex_%u:\d#\r')
+        return self.command_handler.queue_command(protocol.check_calibration_state())
 
     def c_set_calibration_points_mm(self, pt: int, pos: int):
-        self.command_handler.queue_command(f'&{pt}mm,{pos}#', f'%{pt}mm,{pos}#\r')
+        return self.command_handler.queue_command(protocol.set_calibration_point_mm(pt, pos))
 
     def start_marel_listening(self):
         logging.info(f'starting Marel: {self.config.client.marel_ip_address}')
         if not self.marel:
             if self.config.client.marel_ip_address:
+                from marel_marine_scale_controller.marel_controller import MarelController
+
                 self.marel = MarelController(host=self.config.client.marel_ip_address)
             else:
                 pass # fixme maybe
@@ -713,193 +1209,318 @@ class Dcs5Controller:
         if self.marel is not None:
             weight = self.marel.get_weight(self.marel.units)
             if self.marel.weight is not None:
-                self.to_keyboard(weight)
-                if self.auto_enter is True:
-                    self.to_keyboard('enter')
+                self.publish_output(OutputEvent(
+                    'marel', self.marel.weight, weight, keys=[weight, 'enter'] if self.auto_enter is True else [weight],
+                    units=self.marel.units
+                ))
+
+
+@dataclass
+class PendingCommand:
+    """A queued or sent command waiting for its replies."""
+    command: protocol.Command
+    future: Future
+    timeout: Optional[float]
+    replies: List[protocol.Reply] = field(default_factory=list)
+    priority: int = PRIORITY_INTERACTIVE
+    sent_time: float = None
+    deadline: float = None
 
 
 class CommandHandler:
     def __init__(self, controller: Dcs5Controller):
         self.controller = controller
 
-        self.send_queue = Queue()
-        self.received_queue = Queue()
-        self.expected_message_queue = Queue()
+        # The condition guards the queues and wakes the handler on new commands, new replies or stop.
+        self.condition = threading.Condition()
+        self.send_queue: List[Tuple[int, int, PendingCommand]] = []  # heap of (priority, sequence, command)
+        self._sequence = count()
+        self._default_priority = threading.local()
+        self.received_queue: Deque[protocol.BoardMessage] = deque()
+        self.pending_commands: List[PendingCommand] = []  # Sent commands waiting for replies.
+        self.sending: PendingCommand = None  # Command taken from the send queue and not yet in pending_commands.
+
+        self.send_interval = INITIAL_SEND_INTERVAL
+        self.last_sent_time: float = 0
+        self.last_ack_time: float = 0
+
+        self.paused = threading.Event()  # Set while the command handler thread is paused.
+
+    @contextmanager
+    def priority(self, priority: int):
+        """Set the default priority of the commands queued by the current thread."""
+        previous = getattr(self._default_priority, 'value', PRIORITY_INTERACTIVE)
+        self._default_priority.value = priority
+        try:
+            yield
+        finally:
+            self._default_priority.value = previous
 
-    def queue_command(self, command: str, message: Union[str, List[str]] = None):
-        if message is not None:
-            if isinstance(message, list):
-                [self.expected_message_queue.put(msg) for msg in message]
-            else:
-                self.expected_message_queue.put(message)
-        self.send_queue.put(command)
-        logging.info(f'Queuing: Command -> {[command]}, Expected -> {[message]}')
+    def queue_command(self, command: protocol.Command, timeout: float = None, priority: int = None) -> Future:
+        """Queue a command to be sent to the board.
+
+        Commands are sent by priority (PRIORITY_INTERACTIVE, PRIORITY_SYNC then PRIORITY_TELEMETRY) and in queuing
+        order within a priority. Telemetry commands are held back while the stylus is in use.
+
+        A keyed command replaces the queued command with the same key, which keeps its place in the queue and its
+        future (latest wins). A keyed command setting the value already in the InternalBoardState is not sent.
+
+        Returns
+        -------
+        Future resolved with the last reply (BoardMessage) of the command, or None if no reply is expected.
+        It fails with a TimeoutError if the replies are not received within `timeout` seconds of sending. If
+        `timeout` is None, it is derived from the ping round-trip time when the command is sent.
+        """
+        if priority is None:
+            priority = getattr(self._default_priority, 'value', PRIORITY_INTERACTIVE)
+        with self.condition:
+            if command.key is not None:
+                if (future := self._coalesce(command, timeout, priority)) is not None:
+                    return future
+            pending = PendingCommand(command, Future(), timeout, list(command.replies), priority)
+            heapq.heappush(self.send_queue, (priority, next(self._sequence), pending))
+            self._notify()
+        logging.info(f'Queuing: Command -> {[command.payload]}, Expected -> {list(command.replies)}')
+        return pending.future
+
+    def _coalesce(self, command: protocol.Command, timeout: float, priority: int) -> Optional[Future]:
+        """Merge `command` with the queued command of the same key or skip it if the board already has its value.
+
+        Returns the future of the command, or None if the command has to be queued. Called with the condition held.
+        """
+        index, queued = next(
+            ((index, item[-1]) for index, item in enumerate(self.send_queue) if item[-1].command.key == command.key),
+            (None, None)
+        )
+        in_flight = self.pending_commands + ([self.sending] if self.sending is not None else [])
+        if not any(pending.command.key == command.key for pending in in_flight):
+            if (field_name := COMMAND_STATE_FIELDS.get(command.key)) is not None:
+                if getattr(self.controller.internal_board_state, field_name) == command.value:
+                    logging.info(f'Skipping: Command {[command.payload]}, board {field_name} is already {command.value}.')
+                    future = queued.future if queued is not None else Future()
+                    if queued is not None:
+                        self.send_queue.pop(index)
+                        heapq.heapify(self.send_queue)
+                    future.set_result(None)
+                    return future
+
+        if queued is not None:
+            logging.info(f'Coalescing: Command {[queued.command.payload]} -> {[command.payload]}')
+            queued.command, queued.timeout, queued.replies = command, timeout, list(command.replies)
+            if priority < queued.priority:
+                queued.priority = priority
+                self.send_queue[index] = (priority, self.send_queue[index][1], queued)
+                heapq.heapify(self.send_queue)
+            return queued.future
+        return None
+
+    def put_received(self, message: protocol.BoardMessage):
+        with self.condition:
+            self.received_queue.append(message)
+            self._notify()
+
+    def wake_up(self):
+        with self.condition:
+            self._notify()
+
+    def _notify(self):
+        self.condition.notify()
 
     def clear_queues(self):
-        self.send_queue.queue.clear()
-        self.received_queue.queue.clear()
-        self.expected_message_queue.queue.clear()
+        with self.condition:
+            for pending in self.pending_commands + [queued[-1] for queued in self.send_queue]:
+                pending.future.cancel()
+            self.pending_commands.clear()
+            self.send_queue.clear()
+            self.received_queue.clear()
+            self.send_interval = INITIAL_SEND_INTERVAL
         logging.info("Handler Queues Cleared.")
 
-    def processes_queues(self):
-        self.clear_queues()
-        logging.debug('listener_handler_sync_barrier set.')
-        self.controller.listener_handler_sync_barrier.wait()
+    def processes_queues(self, stop: threading.Event):
         logging.info('Command Handling Started')
-        while self.controller.is_listening:
+        while self.controller.wait_for_listening(stop, self.paused):
+            with self.condition:
+                self.condition.wait_for(self._has_work, timeout=self._time_to_next_event())
+            if self.controller.is_listening:
+                self.process_queues_once()
+        logging.info('Command Handling Stopped')
 
-            if not self.received_queue.empty():
-                self._process_commands()
+    def process_queues_once(self):
+        """Process the received messages, send the next command if it can be sent and expire the pending commands."""
+        with self.condition:
+            received = list(self.received_queue)
+            self.received_queue.clear()
+            pending = heapq.heappop(self.send_queue)[-1] if self._can_send() else None
+            self.sending = pending
+
+        for message in received:
+            self._process_commands(message)
+
+        if pending is not None:
+            self._send_command(pending)
+            self.sending = None
+
+        self._expire_pending_commands()
+
+    def _has_work(self) -> bool:
+        return not self.controller.is_listening or len(self.received_queue) > 0 or self._can_send()
+
+    def _can_send(self) -> bool:
+        """A command is sent right away if every sent command was acknowledged, otherwise it is paced."""
+        if len(self.send_queue) == 0:
+            return False
+        if self._is_held_back(self.send_queue[0][-1]):
+            return False
+        if len(self.pending_commands) == 0:
+            return True
+        return time.monotonic() >= self.last_sent_time + self.send_interval
+
+    def _time_to_next_event(self) -> Optional[float]:
+        """Time until the next paced send or command timeout. None if there is nothing to wait for."""
+        times = [pending.deadline for pending in self.pending_commands]
+        if len(self.send_queue) > 0:
+            if self._is_held_back(self.send_queue[0][-1]):
+                if not self.controller.is_calibrating():  # Otherwise, woken up when the calibration ends.
+                    times.append(self.controller.socket_listener.hold_until())
+            else:
+                times.append(self.last_sent_time + self.send_interval)
+        if len(times) == 0:
+            return None
+        return max(min(times) - time.monotonic(), 0)
+
+    def _is_held_back(self, pending: PendingCommand) -> bool:
+        """Telemetry is held back during a calibration and while the stylus is in use to keep the link free for
+        measurements."""
+        return pending.priority >= PRIORITY_TELEMETRY and (
+                self.controller.is_calibrating() or self.controller.socket_listener.stylus_in_use()
+        )
+
+    def _update_send_interval(self, pending: PendingCommand):
+        """Moving average of the time taken by the board to process a command.
+
+        Processing starts when the command is sent or when the previous acknowledgement is received.
+        """
+        now = time.monotonic()
+        sample = now - max(pending.sent_time, self.last_ack_time)
+        self.last_ack_time = now
+        self.send_interval += SEND_INTERVAL_SMOOTHING * (sample - self.send_interval)
+        self.send_interval = min(max(self.send_interval, MIN_SEND_INTERVAL), MAX_SEND_INTERVAL)
+
+    def _process_commands(self, received: protocol.BoardMessage):
+        state = self.controller.internal_board_state
+        match received:
+            case protocol.Ping():
+                logging.info('Ping command was received.')
+
+            case protocol.Interface(value=0):
+                state.board_interface = "Dcs5LinkStream"
+                logging.info(f'Interface set to DcsLinkStream')
+
+            case protocol.Interface(value=1):
+                state.board_interface = "FEED"
+                logging.info(f'Interface set to FEED')
+
+            case protocol.StylusStatusMessage(enabled=enabled):
+                state.stylus_status_msg = "enable" if enabled else "disable"
+                logging.info(f'Stylus Status Message {state.stylus_status_msg.capitalize()}')
+
+            case protocol.SettlingDelay(value=value):
+                state.stylus_settling_delay = value
+                logging.info(f"Stylus settling delay set to {value}")
+
+            case protocol.MaxDeviation(value=value):
+                state.stylus_max_deviation = value
+                logging.info(f"Stylus max deviation set to {value}")
+
+            case protocol.NumberOfReading(value=value):
+                state.number_of_reading = value
+                logging.info(f"Stylus number set to {value}")
+
+            case protocol.BoardStats(stats=stats):
+                logging.info(f'Board State: {stats}')
+                state.board_stats = stats
+                state.firmware = received.firmware
+                self.controller._state_changed()
+
+            case protocol.BatteryLevel(level=level, charging=charging):
+                logging.info(f'Battery level: {level}')
+                state.battery_level = level
+                if self.controller.devices_specifications.control_box.model == "xt":
+                    state.is_charging = charging
 
-            if not self.send_queue.empty():
-                self._send_command()
-                time.sleep(AFTER_SENT_SLEEP)
+            case protocol.BatteryTimeToEmpty(value=value):
+                logging.info(f'Battery time to empty: {value}')
+                state.is_charging = received.charging
 
-            time.sleep(HANDLER_SLEEP)
-        logging.debug('listener_handler stop barrier set.')
-        self.controller.listening_stopped_barrier.wait()
-        logging.info('Command Handling Stopped')
+            case protocol.TemperatureHumidity(temperature=temperature, humidity=humidity):
+                logging.info(f'temperature: {temperature}, humidity: {humidity}')
+                state.temperature = temperature
+                state.humidity = humidity
 
-    def _process_commands(self):
-        received = self.received_queue.get()
-
-        self._compared_with_expected(received)
-
-        if "%a#" in received:
-            self.controller.ping_event_check.set()
-            logging.info('Ping command was received. Ping event is set.')
-
-        elif "%pl," in received:
-            match = re.findall(f"%pl,(\d)#\r", received)
-            if len(match) > 0:
-                if match[0] == "0":
-                    self.controller.internal_board_state.board_interface = "Dcs5LinkStream"
-                    logging.info(f'Interface set to DcsLinkStream')
-                elif match[0] == "1":
-                    self.controller.internal_board_state.board_interface = "FEED"
-                    logging.info(f'Interface set to FEED')
-
-        elif "%sn:" in received:
-            match = re.findall(f"%sn:(\d)#\r", received)
-            if len(match) > 0:
-                if match[0] == "1":
-                    self.controller.internal_board_state.stylus_status_msg = "enable"
-                    logging.info('Stylus Status Message Enable')
-                else:
-                    self.controller.internal_board_state.stylus_status_msg = "disable"
-                    logging.info('Stylus Status Message Disable')
-
-        elif "%di:" in received:
-            match = re.findall(f"%di:(\d+)#\r", received)
-            if len(match) > 0:
-                self.controller.internal_board_state.stylus_settling_delay = int(match[0])
-                logging.info(f"Stylus settling delay set to {match[0]}")
-
-        elif "%dm:" in received:
-            match = re.findall(f"%dm:(\d+)#\r", received)
-            if len(match) > 0:
-                self.controller.internal_board_state.stylus_max_deviation = int(match[0])
-                logging.info(f"Stylus max deviation set to {int(match[0])}")
-
-        elif "%dn:" in received:
-            match = re.findall(f"%dn:(\d+)#\r", received)
-            if len(match) > 0:
-                self.controller.internal_board_state.number_of_reading = int(match[0])
-                logging.info(f"Stylus number set to {int(match[0])}")
-
-        elif "%b:" in received:
-            match = re.findall("%b:(.*)#", received)
-            if len(match) > 0:
-                logging.info(f'Board State: {match[0]}')
-                self.controller.internal_board_state.board_stats = match[0]
-                firmware_version = match[0].split(',')[1]
-                self.controller.internal_board_state.firmware = firmware_version[:-2] + '.' + firmware_version[-2:]
-
-        elif "%q:" in received:
-            match = re.findall("%q:(\d+),(\d+)#", received)
-            if len(match) > 0:
-                logging.info(f'Battery level: {match[0][0]}')
-                self.controller.internal_board_state.battery_level = int(match[0][0])
-                if self.controller.devices_specifications.control_box.model == "xt":
-                    self.controller.internal_board_state.is_charging = bool(int(match[0][1]))
-
-        elif "%qe:" in received:
-            match = re.findall("%qe:(\d+)#", received)
-            if len(match) > 0:
-                logging.info(f'Battery time to empty: {match[0]}')
-                if int(match[0]) == 65535:
-                    self.controller.internal_board_state.is_charging = True
-                else:
-                    self.controller.internal_board_state.is_charging = False
-
-        elif "%t," in received:
-            match = re.findall("%t,(\d+),(\d+)#", received)
-            if len(match) > 0:
-                logging.info(f'temperature: {match[0][0]}, humidity: {match[0][1]}')
-                self.controller.internal_board_state.temperature = int(match[0][0])
-                self.controller.internal_board_state.humidity = int(match[0][1])
-
-        elif "%u:" in received:
-            match = re.findall("%u:(\d)#", received)
-            if len(match) > 0:
-                if match[0] == '0':
-                    logging.info('Board is not calibrated.')
-                    self.controller.internal_board_state.calibrated = False
-                elif match[0] == '1':
-                    logging.info('Board is calibrated.')
-                    self.controller.internal_board_state.calibrated = True
-            else:
-                logging.error(f'Calibration state {received}')
+            case protocol.CalibrationState(calibrated=calibrated):
+                state.calibrated = calibrated
+                logging.info('Board is calibrated.' if calibrated else 'Board is not calibrated.')
+                self.controller._state_changed()
 
-        elif "%la," in received:
-            match = re.findall("%la,(\d+)#", received)
-            if len(match) > 0:
-                level = int(match[0])
-                self.controller.internal_board_state.backlighting_level = level
+            case protocol.BacklightLevel(level=level):
+                state.backlighting_level = level
                 logging.info(f'Backlight level set to {level}')
 
-        elif 'Cal Pt' in received:
-            logging.info(received.strip("\r") + " mm")
-            match = re.findall("Cal Pt (\d+) set to: (\d+)", received)  # used to work on firmwares v1.07 (I think) of XT.
-            if len(match) > 0:
-                self.controller.internal_board_state.__dict__[f'cal_pt_{match[0][0]}'] = int(match[0][1])
-
-        elif 'mm' in received:
-            logging.info(received.strip("\r") + " mm")
-            match = re.findall(f'%(\d+)mm,(\d+)#\r', received)
-            if len(match) > 0:
-                self.controller.internal_board_state.__dict__[f'cal_pt_{match[0][0]}'] = int(match[0][1])
-
-    def _compared_with_expected(self, received: str):
-        command_is_valid = False
-        expected = self.expected_message_queue.get()
-        logging.info(f'Received: {[received]}, Expected: {[expected]}')
-
-        if "regex_" in expected:
-            match = re.findall("(" + expected.strip('regex_') + ")", received)
-            if len(match) > 0:
-                command_is_valid = True
-        elif received == expected:
-            command_is_valid = True
-
-        if command_is_valid:
-            logging.info('Command Valid')
+            case protocol.CalibrationPoint(pt=pt, value=value):
+                logging.info(f"Cal Pt {pt} set to: {value} mm")
+                if pt in (1, 2):
+                    state.__dict__[f'cal_pt_{pt}'] = value
+                    self.controller._state_changed()
+
+        # The state is updated before the command future is resolved.
+        self._match_with_pending(received)
+
+    def _match_with_pending(self, received: protocol.BoardMessage):
+        """Resolve the oldest pending command expecting `received`."""
+        for pending in self.pending_commands:
+            for reply in pending.replies:
+                if reply.matches(received):
+                    pending.replies.remove(reply)
+                    if len(pending.replies) == 0:
+                        self.pending_commands.remove(pending)
+                        self._update_send_interval(pending)
+                        if isinstance(received, protocol.Ping):
+                            self.controller.rtt.add(time.monotonic() - pending.sent_time)
+                        pending.future.set_result(received)
+                    logging.info(f'Command Valid: {[pending.command.payload]} -> {[received]}')
+                    return
+        logging.error(f'Unexpected: Command received: {[received]}, No matching command.')
+
+    def _expire_pending_commands(self):
+        now = time.monotonic()
+        for pending in [p for p in self.pending_commands if p.deadline < now]:
+            self.pending_commands.remove(pending)
+            logging.error(f'Timeout: Command {[pending.command.payload]}, Missing -> {pending.replies}')
+            self.send_interval = min(self.send_interval * 2, MAX_SEND_INTERVAL)
+            pending.future.set_exception(FutureTimeoutError(f'No reply to {pending.command.payload}'))
+
+    def _send_command(self, pending: PendingCommand):
+        if pending.future.cancelled():
+            return
+        self.controller.client.send(pending.command.payload)
+        pending.sent_time = self.last_sent_time = time.monotonic()
+        logging.info(f'Command Sent: {[pending.command.payload]}')
+        if len(pending.replies) == 0:
+            pending.future.set_result(None)
         else:
-            logging.error(f'Unexpected: Command received: {[received]}, Command expected: {[expected]}')
-
-    def _send_command(self):
-        command = self.send_queue.get()
-        self.controller.client.send(command)
-        logging.info(f'Command Sent: {[command]}')
+            pending.deadline = pending.sent_time + (pending.timeout or self.controller.rtt.timeout())
+            self.pending_commands.append(pending)
 
 
 class SocketListener:
     """The socket listener also does the command interpretation."""
     def __init__(self, controller: Dcs5Controller):
         self.controller = controller
-        self.message_queue = Queue()
-        self.buffer = ""
+        self.framer = BoardMessageFramer()
         self.swipe_triggered = False
+        self.last_stylus_input: float = 0
+        self.last_receive_time: float = 0
+        self.paused = threading.Event()  # Set while the listener thread is paused.
         self.with_mode = False
         self.last_key = None
         self.last_command = None
@@ -912,117 +1533,132 @@ class SocketListener:
 
         self.controller.client.clear()
         self.clear_buffer()
-        self.message_queue.queue.clear()
+        logging.info("Listener Queue and Client Buffers Cleared.")
 
     def clear_buffer(self):
-        self.buffer = ""
+        self.framer.clear()
 
-    def listen(self):
-        self.reset()
-        logging.info("Listener Queue and Client Buffers Cleared.")
-        logging.debug('listener_handler_sync_barrier set.')
-        self.controller.listener_handler_sync_barrier.wait()
-
-        logging.info('Listening started')
-        while self.controller.is_listening:
-            self.buffer += self.controller.client.receive()
-            if len(self.buffer) > 0:
-                logging.info(f'Raw Buffer: {[self.buffer]}')
-                self._split_board_message()
-                self._process_board_message()
-            time.sleep(LISTENER_SLEEP)
-
-        logging.debug('listener_handler_sync_ stop barrier set.')
-        self.controller.listening_stopped_barrier.wait()
-        logging.info('Listening stopped')
-
-    def _split_board_message(self):
-        msg = self.buffer.split(BOARD_MESSAGE_DELIMITER, 1)
-        if len(msg) > 1:
-            self.message_queue.put(msg[0] + BOARD_MESSAGE_DELIMITER)
-            self.buffer = msg[1]
-
-    def _process_board_message(self):
+    def hold_until(self) -> float:
+        """Time (monotonic) until which the stylus is considered in use.
+
+        The board only reports the end of a measurement (`%l` or `%s` then `%l`, the stylus status messages are
+        disabled by the synchronization). The stylus is in use during the quiet window following its last message,
+        or until the length ending a swipe is received, for at most SWIPE_HOLD_TIMEOUT seconds.
+        """
+        if self.swipe_triggered:
+            return self.last_stylus_input + max(SWIPE_HOLD_TIMEOUT, STYLUS_QUIET_WINDOW)
+        return self.last_stylus_input + STYLUS_QUIET_WINDOW
+
+    def stylus_in_use(self) -> bool:
+        return time.monotonic() < self.hold_until()
+
+    def listen(self, stop: threading.Event):
+        logging.info('Listener Started')
+        while self.controller.wait_for_listening(stop, self.paused):
+            self.process_data(self.controller.client.wait_receive())
+        logging.info('Listener Stopped')
+
+    def process_data(self, data: bytes):
+        """Process the board messages completed by `data` (raw bytes received)."""
+        if len(data) > 0:
+            self.last_receive_time = time.monotonic()
+            logging.info(f'Raw Buffer: {[data]}')
+            for message in self.framer.feed(data):
+                self._process_board_message(message)
+
+    def _process_board_message(self, message: str):
         """ANALYZE SOLICITED VS UNSOLICITED MESSAGE"""
-        while not self.message_queue.empty():
-            message = self.message_queue.get()
-            logging.info(f'Received Message: {message}')
+        logging.info(f'Received Message: {message}')
 
-            if "@@@" in message:
-                logging.info('Usb Cabled plugged in.')
-                continue
+        output_value: str = None
+        board_message = protocol.decode(message)
+        logging.info(f"Message: {board_message}")
 
-            output_value: str = None
-            msg_type, msg_value = self._decode_board_message(message)
-            logging.info(f"Message Type: {msg_type}, Message Value: {msg_value}")
+        match board_message:
+            case protocol.UsbPlugged():
+                logging.info('Usb Cabled plugged in.')
+                return
 
-            if msg_type == "controller_box_key":
-                output_value = self._map_control_box_output(msg_value)
+            case protocol.ControlBoxKey(key=key):
+                output_value = self._map_control_box_output(key)
                 logging.info(f"Controller Box Output: {output_value}")
 
-            elif msg_type == 'swipe':
-                self.swipe_value = msg_value
-                if msg_value > self.controller.config.output_modes.swipe_threshold:
+            case protocol.StylusUpDown():
+                self.last_stylus_input = time.monotonic()
+
+            case protocol.Swipe(value=value):
+                self.last_stylus_input = time.monotonic()
+                self.swipe_value = value
+                if value > self.controller.config.output_modes.swipe_threshold:
                     self.swipe_triggered = True
 
-            elif msg_type == 'length':
-                if self.swipe_triggered is True:
-                    self._check_for_stylus_swipe(msg_value)
+            case protocol.Notice():
+                logging.warning(f'Board notice: {board_message.text} Internal Board State Values cleared.')
+                self.controller.internal_board_state = InternalBoardState()
+                self.controller.is_sync = False
+                self.controller.command_handler.put_received(board_message)
+
+            case protocol.CalibrationStatus() if not board_message.solicited:
+                self.controller.calibration_status(board_message)
+
+            case protocol.Length(value=value):
+                self.last_stylus_input = time.monotonic()
+                if self.controller.is_calibrating():
+                    self.swipe_triggered = False
+                    logging.info('Calibration in progress. Length not processed.')
+                elif self.swipe_triggered is True:
+                    self._check_for_stylus_swipe(value)
+                    self.controller.command_handler.wake_up()
                 else:
-                    output_value = self._map_board_length_measurement(msg_value)
-
-            elif msg_type == "solicited":
-                self.controller.command_handler.received_queue.put(msg_value)
-
-            if output_value is not None:
-                self.last_command = output_value
-                self._process_output(output_value)
-
-                if msg_type == 'length' \
-                        and self.controller.output_mode == 'length' \
-                        and self.controller.auto_enter is True:
-                    self.controller.to_keyboard('enter')
-
-    @staticmethod
-    def _decode_board_message(value: str) -> Tuple[str,str]:
-        """
-        """
-        patterns = [
-            "%t,([0-9])#",  # stylus up/down
-            "%l,([0-9]*)#",  # length measurement
-            "%s,(-?\d+)#",  # swipe
-            "%hs,([0-9])#",  # Micro button
-            "%k,([0-9]{2})#",  # Xt button v2.0.0+
-
-        ]
-        match = re.findall("|".join(patterns), value)
-        if len(match) > 0:
-            if match[0][1] != "":
-                return 'length', int(match[0][1])
-            elif match[0][2] != "":
-                return 'swipe', int(match[0][2])
-            elif match[0][3] != "":
-                return 'controller_box_key', match[0][3]
-            elif match[0][4] != "":
-                return 'controller_box_key', match[0][4]
-        else:
-            return 'solicited', value
-
-    def _process_output(self, value: Tuple[List[str], str]):
+                    output_value = self._map_board_length_measurement(value)
+
+            case _ if board_message.solicited:
+                self.controller.command_handler.put_received(board_message)
+
+        if output_value is not None:
+            self.last_command = output_value
+            event = self._output_event(board_message, output_value)
+            self._process_output(output_value, event)
+
+            if isinstance(board_message, protocol.Length) \
+                    and self.controller.output_mode == 'length' \
+                    and self.controller.auto_enter is True:
+                event.keys.append('enter')
+            self._publish(event)
+
+    def _output_event(self, board_message: protocol.BoardMessage, output_value) -> OutputEvent:
+        if isinstance(board_message, protocol.ControlBoxKey):
+            return OutputEvent('control_box', board_message.key, output_value, output_mode=self.controller.output_mode,
+                               key=self.last_key)
+        if self.controller.output_mode == 'length':
+            return OutputEvent('board', board_message.value, output_value, output_mode='length',
+                               stylus=self.controller.stylus, units=self.controller.length_units)
+        return OutputEvent('board', board_message.value, output_value, output_mode=self.controller.output_mode,
+                           stylus=self.controller.stylus, key=self.last_key)
+
+    def _publish(self, event: OutputEvent):
+        """Events without keyboard values (only controller commands) are not published."""
+        if len(event.keys) > 0:
+            self.controller.publish_output(event)
+
+    def _process_output(self, value: Tuple[List[str], str], event: OutputEvent):
+        """Controller commands are executed and keyboard values are appended to `event.keys`."""
         if isinstance(value, list):
             for _value in value:
-                self._process_output(_value)
+                self._process_output(_value, event)
         elif isinstance(value, str):
             if value == "MODE":
                 self.set_with_mode(not self.with_mode)
             else:
                 self.set_with_mode(False)
                 if value in self.controller.controller_commands:
+                    self._publish(copy.copy(event))  # The keys preceding the command are output first.
+                    event.keys = []
                     self.controller.mapped_controller_commands(value)
                 else:
                     if value.startswith(PRINT_COMMAND):
                         value = value[len(PRINT_COMMAND):]
-                    self.controller.to_keyboard(value)
+                    event.keys.append(value)
         else:
             raise ValueError(f'CRITICAL error in _process_output.')
 
@@ -77,6 +77,9 @@ VALID_KEYBOARD_KEYS = [
     'command', 'option', 'optionleft', 'optionright'
 ]
 VALID_UNITS = ["mm", "cm"]
+VALID_KEYBOARD_BACKENDS = ["pyautogui", "xtest", "null"]
+VALID_OUTPUT_SINKS = ["keyboard", "ndjson", "csv", "socket", "publisher"]
+VALID_SOCKET_PROTOCOLS = ["udp", "tcp"]
 
 
 def check_key_map(key_map: Dict[str, str]):
@@ -120,6 +123,9 @@ class LaunchSettings:
     length_units: str
     stylus: str
     auto_enter: bool
+    paste_threshold: int = None
+    keyboard_backend: str = "pyautogui"
+    key_delay: float = 0.01
 
     def __post_init__(self):
         if self.length_units not in VALID_UNITS:
@@ -128,6 +134,12 @@ class LaunchSettings:
             raise ConfigError('Invalid value for `launch_settings/dynamic_stylus_mode`. Must but in (true/false)')
         if not isinstance(self.auto_enter, bool):
             raise ConfigError('Invalid value for `launch_settings/auto_enter`. Must but in (true/false)')
+        if self.paste_threshold is not None and (not isinstance(self.paste_threshold, int) or self.paste_threshold < 1):
+            raise ConfigError('Invalid value for `launch_settings/paste_threshold`. Must be a positive integer or null')
+        if self.keyboard_backend not in VALID_KEYBOARD_BACKENDS:
+            raise ConfigError(f'Invalid value for `launch_settings/keyboard_backend`. Must be one of {VALID_KEYBOARD_BACKENDS}')
+        if not isinstance(self.key_delay, (int, float)) or not 0 <= self.key_delay <= 1:
+            raise ConfigError('Invalid value for `launch_settings/key_delay`. Must be a number of seconds in [0, 1]')
         #if not isinstance(self.backlighting_auto_mode, bool):
         #    raise ConfigError('Invalid value for `launch_settings/back_light_auto_mode`. Must but in (true/false)')
 
@@ -178,6 +190,34 @@ class KeyMaps:
         check_key_map(self.board_mode)
 
 
+@dataclass
+class OutputSink:
+    type: str
+    path: str = None
+    host: str = None
+    port: int = None
+    protocol: str = "udp"
+    batch_size: int = 1
+    backlog: int = None
+
+    def __post_init__(self):
+        if self.type not in VALID_OUTPUT_SINKS:
+            raise ConfigError(f'Invalid value for `output_sinks/type`. Must be one of {VALID_OUTPUT_SINKS}')
+        if self.type in ["ndjson", "csv"] and not self.path:
+            raise ConfigError(f'Missing value for `output_sinks/path` ({self.type} sink).')
+        if self.type == "socket":
+            if not self.host or not isinstance(self.port, int):
+                raise ConfigError('Missing value for `output_sinks/host` or `output_sinks/port` (socket sink).')
+        if self.type == "publisher" and not isinstance(self.port, int):
+            raise ConfigError('Missing value for `output_sinks/port` (publisher sink).')
+        if self.type in ["socket", "publisher"] and self.protocol not in VALID_SOCKET_PROTOCOLS:
+            raise ConfigError(f'Invalid value for `output_sinks/protocol`. Must be one of {VALID_SOCKET_PROTOCOLS}')
+        if self.backlog is not None and (not isinstance(self.backlog, int) or self.backlog < 1):
+            raise ConfigError('Invalid value for `output_sinks/backlog`. Must be a positive integer (bytes)')
+        if not isinstance(self.batch_size, int) or self.batch_size < 1:
+            raise ConfigError('Invalid value for `output_sinks/batch_size`. Must be a positive integer')
+
+
 @dataclass
 class ControllerConfiguration:
     client: Client
@@ -185,6 +225,7 @@ class ControllerConfiguration:
     reading_profiles: Dict[str, ReadingProfile]
     output_modes: OutputModes
     key_maps: KeyMaps
+    output_sinks: List[OutputSink] = None
 
     def __post_init__(self):
         self.client = Client(**self.client)
@@ -192,6 +233,9 @@ class ControllerConfiguration:
         self.reading_profiles = {k: ReadingProfile(**v) for k, v in self.reading_profiles.items()}
         self.output_modes = OutputModes(**self.output_modes)
         self.key_maps = KeyMaps(**self.key_maps)
+        if self.output_sinks is None:  # Optional section. Keyboard only by default.
+            self.output_sinks = [{"type": "keyboard"}]
+        self.output_sinks = [OutputSink(**sink) for sink in self.output_sinks]
 
         if self.launch_settings.reading_profile not in self.reading_profiles:
             raise ConfigError('Invalid value for  `launch_settings/reading_profile`. Value not in reading_profiles.')
@@ -0,0 +1,125 @@
+"""
+Module that contains the warm-start snapshot of the controller.
+
+The snapshot holds the runtime settings of the controller and the last known state of each board (by mac address).
+It is saved (by the SnapshotWriter thread) when the controller state changes and restored when the controller is
+created.
+
+The runtime settings are only restored if the configuration files did not change (config hash).
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field, asdict
+from json.decoder import JSONDecodeError
+from pathlib import Path
+from typing import *
+
+from dcs5.utils import json2dict, dict2json
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_SAVE_DELAY = 1  # seconds. The changes made within the delay are saved together.
+
+
+@dataclass
+class RuntimeSettings:
+    dynamic_stylus_settings: bool = None
+    output_mode: str = None
+    length_units: str = None
+    stylus: str = None
+    auto_enter: bool = None
+    backlighting_level: int = None
+
+
+@dataclass
+class BoardSnapshot:
+    firmware: str = None
+    cal_pt_1: int = None
+    cal_pt_2: int = None
+    calibrated: bool = None
+    port: int = None
+
+
+@dataclass
+class ControllerSnapshot:
+    version: int = SNAPSHOT_VERSION
+    config_hash: str = None
+    runtime_settings: RuntimeSettings = field(default_factory=RuntimeSettings)
+    boards: Dict[str, BoardSnapshot] = field(default_factory=dict)
+
+    def __post_init__(self):
+        if isinstance(self.runtime_settings, dict):
+            self.runtime_settings = RuntimeSettings(**self.runtime_settings)
+        self.boards = {
+            mac_address: BoardSnapshot(**board) if isinstance(board, dict) else board
+            for mac_address, board in self.boards.items()
+        }
+
+
+def config_hash(*paths: Union[str, Path]) -> str:
+    """Sha256 of the content of the configuration files."""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def load_snapshot(path: Union[str, Path]) -> Optional[ControllerSnapshot]:
+    """Returns None if the file is missing, invalid or from another snapshot version."""
+    try:
+        data = json2dict(path)
+        if data.get('version') != SNAPSHOT_VERSION:
+            return None
+        return ControllerSnapshot(**data)
+    except (OSError, JSONDecodeError, TypeError, AttributeError):
+        return None
+
+
+def save_snapshot(path: Union[str, Path], snapshot: ControllerSnapshot):
+    """The snapshot is written to a temporary file which then replaces the previous snapshot."""
+    tmp_path = str(path) + '.tmp'
+    dict2json(tmp_path, asdict(snapshot))
+    os.replace(tmp_path, path)
+
+
+class SnapshotWriter:
+    """Save the snapshots from a background thread so that the state changes never wait for the disk.
+
+    A snapshot is saved SNAPSHOT_SAVE_DELAY seconds after it is queued. Snapshots queued in the meantime replace it
+    (the last one is saved).
+    """
+    def __init__(self, path: Union[str, Path], delay: float = SNAPSHOT_SAVE_DELAY):
+        self.path = path
+        self.delay = delay
+        self._pending: ControllerSnapshot = None
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='snapshot writer', daemon=True)
+        self._thread.start()
+
+    def save(self, snapshot: ControllerSnapshot):
+        """Queue `snapshot` to be saved. It must not be modified afterward."""
+        with self._condition:
+            self._pending = snapshot
+            self._condition.notify()
+
+    def flush(self):
+        """Save the queued snapshot now, from the calling thread."""
+        with self._condition:
+            snapshot, self._pending = self._pending, None
+        if snapshot is not None:
+            with self._write_lock:
+                try:
+                    save_snapshot(self.path, snapshot)
+                except OSError as err:
+                    logging.error(f'Snapshot could not be saved: {err}')
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending is not None)
+            time.sleep(self.delay)
+            self.flush()
@@ -0,0 +1,203 @@
+"""
+This module contains the local publish server of the output events.
+
+Subscribers receive every published event as newline-delimited JSON (NDJSON):
+    tcp : subscribers connect to the server. Each event is a line of the stream.
+    udp : subscribers send a datagram (any content) to the server to subscribe and `unsubscribe` to unsubscribe.
+        Each event is a datagram.
+
+`publish` never blocks: events are queued and sent by the publisher thread with non-blocking writes. Each tcp
+subscriber has a backlog (bytes not yet sent). A subscriber whose backlog exceeds the limit is too slow and is
+disconnected, so that it never stalls the publisher or the other subscribers.
+"""
+import logging
+import selectors
+import socket
+from collections import deque
+from dataclasses import dataclass
+from typing import *
+
+from dcs5.selector_loop import SelectorLoop
+
+PUBLISHER_HOST = '127.0.0.1'
+PUBLISHER_BACKLOG = 1024 * 1024  # bytes
+PUBLISHER_SEND_BUFFER = 64 * 1024  # bytes. Kernel send buffer of the tcp subscribers (bounds the unsent data).
+PUBLISHER_MAX_UDP_SUBSCRIBERS = 64
+PUBLISHER_RECEIVE_SIZE = 4096
+
+
+@dataclass
+class PublisherStats:
+    events: int = 0
+    subscribers: int = 0  # current
+    connections: int = 0  # total
+    slow_disconnections: int = 0
+    dropped_datagrams: int = 0
+
+
+@dataclass
+class Subscriber:
+    socket: socket.socket
+    address: Tuple[str, int]
+    backlog: bytearray
+    writing: bool = False  # Registered for write events (backlog not empty).
+
+
+class EventPublisher:
+    def __init__(self, host: str = PUBLISHER_HOST, port: int = 0, protocol: str = 'tcp',
+                 backlog: int = PUBLISHER_BACKLOG):
+        """
+        Parameters
+        ----------
+        host :
+        port :
+            Address of the server. A free port is used if `port` is 0 (see `address`).
+        protocol :
+            'tcp' or 'udp'.
+        backlog :
+            Maximum number of bytes waiting to be sent to a tcp subscriber.
+        """
+        self.protocol = protocol
+        self.backlog = backlog
+        self.stats = PublisherStats()
+        self.subscribers: Dict[socket.socket, Subscriber] = {}
+        self.udp_subscribers: Set[Tuple[str, int]] = set()
+
+        self.messages: Deque[bytes] = deque()
+        self._send_pending = False
+
+        if protocol == 'udp':
+            self.server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.server.bind((host, port))
+        else:
+            self.server = socket.create_server((host, port))
+        self.server.setblocking(False)
+
+        self.loop = SelectorLoop('event publisher', on_stop=self._on_stop)
+        self.loop.call(self.loop.register, self.server, selectors.EVENT_READ, self._on_server)
+        logging.info(f'Event publisher started ({protocol}://{self.address[0]}:{self.address[1]}).')
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.server.getsockname()
+
+    def publish(self, message: str):
+        """Queue a message (a line without its newline) for every subscriber. Does not block."""
+        self.messages.append(message.encode('utf-8') + b'\n')
+        if not self._send_pending:
+            self._send_pending = True
+            self.loop.call(self._send_messages)
+
+    def close(self):
+        self.loop.close()
+
+    def _on_stop(self):
+        for subscriber in list(self.subscribers.values()):
+            self._remove(subscriber)
+        self.server.close()
+        logging.info('Event publisher stopped.')
+
+    def _send_messages(self):
+        self._send_pending = False
+        messages = []
+        while self.messages:
+            messages.append(self.messages.popleft())
+        if len(messages) == 0:
+            return
+        self.stats.events += len(messages)
+
+        if self.protocol == 'udp':
+            self._send_datagrams(messages)
+            return
+        data = b''.join(messages)
+        for subscriber in list(self.subscribers.values()):
+            if len(subscriber.backlog) + len(data) > self.backlog:
+                logging.warning(f'Subscriber {subscriber.address} too slow (backlog full). Disconnected.')
+                self.stats.slow_disconnections += 1
+                self._remove(subscriber)
+                continue
+            subscriber.backlog += data
+            self._send(subscriber)
+
+    def _on_server(self, sock: socket.socket, mask: int):
+        if self.protocol == 'udp':
+            self._on_datagram(sock)
+            return
+        while True:
+            try:
+                client, address = sock.accept()
+            except BlockingIOError:
+                return
+            client.setblocking(False)
+            client.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, PUBLISHER_SEND_BUFFER)
+            subscriber = Subscriber(client, address, bytearray())
+            self.subscribers[client] = subscriber
+            self.loop.register(client, selectors.EVENT_READ, self._on_subscriber)
+            self.stats.connections += 1
+            self.stats.subscribers = len(self.subscribers)
+            logging.info(f'Subscriber connected: {address}')
+
+    def _on_subscriber(self, sock: socket.socket, mask: int):
+        if (subscriber := self.subscribers.get(sock)) is None:  # Removed by a previous event of the same select.
+            return
+        if mask & selectors.EVENT_READ:
+            try:
+                data = sock.recv(PUBLISHER_RECEIVE_SIZE)  # Data sent by subscribers is ignored.
+            except BlockingIOError:
+                data = None
+            except OSError:
+                data = b''
+            if data == b'':
+                self._remove(subscriber)
+                return
+        if mask & selectors.EVENT_WRITE:
+            self._send(subscriber)
+
+    def _send(self, subscriber: Subscriber):
+        try:
+            sent = subscriber.socket.send(subscriber.backlog)
+            del subscriber.backlog[:sent]
+        except BlockingIOError:
+            pass
+        except OSError:
+            self._remove(subscriber)
+            return
+        if subscriber.writing != bool(subscriber.backlog):
+            subscriber.writing = bool(subscriber.backlog)
+            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if subscriber.writing else 0)
+            self.loop.modify(subscriber.socket, events, self._on_subscriber)
+
+    def _remove(self, subscriber: Subscriber):
+        self.subscribers.pop(subscriber.socket, None)
+        self.loop.unregister(subscriber.socket)
+        subscriber.socket.close()
+        self.stats.subscribers = len(self.subscribers)
+        logging.info(f'Subscriber disconnected: {subscriber.address}')
+
+    def _on_datagram(self, sock: socket.socket):
+        while True:
+            try:
+                data, address = sock.recvfrom(PUBLISHER_RECEIVE_SIZE)
+            except BlockingIOError:
+                return
+            except OSError:  # e.g. ICMP port unreachable of a closed subscriber (Windows).
+                continue
+            if data.strip() == b'unsubscribe':
+                self.udp_subscribers.discard(address)
+            elif len(self.udp_subscribers) < PUBLISHER_MAX_UDP_SUBSCRIBERS:
+                self.udp_subscribers.add(address)
+            else:
+                logging.warning(f'Udp subscriber {address} refused. Maximum number of subscribers reached.')
+            self.stats.subscribers = len(self.udp_subscribers)
+
+    def _send_datagrams(self, messages: List[bytes]):
+        for address in list(self.udp_subscribers):
+            for message in messages:
+                try:
+                    self.server.sendto(message, address)
+                except BlockingIOError:
+                    self.stats.dropped_datagrams += 1
+                except OSError:
+                    self.udp_subscribers.discard(address)
+                    self.stats.subscribers = len(self.udp_subscribers)
+                    break
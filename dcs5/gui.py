@@ -15,7 +15,8 @@ import PySimpleGUI as sg
 import click
 import pyautogui as pag
 
-from dcs5 import VERSION, LOCAL_FILE_PATH, CONFIG_FILES_PATH
+from dcs5 import VERSION, LOCAL_FILE_PATH, CONFIG_FILES_PATH, CONTROLLER_SNAPSHOT_PATH, \
+    CONTROLLER_CONFIGURATION_FILE_NAME, DEVICES_SPECIFICATION_FILE_NAME, USER_SETTING_FILE
 from dcs5.controller import Dcs5Controller
 from dcs5.controller_configurations import ConfigError
 from dcs5.logger import init_logging
@@ -27,11 +28,9 @@ if os.environ.get('EDITOR') == 'EMACS':
     os.environ.update({'EDITOR': 'pluma'})
 
 # CONFIGS FILENAMES
-CONTROLLER_CONFIGURATION_FILE_NAME = 'controller_configuration.json'  # name use in the config
 XT_CONTROLLER_CONFIGURATION_FILE_NAME = 'xt_controller_configuration.json'  # default for xt
 MICRO_CONTROLLER_CONFIGURATION_FILE_NAME = 'micro_controller_configuration.json'  # default for micro
 
-DEVICES_SPECIFICATION_FILE_NAME = 'devices_specification.json'  # name use in the config
 XT_DEVICES_SPECIFICATION_FILE_NAME = 'xt_devices_specification.json'  # default for xt
 MICRO_DEVICES_SPECIFICATION_FILE_NAME = 'micro_devices_specification.json'  # default for micro
 
@@ -101,8 +100,6 @@ SELECTED_BUTTON_COLOR = ('OrangeRed', "light grey")
 META_OFF = {'text_color': 'gray', 'background_color': 'light grey'}
 META_ON = {'text_color': 'black', 'background_color': 'gold'}
 
-USER_SETTING_FILE = 'user_settings.json'
-
 
 def main():
     try:
@@ -130,6 +127,7 @@ def init_dcs5_controller():
         controller = Dcs5Controller(
             controller_config_path,
             devices_specifications_path,
+            snapshot_path=CONTROLLER_SNAPSHOT_PATH,
         )
         logging.debug('Controller initiated.')
         return controller
@@ -841,7 +839,7 @@ def popup_window_calibrate(controller: Dcs5Controller):
     If such command is available in the firmware, it could be sent via the cancel_calibration method of dcs5.
 
     """
-    cal_pt_values = {1: controller.internal_board_state.cal_pt_1, 2: {controller.internal_board_state.cal_pt_2}}
+    cal_pt_values = {1: controller.internal_board_state.cal_pt_1, 2: controller.internal_board_state.cal_pt_2}
     for i in [1, 2]:
         layout = [
             [sg.Text(f'Set Stylus down for calibration point {i}: {cal_pt_values[i]} mm', pad=(5, 5), font=FRAME_FONT)],
@@ -849,10 +847,10 @@ def popup_window_calibrate(controller: Dcs5Controller):
         ]
         window = sg.Window(f'Calibrate point {i}', layout, finalize=True, element_justification='center',
                            keep_on_top=True, modal=True, enable_close_attempted_event=True)
-        window.perform_long_operation(lambda: controller.calibrate(i), end_key=f'-cal_pt_{i}-')
+        calibration = controller.start_calibration(i)  # The calibration is done by the listening threads.
 
         while True:
-            event, values = window.read(timeout=0.1)
+            event, values = window.read(timeout=100)
             if event == '__TIMEOUT__':
                 pass
             else:
@@ -863,14 +861,14 @@ def popup_window_calibrate(controller: Dcs5Controller):
             # if event == sg.WINDOW_CLOSE_ATTEMPTED_EVENT:
             #     controller.cancel_calibration()
             #     break
-            if event == f"-cal_pt_{i}-":
+            if calibration.done():
                 break
             else:
                 sg.SetOptions(window_location=get_new_location(window))
 
         window.close()
 
-        if values and values[0] == 1:
+        if calibration.result() == 1:
             sg.popup_ok('Calibration successful.', keep_on_top=True, modal=True)
         else:
             sg.popup_ok('Calibration failed.', keep_on_top=True, modal=True)
@@ -0,0 +1,232 @@
+"""
+This module contains the keyboard backends used by the KeyboardEmulator to inject keystrokes.
+
+Backends:
+    'pyautogui' : pyautogui, without its global pause (default). On X11, pyautogui waits for the X server after every
+        key event.
+    'xtest' : X11 XTest extension (Linux) through python3-xlib. Keycodes lookups are cached and the events are sent
+        to the X server when the backend is flushed: once per emulator write, and before each key delay between
+        actions.
+    'null' : No output. The actions are recorded (benchmarks).
+
+Key names are the pyautogui key names (see controller_configurations.VALID_KEYBOARD_KEYS).
+
+pyautogui and python3-xlib are imported when a backend using them is created.
+"""
+import logging
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import *
+
+# pyautogui key names to X11 keysym names. Other keys (single characters) are mapped with their code point.
+X11_KEYSYM_NAMES = {
+    '\t': 'Tab', '\n': 'Return', '\r': 'Return', ' ': 'space',
+    'accept': 'Execute', 'add': 'KP_Add', 'alt': 'Alt_L', 'altleft': 'Alt_L', 'altright': 'Alt_R', 'apps': 'Menu',
+    'backspace': 'BackSpace', 'browserback': 'XF86_Back', 'browserfavorites': 'XF86_Favorites',
+    'browserforward': 'XF86_Forward', 'browserhome': 'XF86_HomePage', 'browserrefresh': 'XF86_Refresh',
+    'browsersearch': 'XF86_Search', 'browserstop': 'XF86_Stop', 'capslock': 'Caps_Lock', 'clear': 'Clear',
+    'command': 'Super_L', 'convert': 'Henkan', 'ctrl': 'Control_L', 'ctrlleft': 'Control_L',
+    'ctrlright': 'Control_R', 'decimal': 'KP_Decimal', 'del': 'Delete', 'delete': 'Delete', 'divide': 'KP_Divide',
+    'down': 'Down', 'end': 'End', 'enter': 'Return', 'esc': 'Escape', 'escape': 'Escape', 'execute': 'Execute',
+    'final': 'Kanji', 'fn': 'XF86_WakeUp', 'hanguel': 'Hangul', 'hangul': 'Hangul', 'hanja': 'Hangul_Hanja',
+    'help': 'Help', 'home': 'Home', 'insert': 'Insert', 'junja': 'Hangul_Jeonja', 'kana': 'Katakana',
+    'kanji': 'Kanji', 'launchapp1': 'XF86_Launch1', 'launchapp2': 'XF86_Launch2', 'launchmail': 'XF86_Mail',
+    'launchmediaselect': 'XF86_AudioMedia', 'left': 'Left', 'modechange': 'Mode_switch', 'multiply': 'KP_Multiply',
+    'nexttrack': 'XF86_AudioNext', 'nonconvert': 'Muhenkan', 'numlock': 'Num_Lock', 'option': 'Alt_L',
+    'optionleft': 'Alt_L', 'optionright': 'Alt_R', 'pagedown': 'Next', 'pageup': 'Prior', 'pause': 'Pause',
+    'pgdn': 'Next', 'pgup': 'Prior', 'playpause': 'XF86_AudioPlay', 'prevtrack': 'XF86_AudioPrev', 'print': 'Print',
+    'printscreen': 'Print', 'prntscrn': 'Print', 'prtsc': 'Print', 'prtscr': 'Print', 'return': 'Return',
+    'right': 'Right', 'scrolllock': 'Scroll_Lock', 'select': 'Select', 'separator': 'KP_Separator',
+    'shift': 'Shift_L', 'shiftleft': 'Shift_L', 'shiftright': 'Shift_R', 'sleep': 'XF86_Sleep', 'space': 'space',
+    'stop': 'Cancel', 'subtract': 'KP_Subtract', 'tab': 'Tab', 'up': 'Up', 'volumedown': 'XF86_AudioLowerVolume',
+    'volumemute': 'XF86_AudioMute', 'volumeup': 'XF86_AudioRaiseVolume', 'win': 'Super_L', 'winleft': 'Super_L',
+    'winright': 'Super_R', 'yen': 'yen',
+    **{f'f{i}': f'F{i}' for i in range(1, 25)},
+    **{f'num{i}': f'KP_{i}' for i in range(10)},
+}
+
+
+def is_key_name(value: str) -> bool:
+    """True if `value` is a single character or a key name (e.g. 'enter', 'f1')."""
+    return len(value) == 1 or value in X11_KEYSYM_NAMES
+
+
+class KeyboardBackend(ABC):
+    """Keystrokes injection interface.
+
+    The events may be buffered until `flush` (or `wait`) is called: `press`, `write`, `hold` and `hotkey` do not
+    flush.
+    """
+    name: str = None
+
+    @abstractmethod
+    def key_down(self, key: str):
+        pass
+
+    @abstractmethod
+    def key_up(self, key: str):
+        pass
+
+    def press(self, key: str, presses: int = 1):
+        for _ in range(presses):
+            self.key_down(key)
+            self.key_up(key)
+
+    def write(self, text: str):
+        for char in text:
+            self.press(char)
+
+    @contextmanager
+    def hold(self, keys: Sequence[str]):
+        for key in keys:
+            self.key_down(key)
+        try:
+            yield
+        finally:
+            for key in reversed(keys):
+                self.key_up(key)
+
+    def hotkey(self, *keys: str):
+        with self.hold(keys[:-1]):
+            self.press(keys[-1])
+
+    def flush(self):
+        """Send the buffered events."""
+        pass
+
+    def wait(self, interval: float):
+        """Flush the events then wait `interval` seconds."""
+        if interval > 0:
+            self.flush()
+            time.sleep(interval)
+
+
+class PyautoguiBackend(KeyboardBackend):
+    name = 'pyautogui'
+
+    def __init__(self):
+        import pyautogui
+
+        pyautogui.FAILSAFE = False
+        pyautogui.PAUSE = 0.01
+        self.pag = pyautogui
+
+    def key_down(self, key: str):
+        self.pag.keyDown(key, _pause=False)
+
+    def key_up(self, key: str):
+        self.pag.keyUp(key, _pause=False)
+
+    def press(self, key: str, presses: int = 1):
+        self.pag.press(key, presses, _pause=False)
+
+    def write(self, text: str):
+        self.pag.write(text, _pause=False)
+
+    @contextmanager
+    def hold(self, keys: Sequence[str]):
+        with self.pag.hold(list(keys), _pause=False):
+            yield
+
+    def hotkey(self, *keys: str):
+        self.pag.hotkey(*keys, _pause=False)
+
+
+class XTestBackend(KeyboardBackend):
+    """X11 XTest backend. Requires python3-xlib and an X server (`DISPLAY`)."""
+    name = 'xtest'
+
+    def __init__(self, display: str = None):
+        from Xlib import X, XK, display as xdisplay
+        from Xlib.ext import xtest
+
+        XK.load_keysym_group('xf86')  # multimedia and browser keys
+        XK.load_keysym_group('korean')
+        self._X = X
+        self._XK = XK
+        self._fake_input = xtest.fake_input
+        self.display = xdisplay.Display(display)
+        self._shift_keycode = self.display.keysym_to_keycode(XK.string_to_keysym('Shift_L'))
+        self._keycodes: Dict[str, Tuple[int, bool]] = {}  # key -> (keycode, shift needed)
+
+    def key_down(self, key: str):
+        keycode, shift = self._keycode(key)
+        if keycode:
+            if shift:
+                self._fake_input(self.display, self._X.KeyPress, self._shift_keycode)
+            self._fake_input(self.display, self._X.KeyPress, keycode)
+
+    def key_up(self, key: str):
+        keycode, shift = self._keycode(key)
+        if keycode:
+            self._fake_input(self.display, self._X.KeyRelease, keycode)
+            if shift:
+                self._fake_input(self.display, self._X.KeyRelease, self._shift_keycode)
+
+    def flush(self):
+        self.display.sync()
+
+    def _keycode(self, key: str) -> Tuple[int, bool]:
+        if (keycode := self._keycodes.get(key)) is None:
+            keycode = self._keycodes[key] = self._lookup_keycode(key)
+        return keycode
+
+    def _lookup_keycode(self, key: str) -> Tuple[int, bool]:
+        if key in X11_KEYSYM_NAMES:
+            keysym = self._XK.string_to_keysym(X11_KEYSYM_NAMES[key])
+        elif len(key) == 1:
+            keysym = ord(key) if ord(key) <= 0xff else 0x01000000 | ord(key)  # Latin-1 keysyms are code points.
+        else:
+            keysym = self._XK.string_to_keysym(key)
+        keycode = self.display.keysym_to_keycode(keysym)
+        if keycode == 0:
+            logging.error(f'XTest: no keycode for key {key!r}.')
+            return 0, False
+        shift = self.display.keycode_to_keysym(keycode, 0) != keysym and \
+            self.display.keycode_to_keysym(keycode, 1) == keysym
+        return keycode, shift
+
+
+class RecordingBackend(KeyboardBackend):
+    """Null backend: no keystrokes are injected. The events are appended to `events` if `record` is True."""
+    name = 'null'
+
+    def __init__(self, record: bool = True):
+        self.record = record
+        self.events: List[Tuple[str, str]] = []
+
+    def key_down(self, key: str):
+        if self.record:
+            self.events.append(('down', key))
+
+    def key_up(self, key: str):
+        if self.record:
+            self.events.append(('up', key))
+
+    def flush(self):
+        if self.record:
+            self.events.append(('flush', ''))
+
+
+def make_keyboard_backend(name: str) -> KeyboardBackend:
+    """Returns the `name` backend.
+
+    Falls back to the pyautogui backend if the xtest backend is unavailable, and to the null backend (no keyboard
+    output) if the pyautogui backend is unavailable.
+    """
+    match name:
+        case 'xtest':
+            try:
+                return XTestBackend()
+            except Exception as err:  # python3-xlib missing or no X server.
+                logging.error(f'XTest keyboard backend unavailable ({err}). Using pyautogui.')
+                return make_keyboard_backend('pyautogui')
+        case 'null':
+            return RecordingBackend(record=False)
+        case _:
+            try:
+                return PyautoguiBackend()
+            except Exception as err:  # pyautogui missing or no display.
+                logging.error(f'Pyautogui keyboard backend unavailable ({err!r}). No keyboard output.')
+                return RecordingBackend(record=False)
@@ -1,23 +1,83 @@
 import logging
+import platform
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import *
 
-import pyautogui as pag
+from dcs5.keyboard_backends import KeyboardBackend, PyautoguiBackend, is_key_name
+
+PASTE_KEYS = ('command', 'v') if platform.system() == 'Darwin' else ('ctrl', 'v')
+PASTE_RESTORE_DELAY = 0.05  # seconds given to the application to read the clipboard before it is restored.
+
+
+@dataclass(frozen=True)
+class KeyAction:
+    """Compiled keyboard output.
+
+    `kind`:
+        'text' : `value` is a run of characters typed one after another.
+        'key' : `value` is a key pressed once (e.g. 'enter', 'f1', 'a').
+        'paste' : `value` is a run of characters pasted from the clipboard.
+    `meta` keys are held during the action (chord).
+    """
+    kind: str
+    value: str
+    meta: Tuple[str, ...] = ()
+
+    @property
+    def length(self) -> int:
+        """Number of characters written."""
+        return 1 if self.kind == 'key' else len(self.value)
+
+
+@lru_cache(maxsize=1024)
+def compile_key_action(value: str, meta: Tuple[str, ...] = (), paste_threshold: int = None) -> KeyAction:
+    """The key map values are compiled once (cached).
+
+    Characters runs of at least `paste_threshold` characters are pasted, unless meta keys are held.
+    """
+    if is_key_name(value):
+        return KeyAction('key', value, meta)
+    if paste_threshold is not None and len(value) >= paste_threshold and not meta:
+        return KeyAction('paste', value, meta)
+    return KeyAction('text', value, meta)
 
-pag.PAUSE = 0.01
 
 class KeyboardEmulator:
     """Emulate keyboard presses."""
     valid_meta_keys = ['ctrl', 'alt', 'shift']
 
-    def __init__(self):
+    def __init__(self, key_delay: float = 0, paste_threshold: int = None, backend: KeyboardBackend = None):
+        """
+        Parameters
+        ----------
+        key_delay :
+            Seconds between the actions of a batch (e.g. a value and `enter`). The characters of a value are typed
+            without delay. pyautogui global pause (`pyautogui.PAUSE`) is not applied.
+        paste_threshold :
+            Values of at least `paste_threshold` characters are pasted (clipboard) instead of typed.
+            Values are always typed if None.
+        backend :
+            Keystrokes injection backend. Defaults to the pyautogui backend.
+        """
+        self.key_delay = key_delay
+        self.backend = backend or PyautoguiBackend()
+        self.paste_threshold = paste_threshold
         self.last_msg_length = 1
         self.meta_key_combo = []
 
-    def write(self, value: str):
-        if value in self.valid_meta_keys:
-            self.handle_key_hold(value)
-        else:
-            self._shout(value)
-            self.meta_key_combo = []
+    def write(self, *values: str):
+        """Write the values in a single batch. Meta keys values are held for the next value."""
+        actions = []
+        for value in values:
+            if value in self.valid_meta_keys:
+                self.handle_key_hold(value)
+            else:
+                actions.append(compile_key_action(str(value), tuple(self.meta_key_combo), self.paste_threshold))
+                self.meta_key_combo = []
+        if actions:
+            self.emit(actions)
 
     def handle_key_hold(self, value: str):
         if value in self.meta_key_combo:
@@ -25,15 +85,43 @@ class KeyboardEmulator:
         else:
             self.meta_key_combo.append(value)  # Press
 
-    def _shout(self, value: str):
-        with pag.hold(self.meta_key_combo):
-            logging.info(f"Keyboard out: {'+'.join(self.meta_key_combo)} {value}")
-            if pag.isValidKey(value):
-                pag.press(value)
-                self.last_msg_length = 1
+    def emit(self, actions: List[KeyAction]):
+        """The backend is flushed after the last action and before each `key_delay` wait between actions."""
+        for index, action in enumerate(actions):
+            if index > 0:
+                self.backend.wait(self.key_delay)
+            self._shout(action)
+        self.backend.flush()
+
+    def _shout(self, action: KeyAction):
+        with self.backend.hold(action.meta):
+            logging.info(f"Keyboard out: {'+'.join(action.meta)} {action.value}")
+            if action.kind == 'key':
+                self.backend.press(action.value)
+            elif action.kind == 'paste':
+                self._paste(action.value)
             else:
-                pag.write(str(value))
-                self.last_msg_length = len(str(value))
+                self.backend.write(action.value)
+        self.last_msg_length = action.length
+
+    def _paste(self, value: str):
+        """Paste `value` with the clipboard. The previous clipboard content is restored."""
+        import pyperclip
+
+        try:
+            previous = pyperclip.paste()
+            pyperclip.copy(value)
+        except pyperclip.PyperclipException as err:
+            logging.error(f'Clipboard unavailable ({err}). Value typed instead.')
+            self.backend.write(value)
+            return
+        try:
+            self.backend.hotkey(*PASTE_KEYS)
+            self.backend.flush()  # The paste has to be sent before the clipboard is restored.
+            time.sleep(PASTE_RESTORE_DELAY)
+        finally:
+            pyperclip.copy(previous)
 
     def delete_last(self):
-        pag.press('backspace', self.last_msg_length)
+        self.backend.press('backspace', self.last_msg_length)
+        self.backend.flush()
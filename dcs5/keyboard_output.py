@@ -0,0 +1,91 @@
+"""
+This module contains the keyboard output worker.
+
+Keyboard actions (pyautogui calls) are slow. They are queued by the socket listener and executed in order by a
+dedicated thread, so reading and decoding the board messages never waits on keystrokes. Actions are dropped (and
+counted) while the queue is full.
+"""
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import *
+
+KEYBOARD_QUEUE_SIZE = 256
+
+
+@dataclass
+class KeyboardOutputStats:
+    """Latency: time between the queuing of an action and the end of its execution."""
+    actions: int = 0
+    dropped: int = 0
+    errors: int = 0
+    max_depth: int = 0
+    last_latency: float = None
+    max_latency: float = 0
+    total_latency: float = 0
+
+    @property
+    def mean_latency(self) -> Optional[float]:
+        return self.total_latency / self.actions if self.actions else None
+
+
+class KeyboardOutput:
+    def __init__(self, maxsize: int = KEYBOARD_QUEUE_SIZE):
+        """
+        Parameters
+        ----------
+        maxsize :
+            Maximum number of queued actions.
+        """
+        self.queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self.stats = KeyboardOutputStats()
+        self._dropping = False  # True from an action dropped until an action is queued again.
+        self.thread = threading.Thread(target=self._execute_actions, name='keyboard', daemon=True)
+        self.thread.start()
+
+    @property
+    def depth(self) -> int:
+        """Number of queued actions."""
+        return self.queue.qsize()
+
+    def put(self, action: Callable, *args) -> bool:
+        """Queue `action(*args)` without blocking. Returns False if the action was dropped (queue full).
+
+        Only the first action dropped while the queue is full is logged.
+        """
+        try:
+            self.queue.put_nowait((action, args, time.monotonic()))
+        except queue.Full:
+            self.stats.dropped += 1
+            if not self._dropping:
+                self._dropping = True
+                logging.error(f'Keyboard output queue full. Actions are dropped, first: '
+                              f'{getattr(action, "__name__", action)}{args}')
+            return False
+        if self._dropping:
+            self._dropping = False
+            logging.warning(f'Keyboard output queue no longer full. {self.stats.dropped} actions dropped in total.')
+        self.stats.max_depth = max(self.stats.max_depth, self.queue.qsize())
+        return True
+
+    def join(self):
+        """Wait until the queued actions are executed."""
+        self.queue.join()
+
+    def _execute_actions(self):
+        while True:
+            action, args, queued_time = self.queue.get()
+            try:
+                action(*args)
+            except Exception as err:
+                self.stats.errors += 1
+                logging.error(f'Keyboard output error: {err}')
+            finally:
+                latency = time.monotonic() - queued_time
+                self.stats.actions += 1
+                self.stats.last_latency = latency
+                self.stats.max_latency = max(self.stats.max_latency, latency)
+                self.stats.total_latency += latency
+                self.queue.task_done()
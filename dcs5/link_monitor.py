@@ -0,0 +1,97 @@
+"""
+This module contains the round-trip time (RTT) estimation of the board link.
+
+RTT samples are the time between sending a ping (`&a#`) and receiving its reply (`%a#`). The estimator keeps a
+histogram of the samples and a smoothed RTT and RTT variation from which timeouts are derived (RFC 6298).
+"""
+import threading
+from dataclasses import dataclass
+from typing import *
+
+# Upper bounds (seconds) of the histogram buckets. The last bucket holds the samples above the last bound.
+RTT_HISTOGRAM_BOUNDS = (0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5)
+
+RTT_SMOOTHING = 1 / 8
+RTT_VARIATION_SMOOTHING = 1 / 4
+RTT_VARIATION_FACTOR = 4
+
+
+@dataclass
+class RttSummary:
+    count: int
+    smoothed: float
+    variation: float
+    minimum: float
+    maximum: float
+    histogram: Dict[str, int]
+
+
+class RttEstimator:
+    def __init__(self, initial_timeout: float, min_timeout: float, max_timeout: float):
+        """
+        Parameters
+        ----------
+        initial_timeout :
+            Timeout used before the first sample.
+        min_timeout :
+        max_timeout :
+            Bounds of the timeouts derived from the samples.
+        """
+        self.initial_timeout = initial_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+
+        self._lock = threading.Lock()
+        self.histogram: List[int] = [0] * (len(RTT_HISTOGRAM_BOUNDS) + 1)
+        self.count = 0
+        self.smoothed: float = None
+        self.variation: float = None
+        self.minimum: float = None
+        self.maximum: float = None
+
+    def add(self, rtt: float):
+        with self._lock:
+            self.count += 1
+            self.histogram[self._bucket(rtt)] += 1
+            self.minimum = rtt if self.minimum is None else min(self.minimum, rtt)
+            self.maximum = rtt if self.maximum is None else max(self.maximum, rtt)
+            if self.smoothed is None:
+                self.smoothed, self.variation = rtt, rtt / 2
+            else:
+                self.variation += RTT_VARIATION_SMOOTHING * (abs(self.smoothed - rtt) - self.variation)
+                self.smoothed += RTT_SMOOTHING * (rtt - self.smoothed)
+
+    def timeout(self) -> float:
+        """Smoothed RTT plus 4 RTT variations, bounded by `min_timeout` and `max_timeout`."""
+        if self.smoothed is None:
+            return self.initial_timeout
+        timeout = self.smoothed + RTT_VARIATION_FACTOR * self.variation
+        return min(max(timeout, self.min_timeout), self.max_timeout)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Upper bound of the histogram bucket holding the `q` (0-100) percentile. Infinite for the last bucket."""
+        with self._lock:
+            if self.count == 0:
+                return None
+            rank, cumulative = q / 100 * self.count, 0
+            for bound, count in zip(RTT_HISTOGRAM_BOUNDS + (float('inf'),), self.histogram):
+                cumulative += count
+                if cumulative >= rank:
+                    return bound
+        return float('inf')
+
+    def summary(self) -> RttSummary:
+        with self._lock:
+            labels = [f'<={bound * 1000:g}ms' for bound in RTT_HISTOGRAM_BOUNDS]
+            labels.append(f'>{RTT_HISTOGRAM_BOUNDS[-1] * 1000:g}ms')
+            return RttSummary(
+                self.count, self.smoothed, self.variation, self.minimum, self.maximum,
+                dict(zip(labels, self.histogram))
+            )
+
+    @staticmethod
+    def _bucket(rtt: float) -> int:
+        for index, bound in enumerate(RTT_HISTOGRAM_BOUNDS):
+            if rtt <= bound:
+                return index
+        return len(RTT_HISTOGRAM_BOUNDS)
@@ -0,0 +1,303 @@
+"""
+This module contains the output sinks of the measurements and key presses.
+
+The socket listener publishes an OutputEvent for each board message (or Marel weight) that produces an output. Every
+sink receives every event:
+    keyboard : keyboard emulation (the values are typed).
+    ndjson : newline-delimited JSON file.
+    csv : CSV file.
+    socket : newline-delimited JSON datagrams (udp) or stream (tcp) sent to a local address.
+    publisher : local server publishing newline-delimited JSON to its subscribers (see event_publisher).
+
+The keyboard and publisher sinks are called by the listener thread (they have their own worker). The other sinks have
+their own thread and queue and write the events in batches of at most `batch_size`. Their queues are bounded: events
+are dropped rather than blocking the listener.
+"""
+import csv
+import json
+import logging
+import queue
+import socket
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field, asdict, fields
+from pathlib import Path
+from typing import *
+
+from dcs5.event_publisher import EventPublisher, PUBLISHER_HOST, PUBLISHER_BACKLOG
+
+SINK_QUEUE_SIZE = 1024
+SOCKET_SINK_TIMEOUT = 1  # seconds
+
+
+@dataclass
+class OutputEvent:
+    """
+    source :
+        'board', 'control_box' or 'marel'.
+    raw_value :
+        Board length (mm, stylus offset not removed), control box key number or Marel weight.
+    value :
+        Mapped value: length in `units`, key map value(s) or weight.
+    keys :
+        Keyboard values (written by the keyboard sink).
+    key :
+        Name of the board or control box key. None for lengths and weights.
+    """
+    source: str
+    raw_value: Any
+    value: Any
+    keys: List[str] = field(default_factory=list)
+    output_mode: str = None
+    stylus: str = None
+    units: str = None
+    key: str = None
+    timestamp: float = field(default_factory=time.time)
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), default=str)
+
+
+class OutputSink(ABC):
+    """Base class of the output sinks.
+
+    `write` receives the events in batches of at most `batch_size` events. Sinks with `threaded` False are written
+    by the publishing thread, one event at a time.
+    """
+    name: str = None
+    threaded = True
+
+    def __init__(self, batch_size: int = 1):
+        self.batch_size = batch_size
+
+    @abstractmethod
+    def write(self, events: List[OutputEvent]):
+        pass
+
+    def close(self):
+        pass
+
+
+class KeyboardSink(OutputSink):
+    name = 'keyboard'
+    threaded = False
+
+    def __init__(self, to_keyboard: Callable[..., None]):
+        """
+        Parameters
+        ----------
+        to_keyboard :
+            Dcs5Controller.to_keyboard
+        """
+        super().__init__()
+        self.to_keyboard = to_keyboard
+
+    def write(self, events: List[OutputEvent]):
+        for event in events:
+            self.to_keyboard(*event.keys)
+
+
+class NdjsonFileSink(OutputSink):
+    name = 'ndjson'
+
+    def __init__(self, path: Union[str, Path], batch_size: int = 1):
+        super().__init__(batch_size)
+        self.path = path
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def write(self, events: List[OutputEvent]):
+        self.file.write(''.join(event.to_json() + '\n' for event in events))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class CsvFileSink(OutputSink):
+    """List values (`keys`, mapped values) are joined with `;`."""
+    name = 'csv'
+    columns = [f.name for f in fields(OutputEvent)]
+
+    def __init__(self, path: Union[str, Path], batch_size: int = 1):
+        super().__init__(batch_size)
+        self.path = path
+        new_file = not Path(path).exists() or Path(path).stat().st_size == 0
+        self.file = open(path, 'a', encoding='utf-8', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=self.columns)
+        if new_file:
+            self.writer.writeheader()
+
+    def write(self, events: List[OutputEvent]):
+        self.writer.writerows(
+            {k: ';'.join(map(str, v)) if isinstance(v, list) else v for k, v in asdict(event).items()}
+            for event in events
+        )
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class SocketSink(OutputSink):
+    """Send the events (NDJSON) to `host:port`.
+
+    Udp: one datagram per batch. Tcp: the connection is (re)opened when needed. Events are dropped while the
+    connection cannot be opened.
+    """
+    name = 'socket'
+
+    def __init__(self, host: str, port: int, protocol: str = 'udp', batch_size: int = 1):
+        super().__init__(batch_size)
+        self.address = (host, port)
+        self.protocol = protocol
+        self.socket: socket.socket = None
+        if protocol == 'udp':
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def write(self, events: List[OutputEvent]):
+        data = ''.join(event.to_json() + '\n' for event in events).encode('utf-8')
+        if self.protocol == 'udp':
+            self.socket.sendto(data, self.address)
+            return
+        try:
+            if self.socket is None:
+                self.socket = socket.create_connection(self.address, timeout=SOCKET_SINK_TIMEOUT)
+            self.socket.sendall(data)
+        except OSError as err:
+            logging.error(f'Socket sink {self.address}: {err}. {len(events)} events dropped.')
+            self.close()
+
+    def close(self):
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+
+class PublisherSink(OutputSink):
+    name = 'publisher'
+    threaded = False
+
+    def __init__(self, host: str = PUBLISHER_HOST, port: int = 0, protocol: str = 'tcp',
+                 backlog: int = PUBLISHER_BACKLOG):
+        super().__init__()
+        self.publisher = EventPublisher(host, port, protocol, backlog)
+
+    def write(self, events: List[OutputEvent]):
+        for event in events:
+            self.publisher.publish(event.to_json())
+
+    def close(self):
+        self.publisher.close()
+
+
+@dataclass
+class SinkStats:
+    events: int = 0
+    batches: int = 0
+    dropped: int = 0
+    errors: int = 0
+
+
+class SinkWorker:
+    """Thread writing the queued events of a threaded sink."""
+    def __init__(self, sink: OutputSink, maxsize: int = SINK_QUEUE_SIZE):
+        self.sink = sink
+        self.queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self.stats = SinkStats()
+        self.thread = threading.Thread(target=self._write_events, name=f'{sink.name} sink', daemon=True)
+        self.thread.start()
+
+    def put(self, event: Optional[OutputEvent]):
+        """Queue an event (None stops the worker). The event is dropped if the queue is full."""
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.stats.dropped += 1
+            logging.error(f'{self.sink.name} sink queue full. Event dropped.')
+
+    def close(self, timeout: float = None):
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    def _write_events(self):
+        while (event := self.queue.get()) is not None:
+            events = [event]
+            while len(events) < self.sink.batch_size:
+                try:
+                    event = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if event is None:
+                    self.queue.put(None)  # Stop after this batch.
+                    break
+                events.append(event)
+            try:
+                self.sink.write(events)
+                self.stats.events += len(events)
+                self.stats.batches += 1
+            except Exception as err:
+                self.stats.errors += 1
+                logging.error(f'{self.sink.name} sink error: {err}')
+        self.sink.close()
+
+
+class OutputSinks:
+    """Publish the output events to every sink.
+
+    The sinks are held in an immutable tuple of (sink, worker) pairs that `add` and `remove` replace: `publish`
+    (listener thread) iterates a snapshot while the sinks are changed from another thread (e.g. reload_configs).
+    """
+    def __init__(self):
+        self.entries: Tuple[Tuple[OutputSink, Optional[SinkWorker]], ...] = ()
+        self._lock = threading.Lock()  # Serializes the changes of `entries`.
+
+    @property
+    def sinks(self) -> List[OutputSink]:
+        return [sink for sink, _ in self.entries]
+
+    def add(self, sink: OutputSink):
+        worker = SinkWorker(sink) if sink.threaded else None
+        with self._lock:
+            self.entries = self.entries + ((sink, worker),)
+
+    def remove(self, sink: OutputSink):
+        with self._lock:
+            removed = [entry for entry in self.entries if entry[0] is sink]
+            self.entries = tuple(entry for entry in self.entries if entry[0] is not sink)
+        for _, worker in removed:
+            if worker is not None:
+                worker.close()
+            else:
+                sink.close()
+
+    def close(self):
+        for sink in self.sinks:
+            self.remove(sink)
+
+    def publish(self, event: OutputEvent):
+        for sink, worker in self.entries:
+            if worker is not None:
+                worker.put(event)
+            else:
+                try:
+                    sink.write([event])
+                except Exception as err:
+                    logging.error(f'{sink.name} sink error: {err}')
+
+
+def make_output_sink(sink_type: str, to_keyboard: Callable[..., None], path: str = None, host: str = None,
+                     port: int = None, protocol: str = 'udp', batch_size: int = 1, backlog: int = None) -> OutputSink:
+    match sink_type:
+        case 'keyboard':
+            return KeyboardSink(to_keyboard)
+        case 'ndjson':
+            return NdjsonFileSink(path, batch_size)
+        case 'csv':
+            return CsvFileSink(path, batch_size)
+        case 'socket':
+            return SocketSink(host, port, protocol, batch_size)
+        case 'publisher':
+            return PublisherSink(host or PUBLISHER_HOST, port, protocol, backlog or PUBLISHER_BACKLOG)
+        case _:
+            raise ValueError(f'Unknown output sink: {sink_type}')
@@ -0,0 +1,426 @@
+"""
+This module contains the DCS5 board protocol codec.
+
+The codec does no I/O: commands are encoded to `Command` (payload and expected replies) and the messages
+received from the board are decoded to typed `BoardMessage` objects.
+
+Board messages are `\r` terminated. Most of them have the form `%<tag>[,:]<args>#`. Decoding dispatches on the
+tag with a table lookup.
+
+References
+----------
+    https://bigfinllc.com/wp-content/uploads/Big-Fin-Scientific-Fish-Board-Integration-Guide-V2_0.pdf
+
+"""
+import codecs
+from dataclasses import dataclass
+from typing import *
+
+BOARD_MESSAGE_DELIMITER = "\r"
+BOARD_MSG_ENCODING = 'UTF-8'
+
+BOARD_INTERFACES = {0: 'DCSLinkstream', 1: 'FEED'}
+
+INIT_FLAG_MESSAGE = "Setting EEPROM init flag."
+REBOOT_MESSAGE = "Rebooting in 2 seconds."
+
+
+class BoardMessageFramer:
+    """Incrementally split the board byte stream into messages.
+
+    Every complete message of a received chunk is returned at once. Incomplete data stays in the buffer
+    until its delimiter is received.
+    """
+    def __init__(self, delimiter: str = BOARD_MESSAGE_DELIMITER):
+        self.delimiter = delimiter
+        self._delimiter_bytes = delimiter.encode(BOARD_MSG_ENCODING)
+        self.buffer = bytearray()
+        self._decoder = codecs.getincrementaldecoder(BOARD_MSG_ENCODING)(errors='replace')
+
+    def clear(self):
+        self.buffer.clear()
+        self._decoder.reset()
+
+    def feed(self, data: bytes) -> List[str]:
+        """Add `data` to the buffer and return the complete messages (delimiter included)."""
+        self.buffer += data
+        end = self.buffer.rfind(self._delimiter_bytes)
+        if end == -1:
+            return []
+        end += len(self._delimiter_bytes)
+
+        with memoryview(self.buffer) as view:
+            text = self._decoder.decode(view[:end])
+        del self.buffer[:end]
+
+        messages = text.split(self.delimiter)
+        messages.pop()  # Empty string following the last delimiter.
+        return [message + self.delimiter for message in messages]
+
+
+### COMMANDS ###
+
+@dataclass(frozen=True)
+class Reply:
+    """Signature of an expected board reply.
+
+    `args` set to None matches any arguments.
+    """
+    tag: str
+    args: str = None
+
+    def matches(self, message: 'BoardMessage') -> bool:
+        return message.tag == self.tag and (self.args is None or message.args == self.args)
+
+
+@dataclass(frozen=True)
+class Command:
+    """Board command.
+
+    Queued commands with the same `key` supersede each other (latest wins). `value` is the value set on the board.
+    """
+    payload: str
+    replies: Tuple[Reply, ...] = ()
+    key: str = None
+    value: Any = None
+
+
+def ping() -> Command:
+    return Command("&a#", (Reply('a'),))
+
+
+def get_board_stats() -> Command:
+    return Command("b#", (Reply('b'),))
+
+
+def get_battery_level() -> Command:
+    return Command("&q#", (Reply('q'),))
+
+
+def get_battery_time_to_empty() -> Command:
+    """Micro Only"""
+    return Command("&qe#", (Reply('qe'),))
+
+
+def get_temperature_humidity() -> Command:
+    return Command("&t#", (Reply('t'),))
+
+
+def board_initialization() -> Command:
+    return Command("&init#", (Reply('init_flag'), Reply('reboot')))
+
+
+def set_interface(value: int) -> Command:
+    return Command(f"&pl,{value}#", (Reply('HostApp', BOARD_INTERFACES[value]), Reply('pl', str(value))))
+
+
+def flash_fuel_gauge() -> Command:
+    return Command("&ra#", (Reply('ra'),))
+
+
+def set_fuel_gauge(value: int, color: List[int] = None) -> Command:
+    """`color` (r, g, b, w) is for the micro only."""
+    args = ",".join(map(str, [value] + list(color or [])))
+    return Command(f"&lf,{args}#", (Reply('lf', args),), key='lf', value=args)
+
+
+def set_fuel_gauge_temporary(delay: int, value: int, color: List[int] = None) -> Command:
+    """`color` (r, g, b, w) is for the micro only."""
+    args = ",".join(map(str, [delay, value] + list(color or [])))
+    return Command(f"&lt,{args}#", (Reply('lt', args),))
+
+
+def set_backlighting_level(level: int) -> Command:
+    return Command(f"&la,{level}#", (Reply('la', str(level)),), key='la', value=level)
+
+
+def set_key_backlighting_level(level: int, key: int) -> Command:
+    return Command(f"&lk,{level},{key}#", (Reply('lk', f"{level},{key}"),), key=f'lk,{key}', value=level)
+
+
+def set_stylus_detection_message(value: bool) -> Command:
+    return Command(f"&sn,{int(value)}#", (Reply('sn', str(int(value))),))
+
+
+def set_stylus_settling_delay(value: int) -> Command:
+    return Command(f"&di,{value}#", (Reply('di', str(value)),), key='di', value=value)
+
+
+def set_stylus_max_deviation(value: int) -> Command:
+    return Command(f"&dm,{value}#", (Reply('dm', str(value)),), key='dm', value=value)
+
+
+def set_stylus_number_of_reading(value: int) -> Command:
+    return Command(f"&dn,{value}#", (Reply('dn', str(value)),), key='dn', value=value)
+
+
+def restore_cal_data(m1, m2, raw1, raw2) -> Command:
+    return Command(f"&cr,{m1},{m2},{raw1},{raw2}#")
+
+
+def clear_cal_data() -> Command:
+    return Command("&ca#")
+
+
+def check_calibration_state() -> Command:
+    return Command("&u#", (Reply('u'),))
+
+
+def set_calibration_point_mm(pt: int, pos: int) -> Command:
+    return Command(f"&{pt}mm,{pos}#", (Reply(f'{pt}mm', str(pos)),))
+
+
+def start_calibration(pt: int) -> Command:
+    return Command(f"&{pt}r#", (Reply(f'{pt}r'),))
+
+
+### BOARD MESSAGES ###
+
+@dataclass(slots=True)
+class BoardMessage:
+    """Decoded board message.
+
+    `tag` and `args` are the raw fields used to match replies against commands.
+    """
+    tag: str
+    args: str
+
+    solicited: ClassVar[bool] = True
+
+
+@dataclass(slots=True)
+class Unknown(BoardMessage):
+    pass
+
+
+@dataclass(slots=True)
+class UsbPlugged(BoardMessage):
+    solicited: ClassVar[bool] = False
+
+
+@dataclass(slots=True)
+class Length(BoardMessage):
+    value: int
+
+    solicited: ClassVar[bool] = False
+
+
+@dataclass(slots=True)
+class Swipe(BoardMessage):
+    value: int
+
+    solicited: ClassVar[bool] = False
+
+
+@dataclass(slots=True)
+class ControlBoxKey(BoardMessage):
+    key: str
+
+    solicited: ClassVar[bool] = False
+
+
+@dataclass(slots=True)
+class StylusUpDown(BoardMessage):
+    value: int
+
+    solicited: ClassVar[bool] = False
+
+
+@dataclass(slots=True)
+class Ping(BoardMessage):
+    pass
+
+
+@dataclass(slots=True)
+class HostApp(BoardMessage):
+    name: str
+
+
+@dataclass(slots=True)
+class Interface(BoardMessage):
+    value: int
+
+
+@dataclass(slots=True)
+class StylusStatusMessage(BoardMessage):
+    enabled: bool
+
+
+@dataclass(slots=True)
+class SettlingDelay(BoardMessage):
+    value: int
+
+
+@dataclass(slots=True)
+class MaxDeviation(BoardMessage):
+    value: int
+
+
+@dataclass(slots=True)
+class NumberOfReading(BoardMessage):
+    value: int
+
+
+@dataclass(slots=True)
+class BoardStats(BoardMessage):
+    stats: str
+
+    @property
+    def firmware(self) -> str:
+        version = self.stats.split(',')[1]
+        return version[:-2] + '.' + version[-2:]
+
+
+@dataclass(slots=True)
+class BatteryLevel(BoardMessage):
+    level: int
+    charging: bool
+
+
+@dataclass(slots=True)
+class BatteryTimeToEmpty(BoardMessage):
+    value: int
+
+    @property
+    def charging(self) -> bool:
+        return self.value == 65535
+
+
+@dataclass(slots=True)
+class TemperatureHumidity(BoardMessage):
+    temperature: int
+    humidity: int
+
+
+@dataclass(slots=True)
+class CalibrationState(BoardMessage):
+    calibrated: bool
+
+
+@dataclass(slots=True)
+class BacklightLevel(BoardMessage):
+    level: int
+
+
+@dataclass(slots=True)
+class KeyBacklightLevel(BoardMessage):
+    level: int
+    key: int
+
+
+@dataclass(slots=True)
+class FuelGauge(BoardMessage):
+    pass
+
+
+@dataclass(slots=True)
+class CalibrationPoint(BoardMessage):
+    pt: int
+    value: int
+
+
+@dataclass(slots=True)
+class CalibrationStatus(BoardMessage):
+    """`status`: 'r' ready, 'c' calibrated, 'e' exited."""
+    pt: int
+    status: str
+
+    @property
+    def solicited(self) -> bool:
+        return self.status == 'r'
+
+
+@dataclass(slots=True)
+class Notice(BoardMessage):
+    text: str
+
+
+def _decode_t(tag: str, args: str) -> BoardMessage:
+    if ',' in args:  # `%t,<temperature>,<humidity>#`, otherwise `%t,<0|1>#` (stylus up/down)
+        temperature, humidity = args.split(',')
+        return TemperatureHumidity(tag, args, int(temperature), int(humidity))
+    return StylusUpDown(tag, args, int(args))
+
+
+def _decode_q(tag: str, args: str) -> BoardMessage:
+    level, charging = args.split(',')
+    return BatteryLevel(tag, args, int(level), bool(int(charging)))
+
+
+def _decode_lk(tag: str, args: str) -> BoardMessage:
+    level, key = args.split(',')
+    return KeyBacklightLevel(tag, args, int(level), int(key))
+
+
+_DECODERS: Dict[str, Callable[[str, str], BoardMessage]] = {
+    'l': lambda tag, args: Length(tag, args, int(args)),
+    's': lambda tag, args: Swipe(tag, args, int(args)),
+    'k': lambda tag, args: ControlBoxKey(tag, args, args),
+    'hs': lambda tag, args: ControlBoxKey(tag, args, args),
+    't': _decode_t,
+    'a': lambda tag, args: Ping(tag, args),
+    'pl': lambda tag, args: Interface(tag, args, int(args)),
+    'sn': lambda tag, args: StylusStatusMessage(tag, args, args == "1"),
+    'di': lambda tag, args: SettlingDelay(tag, args, int(args)),
+    'dm': lambda tag, args: MaxDeviation(tag, args, int(args)),
+    'dn': lambda tag, args: NumberOfReading(tag, args, int(args)),
+    'b': lambda tag, args: BoardStats(tag, args, args),
+    'q': _decode_q,
+    'qe': lambda tag, args: BatteryTimeToEmpty(tag, args, int(args)),
+    'u': lambda tag, args: CalibrationState(tag, args, args == "1"),
+    'la': lambda tag, args: BacklightLevel(tag, args, int(args)),
+    'lk': _decode_lk,
+    'lf': lambda tag, args: FuelGauge(tag, args),
+    'lt': lambda tag, args: FuelGauge(tag, args),
+    'ra': lambda tag, args: FuelGauge(tag, args),
+}
+
+_NOTICES = {INIT_FLAG_MESSAGE: 'init_flag', REBOOT_MESSAGE: 'reboot'}
+
+
+def _decode_response(body: str) -> BoardMessage:
+    """Decode `<tag>[,:]<args>`. Tags never contain a separator."""
+    tag = body.partition(',')[0]
+    if ':' in tag:
+        tag = tag.partition(':')[0]
+    args = body[len(tag) + 1:]
+    if (decoder := _DECODERS.get(tag)) is not None:
+        return decoder(tag, args)
+    if tag.endswith('mm') and tag[:-2].isdigit():  # `%<pt>mm,<value>#`
+        return CalibrationPoint(tag, args, int(tag[:-2]), int(args))
+    return Unknown(tag, args)
+
+
+def _decode_calibration(body: str) -> BoardMessage:
+    """`&<pt><r|c|e>#` messages sent in calibration mode."""
+    if len(body) >= 2 and body[:-1].isdigit() and body[-1] in 'rce':
+        return CalibrationStatus(body, "", int(body[:-1]), body[-1])
+    return Unknown("", body)
+
+
+def _decode_text(text: str) -> BoardMessage:
+    if "@@@" in text:
+        return UsbPlugged('@@@', "")
+    if text.startswith('HostApp='):
+        name = text[len('HostApp='):]
+        return HostApp('HostApp', name, name)
+    if text.startswith('Cal Pt '):  # `Cal Pt <pt> set to: <value>` (older firmwares)
+        pt, value = text[len('Cal Pt '):].split(' set to: ')
+        return CalibrationPoint(f'{pt}mm', value, int(pt), int(value))
+    if (tag := _NOTICES.get(text)) is not None:
+        return Notice(tag, "", text)
+    return Unknown("", text)
+
+
+def decode(message: str) -> BoardMessage:
+    """Decode a single board message (with or without its delimiter)."""
+    text = message[:-1] if message[-1:] == BOARD_MESSAGE_DELIMITER else message
+    prefix, suffix = text[:1], text[-1:]
+    try:
+        if prefix == '%' and suffix == '#':
+            return _decode_response(text[1:-1])
+        if prefix == '&':
+            return _decode_calibration(text[1:-1] if suffix == '#' else text[1:])
+        return _decode_text(text)
+    except ValueError:
+        return Unknown("", text)
@@ -0,0 +1,127 @@
+"""
+This module contains the selector helpers shared by the threads that multiplex sockets: the Waker (a wake-up socket
+pair interrupting a blocking `select` from another thread) and the SelectorLoop (a selector thread running the
+callbacks of the registered file objects and the scheduled actions).
+
+Users:
+    BluetoothClient : Waker of `wait_receive`.
+    EventPublisher, BoardSimulator, FaultInjector : SelectorLoop.
+"""
+import heapq
+import selectors
+import socket
+import threading
+import time
+from itertools import count
+from typing import *
+
+WAKEUP_RECEIVE_SIZE = 4096
+
+
+class Waker:
+    """Wake-up socket pair. Register it for `selectors.EVENT_READ` and `drain` it when it is ready."""
+    def __init__(self):
+        self.reader, self.writer = socket.socketpair()
+        self.reader.setblocking(False)
+        self.writer.setblocking(False)
+
+    def fileno(self) -> int:
+        return self.reader.fileno()
+
+    def wake_up(self):
+        """Interrupt the `select`. Can be called from any thread."""
+        try:
+            self.writer.send(b'\x00')
+        except (BlockingIOError, OSError):  # A wake-up is already pending or the waker is closed.
+            pass
+
+    def drain(self):
+        try:
+            while self.reader.recv(WAKEUP_RECEIVE_SIZE):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        self.reader.close()
+        self.writer.close()
+
+
+class SelectorLoop:
+    def __init__(self, name: str, on_stop: Callable[[], None] = None):
+        """Start the loop thread.
+
+        The callbacks of the registered file objects are called with `(fileobj, mask)` in the loop thread. The
+        actions are scheduled on a heap and run in the loop thread once due (same due time: in the order they were
+        scheduled).
+
+        Parameters
+        ----------
+        name :
+            Name of the thread.
+        on_stop :
+            Called in the loop thread once the loop is stopped, before the selector is closed (e.g. to close the
+            connections).
+        """
+        self.on_stop = on_stop
+        self.selector = selectors.DefaultSelector()
+        self.waker = Waker()
+        self.selector.register(self.waker, selectors.EVENT_READ, lambda *_: self.waker.drain())
+
+        self._schedule: List[Tuple[float, int, Callable[[], None]]] = []  # (time, sequence, action) heap
+        self._sequence = count()
+        self._lock = threading.Lock()
+
+        self.is_running = True
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def register(self, fileobj, events: int, callback: Callable[[Any, int], None]):
+        """Call `callback(fileobj, mask)` when `fileobj` is ready. Loop thread only (see `call`)."""
+        self.selector.register(fileobj, events, callback)
+
+    def modify(self, fileobj, events: int, callback: Callable[[Any, int], None]):
+        self.selector.modify(fileobj, events, callback)
+
+    def unregister(self, fileobj):
+        self.selector.unregister(fileobj)
+
+    def call(self, action: Callable, *args):
+        """Run `action(*args)` in the loop thread as soon as possible. Can be called from any thread."""
+        self.call_at(0, lambda: action(*args))
+
+    def call_at(self, due: float, action: Callable[[], None]):
+        """Run `action` in the loop thread at `due` (time.monotonic()). Can be called from any thread."""
+        with self._lock:
+            heapq.heappush(self._schedule, (due, next(self._sequence), action))
+            earliest = self._schedule[0][2] is action
+        if earliest and threading.current_thread() is not self.thread:
+            self.waker.wake_up()  # The loop thread computes its next timeout before it selects.
+
+    def close(self):
+        """Stop the loop and wait for its thread. The actions not yet due are not run."""
+        self.is_running = False
+        self.waker.wake_up()
+        if threading.current_thread() is not self.thread:
+            self.thread.join()
+
+    def _run(self):
+        while self.is_running:
+            with self._lock:
+                timeout = max(self._schedule[0][0] - time.monotonic(), 0) if self._schedule else None
+            for key, mask in self.selector.select(timeout):
+                key.data(key.fileobj, mask)
+            self._run_due_actions()
+        if self.on_stop is not None:
+            self.on_stop()
+        self.selector.close()
+        self.waker.close()
+
+    def _run_due_actions(self):
+        now = time.monotonic()
+        while self.is_running:
+            with self._lock:
+                if not self._schedule or self._schedule[0][0] > now:
+                    return
+                _, _, action = heapq.heappop(self._schedule)
+            action()
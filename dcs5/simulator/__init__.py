@@ -0,0 +1,17 @@
+"""
+Virtual DCS5 board (xt or micro control box) for running the controller without a board or Bluetooth.
+
+    from dcs5.simulator import BoardSimulator, VirtualBoard, random_lengths
+
+    simulator = BoardSimulator(VirtualBoard('xt'), latency=0.02)
+    controller = Dcs5Controller(config_path, devices_specifications_path)
+    controller.client.attach(simulator.connect_socketpair(), port=1)
+    controller.init_controller_and_board(full=True)
+    controller.start_listening()
+    simulator.play(random_lengths(100, seed=1), rate=5).result()
+"""
+from dcs5.simulator.board import VirtualBoard, BoardState
+from dcs5.simulator.scripts import StreamEvent, length, swipe, key, wait, raw, random_lengths, parse_script, \
+    load_script
+from dcs5.simulator.simulator import BoardSimulator, SimulatorStats
+from dcs5.simulator.faults import FaultInjector, FaultySocket, Fault, FaultStats
@@ -0,0 +1,164 @@
+"""
+This module contains the firmware model of the virtual board.
+
+The VirtualBoard does no I/O: `handle_command` returns the messages the firmware sends in reply to a command and
+`length`, `swipe` and `key` return the messages sent when the board is used. Messages are returned without their
+delimiter (`\r`).
+"""
+from dataclasses import dataclass, field
+from typing import *
+
+from dcs5.protocol import BOARD_INTERFACES, INIT_FLAG_MESSAGE, REBOOT_MESSAGE
+
+BOARD_MODELS = ['xt', 'micro']
+FIRMWARE = '0200'  # v2.0.0
+CHARGING_TIME_TO_EMPTY = 65535  # micro: time to empty reported while charging.
+
+
+@dataclass
+class BoardState:
+    """Firmware settings and sensors of the virtual board."""
+    interface: int = 0
+    stylus_status_msg: bool = True
+    stylus_settling_delay: int = 1
+    stylus_max_deviation: int = 6
+    number_of_reading: int = 5
+    backlighting_level: int = 0
+    key_backlighting_levels: Dict[int, int] = field(default_factory=dict)
+    fuel_gauge: str = '0'
+    battery_level: int = 80
+    charging: bool = False
+    time_to_empty: int = 600  # micro (minutes)
+    temperature: int = 22
+    humidity: int = 40
+    calibrated: bool = True
+    cal_pts: Dict[int, int] = field(default_factory=lambda: {1: 100, 2: 600})
+    calibration_pt: int = None  # Point being calibrated (calibration mode).
+
+
+class VirtualBoard:
+    def __init__(self, model: str = 'xt', firmware: str = FIRMWARE, state: BoardState = None):
+        """
+        Parameters
+        ----------
+        model :
+            Control box model: 'xt' or 'micro'.
+        firmware :
+            Firmware version as reported by `b#` (e.g. '0200' for v2.0.0).
+        state :
+            Initial state. Defaults to a calibrated board with the firmware default settings.
+        """
+        if model not in BOARD_MODELS:
+            raise ValueError(f'Invalid board model: {model}. Must be in {BOARD_MODELS}')
+        self.model = model
+        self.firmware = firmware
+        self.state = state or BoardState()
+        self.reboot_requested = False
+        self.unknown_commands = 0
+
+    def handle_command(self, command: str) -> List[str]:
+        """Returns the reply messages of `command` (e.g. `&a#`). Commands without reply return an empty list."""
+        body = command.strip()
+        if body.startswith('&'):
+            body = body[1:]
+        if body.endswith('#'):
+            body = body[:-1]
+        tag, _, args = body.partition(',')
+        try:
+            if (replies := self._reply(tag, args)) is not None:
+                return replies
+        except ValueError:  # Invalid arguments.
+            pass
+        self.unknown_commands += 1
+        return []
+
+    def _reply(self, tag: str, args: str) -> Optional[List[str]]:
+        state = self.state
+        match tag:
+            case 'a':
+                return ['%a#']
+            case 'b':
+                return [f'%b:DCS5,{self.firmware},{self.model.upper()}#']
+            case 'q':
+                return [f'%q:{state.battery_level},{int(state.charging)}#']
+            case 'qe' if self.model == 'micro':
+                return [f'%qe:{CHARGING_TIME_TO_EMPTY if state.charging else state.time_to_empty}#']
+            case 't':
+                return [f'%t,{state.temperature},{state.humidity}#']
+            case 'u':
+                return [f'%u:{int(state.calibrated)}#']
+            case 'pl' if args.isdigit() and int(args) in BOARD_INTERFACES:
+                state.interface = int(args)
+                return [f'HostApp={BOARD_INTERFACES[state.interface]}', f'%pl,{args}#']
+            case 'sn' if args in ('0', '1'):
+                state.stylus_status_msg = args == '1'
+                return [f'%sn:{args}#']
+            case 'di' | 'dm' | 'dn' if args.isdigit():
+                setattr(state, {'di': 'stylus_settling_delay', 'dm': 'stylus_max_deviation',
+                                'dn': 'number_of_reading'}[tag], int(args))
+                return [f'%{tag}:{args}#']
+            case 'la' if args.isdigit():
+                state.backlighting_level = int(args)
+                return [f'%la,{args}#']
+            case 'lk':
+                level, key = map(int, args.split(','))
+                state.key_backlighting_levels[key] = level
+                return [f'%lk,{args}#']
+            case 'lf':
+                state.fuel_gauge = args
+                return [f'%lf,{args}#']
+            case 'lt':
+                return [f'%lt,{args}#']
+            case 'ra':
+                return ['%ra#']
+            case 'init':
+                self.state = BoardState()
+                self.reboot_requested = True
+                return [INIT_FLAG_MESSAGE, REBOOT_MESSAGE]
+            case 'cr':
+                m1, m2, *_ = map(int, args.split(','))
+                state.cal_pts = {1: m1, 2: m2}
+                state.calibrated = True
+                return []
+            case 'ca':
+                state.calibrated = False
+                return []
+            case _ if tag.endswith('mm') and tag[:-2] in ('1', '2') and args.isdigit():
+                state.cal_pts[int(tag[:-2])] = int(args)
+                return [f'%{tag},{args}#']
+            case '1r' | '2r':
+                state.calibration_pt = int(tag[0])
+                return [f'&{tag}#']
+        return None
+
+    def length(self, value: int) -> List[str]:
+        """Stylus set down at `value` mm. Completes the calibration in calibration mode."""
+        if self.state.calibration_pt is not None:
+            return self.end_calibration(True)
+        return self._stylus_messages([f'%l,{value}#'])
+
+    def swipe(self, position: int, distance: int = 50) -> List[str]:
+        """Stylus swiped over `distance` mm, lifted at `position` mm."""
+        return self._stylus_messages([f'%s,{distance}#', f'%l,{position}#'])
+
+    def key(self, key: str) -> List[str]:
+        """Control box key (devices specification key id, e.g. '25' for the xt `enter` key or '1' for the micro `a1`
+        key). The xt sends `%k,<key>#` and the micro `%hs,<key>#`."""
+        if self.model == 'micro':
+            return [f'%hs,{key}#']
+        return [f'%k,{key}#']
+
+    def end_calibration(self, calibrated: bool = True) -> List[str]:
+        """Leave the calibration mode: point calibrated (`&<pt>c#`) or calibration exited (`&<pt>e#`)."""
+        if (pt := self.state.calibration_pt) is None:
+            return []
+        self.state.calibration_pt = None
+        if calibrated:
+            self.state.calibrated = True
+        return [f'&{pt}{"c" if calibrated else "e"}#']
+
+    def _stylus_messages(self, messages: List[str]) -> List[str]:
+        """Stylus down and up messages are sent around the measurement if the stylus status messages are enabled."""
+        if self.state.stylus_status_msg:
+            return ['%t,1#', *messages, '%t,0#']
+        return messages
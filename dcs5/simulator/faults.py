@@ -0,0 +1,354 @@
+"""
+This module contains the FaultInjector: a transport wrapper injecting scripted faults between a BluetoothClient and
+the board (or the BoardSimulator).
+
+The client sockets are wrapped by the injector: `client.socket_wrapper = injector.wrap` wraps every socket made by
+the client (connections and reconnections), `injector.wrap(sock, connected=True)` wraps an already connected socket
+(`BluetoothClient.attach`). Once connected, a wrapped socket is a proxy: the client reads and writes one end of a
+socket pair and the injector thread relays the frames (board messages end with `\r`, commands with `#`) to and from
+the actual socket, applying the faults on the way.
+
+Faults:
+    delay     : frames are delivered `duration` seconds late (the stream order is kept).
+    drop      : frames are discarded.
+    duplicate : frames are delivered twice.
+    split     : frames are delivered in two halves, `duration` seconds apart.
+    stall     : nothing is delivered for `duration` seconds. If `duration` is None, the frames are discarded until the
+                connection is closed (e.g. board out of range without link supervision timeout).
+    reset     : the connection is closed (the client reads an end of stream).
+    error     : the next client `recv` (receive) or `sendall` (send) raises OSError(`errno`).
+    refuse    : connection attempts raise OSError(`errno`) for `duration` seconds.
+
+The frame faults (delay, drop, duplicate, split) apply to the next `count` frames (every frame if None) of their
+`direction` containing `match` (any frame if None), across reconnections. Stalls, resets and errors apply to the
+current connection.
+
+The errno values are the ones handled by `BluetoothClient._process_os_error_code`, e.g.:
+    104 (connection reset), 110 (timed out) : Connection broken
+    111 (connection refused) : Device unavailable
+    112 (host down) : Device not found
+    113 (no route to host) : Bluetooth turned off
+"""
+import errno as errno_codes
+import logging
+import os
+import selectors
+import socket
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import *
+
+from dcs5.protocol import BOARD_MESSAGE_DELIMITER, BOARD_MSG_ENCODING
+from dcs5.selector_loop import SelectorLoop
+
+FAULT_KINDS = ['delay', 'drop', 'duplicate', 'split', 'stall', 'reset', 'error', 'refuse']
+FRAME_FAULT_KINDS = ['delay', 'drop', 'duplicate', 'split']
+DIRECTIONS = ['receive', 'send']  # receive: board to client, send: client to board.
+
+FRAME_DELIMITERS = {'receive': BOARD_MESSAGE_DELIMITER.encode(BOARD_MSG_ENCODING), 'send': b'#'}
+RECEIVE_SIZE = 4096
+RELAY_TIMEOUT = 1  # seconds to write a frame before the connection is closed.
+
+
+@dataclass(frozen=True)
+class Fault:
+    """See the module docstring for the meaning of the fields for each kind of fault."""
+    kind: str
+    direction: str = 'receive'
+    duration: float = 0
+    count: int = 1
+    match: str = None
+    errno: int = None
+
+    def __post_init__(self):
+        if self.kind not in FAULT_KINDS:
+            raise ValueError(f'Invalid fault kind: {self.kind}. Must be in {FAULT_KINDS}')
+        if self.direction not in DIRECTIONS:
+            raise ValueError(f'Invalid fault direction: {self.direction}. Must be in {DIRECTIONS}')
+
+
+def delay(duration: float, count: int = 1, direction: str = 'receive', match: str = None) -> Fault:
+    return Fault('delay', direction, duration, count, match)
+
+
+def drop(count: int = 1, direction: str = 'receive', match: str = None) -> Fault:
+    return Fault('drop', direction, count=count, match=match)
+
+
+def duplicate(count: int = 1, direction: str = 'receive', match: str = None) -> Fault:
+    return Fault('duplicate', direction, count=count, match=match)
+
+
+def split(duration: float, count: int = 1, direction: str = 'receive', match: str = None) -> Fault:
+    return Fault('split', direction, duration, count, match)
+
+
+def stall(duration: Optional[float], direction: str = 'receive') -> Fault:
+    return Fault('stall', direction, duration)
+
+
+def reset() -> Fault:
+    return Fault('reset')
+
+
+def error(errno: int = errno_codes.ECONNRESET, direction: str = 'receive') -> Fault:
+    return Fault('error', direction, errno=errno)
+
+
+def refuse(duration: float, errno: int = errno_codes.ECONNREFUSED) -> Fault:
+    return Fault('refuse', duration=duration, errno=errno)
+
+
+@dataclass
+class FaultStats:
+    connections: int = 0
+    frames: int = 0  # frames relayed (both directions)
+    delayed: int = 0
+    dropped: int = 0  # frames dropped by a `drop` fault or a stall without end.
+    duplicated: int = 0
+    split: int = 0
+    stalls: int = 0
+    resets: int = 0
+    errors: int = 0  # OSError raised to the client.
+    refused: int = 0  # connection attempts refused.
+
+
+class FaultySocket:
+    """Socket wrapper returned by `FaultInjector.wrap`. Implements the socket methods used by the BluetoothClient."""
+
+    def __init__(self, sock: socket.socket, injector: 'FaultInjector'):
+        self.injector = injector
+        self.remote = sock
+        self.client_end: socket.socket = None
+        self.proxy_end: socket.socket = None
+        self.pending_errors: Dict[str, OSError] = {}  # direction -> error raised by the next recv or sendall
+        self.buffers = {direction: bytearray() for direction in DIRECTIONS}
+        self.release_time = {direction: 0 for direction in DIRECTIONS}  # frames are not delivered before.
+        self.discard = set()  # directions stalled until the connection is closed.
+        self.is_closed = False
+        self._timeout = sock.gettimeout()
+
+    def connect(self, address: tuple):
+        if (refused := self.injector.refused_error()) is not None:
+            raise refused
+        self.remote.connect(address)
+        self.start()
+
+    def start(self):
+        """Start relaying the connected socket."""
+        self.client_end, self.proxy_end = socket.socketpair()
+        self.client_end.settimeout(self._timeout)
+        self.proxy_end.settimeout(RELAY_TIMEOUT)
+        self.remote.settimeout(RELAY_TIMEOUT)
+        self.injector.add_connection(self)
+
+    def fileno(self) -> int:
+        return (self.client_end or self.remote).fileno()
+
+    def settimeout(self, value: Optional[float]):
+        self._timeout = value
+        (self.client_end or self.remote).settimeout(value)
+
+    def gettimeout(self) -> Optional[float]:
+        return self._timeout
+
+    def getsockname(self):
+        return self.remote.getsockname()
+
+    def recv(self, size: int) -> bytes:
+        self._raise_pending_error('receive')
+        return self.client_end.recv(size)
+
+    def sendall(self, data: bytes):
+        self._raise_pending_error('send')
+        self.client_end.sendall(data)
+
+    def close(self):
+        if self.client_end is None:
+            self.remote.close()
+        else:
+            self.client_end.close()  # The injector closes the relay on the end of stream.
+
+    def _raise_pending_error(self, direction: str):
+        if (err := self.pending_errors.pop(direction, None)) is not None:
+            raise err
+
+
+class FaultInjector:
+    def __init__(self):
+        self.stats = FaultStats()
+        self.connections: List[FaultySocket] = []
+        self.rules: List[List] = []  # [fault, remaining frames (None: every frame)] of the frame faults.
+        self.refuse_until = 0
+        self.refuse_errno: int = None
+        self.injected: List[Tuple[float, Fault]] = []  # (time.monotonic(), fault)
+
+        self._lock = threading.Lock()  # Rules and connection refusal (read by the client threads).
+        self.loop = SelectorLoop('fault injector', on_stop=self._on_stop)
+
+    def wrap(self, sock: socket.socket, connected: bool = False) -> FaultySocket:
+        """Wrap a client socket. A connected socket is relayed right away, otherwise once `connect` succeeds."""
+        faulty = FaultySocket(sock, self)
+        if connected:
+            faulty.start()
+        return faulty
+
+    def inject(self, *faults: Fault):
+        """Apply the faults now. Returns once they are applied."""
+        self.play([(0, fault) for fault in faults]).result()
+
+    def play(self, script: Iterable[Tuple[float, Fault]]) -> Future:
+        """Apply each fault `(delay, fault)` `delay` seconds from now. Returns a Future resolved after the last one."""
+        done = Future()
+        now = time.monotonic()
+        last = now
+        for offset, fault in script:
+            last = max(last, now + offset)
+            self.loop.call_at(now + offset, lambda _fault=fault: self._inject(_fault))
+        self.loop.call_at(last, lambda: done.set_result(None))
+        return done
+
+    def clear(self):
+        """Remove the remaining frame faults and the connection refusal."""
+        with self._lock:
+            self.rules.clear()
+            self.refuse_until = 0
+
+    def refused_error(self) -> Optional[OSError]:
+        """Error raised by a connection attempt, if the connections are refused."""
+        with self._lock:
+            if time.monotonic() >= self.refuse_until:
+                return None
+            self.stats.refused += 1
+            return OSError(self.refuse_errno, os.strerror(self.refuse_errno))
+
+    def add_connection(self, connection: FaultySocket):
+        self.loop.call(self._add_connection, connection)
+
+    def close(self):
+        self.loop.close()
+
+    ### INJECTOR THREAD ###
+
+    def _on_stop(self):
+        for connection in list(self.connections):
+            self._close_connection(connection)
+
+    def _add_connection(self, connection: FaultySocket):
+        self.connections.append(connection)
+        self.stats.connections += 1
+        self.loop.register(connection.remote, selectors.EVENT_READ, lambda *_: self._on_data(connection, 'receive'))
+        self.loop.register(connection.proxy_end, selectors.EVENT_READ, lambda *_: self._on_data(connection, 'send'))
+
+    def _close_connection(self, connection: FaultySocket):
+        if connection.is_closed:
+            return
+        connection.is_closed = True
+        self.connections.remove(connection)
+        for sock in (connection.remote, connection.proxy_end):
+            self.loop.unregister(sock)
+            sock.close()
+
+    def _inject(self, fault: Fault):
+        self.injected.append((time.monotonic(), fault))
+        logging.info(f'Fault injected: {fault}')
+        match fault.kind:
+            case kind if kind in FRAME_FAULT_KINDS:
+                with self._lock:
+                    self.rules.append([fault, fault.count])
+            case 'refuse':
+                with self._lock:
+                    self.refuse_until = time.monotonic() + fault.duration
+                    self.refuse_errno = fault.errno
+            case 'stall':
+                self.stats.stalls += 1
+                for connection in self.connections:
+                    if fault.duration is None:
+                        connection.discard.add(fault.direction)
+                    else:
+                        connection.release_time[fault.direction] = max(connection.release_time[fault.direction],
+                                                                       time.monotonic() + fault.duration)
+            case 'reset':
+                self.stats.resets += 1
+                for connection in list(self.connections):
+                    self._close_connection(connection)
+            case 'error':
+                for connection in self.connections:
+                    connection.pending_errors[fault.direction] = OSError(fault.errno, os.strerror(fault.errno))
+                    self.stats.errors += 1
+                    if fault.direction == 'receive':  # Wakes up the client to read the error.
+                        self._write(connection, 'receive', b'\x00')
+
+    def _on_data(self, connection: FaultySocket, direction: str):
+        source = connection.remote if direction == 'receive' else connection.proxy_end
+        try:
+            data = source.recv(RECEIVE_SIZE)
+        except OSError:
+            data = b''
+        if not data:
+            self._close_connection(connection)
+            return
+        buffer = connection.buffers[direction]
+        buffer += data
+        *frames, remainder = buffer.split(FRAME_DELIMITERS[direction])
+        connection.buffers[direction] = bytearray(remainder)
+        for frame in frames:
+            self._relay(connection, direction, bytes(frame) + FRAME_DELIMITERS[direction])
+
+    def _relay(self, connection: FaultySocket, direction: str, frame: bytes):
+        self.stats.frames += 1
+        if direction in connection.discard:
+            self.stats.dropped += 1
+            return
+        copies, extra_delay, split_delay = 1, 0, None
+        for fault in self._matching_faults(direction, frame):
+            match fault.kind:
+                case 'drop':
+                    copies = 0
+                case 'duplicate':
+                    copies += 1
+                case 'delay':
+                    extra_delay += fault.duration
+                case 'split':
+                    split_delay = fault.duration
+        if copies == 0:
+            self.stats.dropped += 1
+            return
+        self.stats.duplicated += copies - 1
+        if extra_delay > 0:
+            self.stats.delayed += 1
+
+        due = max(time.monotonic() + extra_delay, connection.release_time[direction])
+        if split_delay is not None and len(frame) > 1:
+            self.stats.split += 1
+            half = len(frame) // 2
+            parts = [(due, frame[:half]), (due + split_delay, frame[half:] + frame * (copies - 1))]
+        else:
+            parts = [(due, frame * copies)]
+        connection.release_time[direction] = parts[-1][0]
+        for part_due, part in parts:
+            self.loop.call_at(part_due, lambda _part=part: self._write(connection, direction, _part))
+
+    def _matching_faults(self, direction: str, frame: bytes) -> List[Fault]:
+        """Frame faults applying to `frame`. Their remaining counts are decremented."""
+        faults = []
+        text = frame.decode(BOARD_MSG_ENCODING, errors='replace')
+        with self._lock:
+            for rule in self.rules:
+                fault, remaining = rule
+                if fault.direction == direction and (fault.match is None or fault.match in text):
+                    faults.append(fault)
+                    if remaining is not None:
+                        rule[1] = remaining - 1
+            self.rules = [rule for rule in self.rules if rule[1] is None or rule[1] > 0]
+        return faults
+
+    def _write(self, connection: FaultySocket, direction: str, data: bytes):
+        if connection.is_closed:
+            return
+        try:
+            (connection.proxy_end if direction == 'receive' else connection.remote).sendall(data)
+        except OSError:
+            self._close_connection(connection)
@@ -0,0 +1,83 @@
+"""
+This module contains the scripted input streams of the simulator (lengths, swipes and keys).
+
+Scripts are lists of StreamEvent played by the BoardSimulator at a fixed rate. They are built with the functions of
+this module or parsed from a text script (one event per line, lines starting with `#` are comments):
+
+    length 372          stylus set down at 372 mm
+    swipe 300 [50]      swipe over 50 mm (default) lifted at 300 mm
+    key 25              control box key 25
+    wait 0.5            pause of 0.5 seconds (in addition to the rate interval)
+    raw &1e#            message sent as is
+"""
+import random
+from dataclasses import dataclass
+from pathlib import Path
+from typing import *
+
+STREAM_EVENT_KINDS = ['length', 'swipe', 'key', 'wait', 'raw']
+
+
+@dataclass(frozen=True)
+class StreamEvent:
+    """`value`: length or position (mm), key id, wait duration (seconds) or raw message.
+    `distance`: swipe distance (mm)."""
+    kind: str
+    value: Any
+    distance: int = None
+
+
+def length(value: int) -> StreamEvent:
+    return StreamEvent('length', value)
+
+
+def swipe(position: int, distance: int = 50) -> StreamEvent:
+    return StreamEvent('swipe', position, distance)
+
+
+def key(key_id: str) -> StreamEvent:
+    return StreamEvent('key', key_id)
+
+
+def wait(seconds: float) -> StreamEvent:
+    return StreamEvent('wait', seconds)
+
+
+def raw(message: str) -> StreamEvent:
+    return StreamEvent('raw', message)
+
+
+def random_lengths(count: int, low: int = 100, high: int = 800, seed: int = None) -> List[StreamEvent]:
+    """`count` lengths uniformly distributed in [low, high] mm. Reproducible with `seed`."""
+    generator = random.Random(seed)
+    return [length(generator.randint(low, high)) for _ in range(count)]
+
+
+def parse_script(text: str) -> List[StreamEvent]:
+    events = []
+    for line_number, line in enumerate(text.splitlines(), 1):
+        if not (line := line.strip()) or line.startswith('#'):
+            continue
+        kind, *args = line.split()
+        try:
+            match kind:
+                case 'length':
+                    events.append(length(int(args[0])))
+                case 'swipe':
+                    events.append(swipe(int(args[0]), *map(int, args[1:2])))
+                case 'key':
+                    events.append(key(args[0]))
+                case 'wait':
+                    events.append(wait(float(args[0])))
+                case 'raw':
+                    events.append(raw(args[0]))
+                case _:
+                    raise ValueError(f'unknown event `{kind}`. Must be in {STREAM_EVENT_KINDS}')
+        except (IndexError, ValueError) as err:
+            raise ValueError(f'Invalid script line {line_number}: `{line}` ({err})')
+    return events
+
+
+def load_script(path: Union[str, Path]) -> List[StreamEvent]:
+    with open(path, 'r', encoding='utf-8') as file:
+        return parse_script(file.read())
@@ -0,0 +1,262 @@
+"""
+This module contains the BoardSimulator: a VirtualBoard served over a socket pair, a local TCP port or a pty.
+
+The simulator thread reads the commands (`#` terminated), and sends the replies of the VirtualBoard after the reply
+latency. Like the firmware, commands are processed one at a time: a reply is sent `latency` (+ jitter) seconds after
+the previous reply or the reception of its command, whichever is later. Scripted streams (see scripts) are played
+by the same thread at a fixed rate. The thread is a SelectorLoop (see selector_loop).
+
+Transports:
+    socketpair : `connect_socketpair()` returns the controller end (`BluetoothClient.attach`).
+    tcp : `listen()` accepts one connection at a time. With `TcpClient(base_port)`, listen on `base_port + 1`
+        (RFCOMM port 1).
+    pty : `open_pty()` returns the path of the pseudo-terminal (Unix).
+
+Messages sent while no connection is open are dropped.
+"""
+import logging
+import os
+import random
+import selectors
+import socket
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import *
+
+from dcs5.protocol import BOARD_MESSAGE_DELIMITER, BOARD_MSG_ENCODING
+from dcs5.selector_loop import SelectorLoop
+from dcs5.simulator.board import VirtualBoard
+from dcs5.simulator.scripts import StreamEvent
+
+SIMULATOR_HOST = '127.0.0.1'
+RECEIVE_SIZE = 4096
+REBOOT_DELAY = 2  # seconds. The connection is closed after the board initialization (`&init#`).
+RECEIVED_COMMANDS_SIZE = 1000  # received commands kept in `received`
+
+
+@dataclass
+class SimulatorStats:
+    connections: int = 0
+    commands: int = 0
+    replies: int = 0  # messages sent in reply to commands
+    stream_events: int = 0
+    messages: int = 0  # messages sent
+    dropped: int = 0  # messages dropped (no connection)
+
+
+class SocketConnection:
+    def __init__(self, sock: socket.socket):
+        self.socket = sock
+
+    def fileno(self) -> int:
+        return self.socket.fileno()
+
+    def recv(self) -> bytes:
+        try:
+            return self.socket.recv(RECEIVE_SIZE)
+        except OSError:
+            return b''
+
+    def send(self, data: bytes):
+        self.socket.sendall(data)
+
+    def close(self):
+        self.socket.close()
+
+
+class PtyConnection:
+    """Master end of a pseudo-terminal. The slave end is kept open so that clients can open and close it."""
+    def __init__(self):
+        import tty
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)  # No echo and no line ending translation.
+        self.path = os.ttyname(self.slave)
+
+    def fileno(self) -> int:
+        return self.master
+
+    def recv(self) -> bytes:
+        try:
+            return os.read(self.master, RECEIVE_SIZE)
+        except OSError:
+            return b''
+
+    def send(self, data: bytes):
+        with memoryview(data) as view:
+            while view:
+                view = view[os.write(self.master, view):]
+
+    def close(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+
+class BoardSimulator:
+    def __init__(self, board: VirtualBoard = None, latency: float = 0, jitter: float = 0, seed: int = None,
+                 auto_calibration: float = None):
+        """
+        Parameters
+        ----------
+        board :
+            Defaults to an xt VirtualBoard.
+        latency :
+            Seconds taken by the board to process a command.
+        jitter :
+            Random additional latency in seconds (uniform in [0, jitter]). Reproducible with `seed`.
+        auto_calibration :
+            If not None, calibrations (`&<pt>r#`) complete after `auto_calibration` seconds. Otherwise, they complete
+            on the next scripted length (stylus set down) or with `end_calibration`.
+        """
+        self.board = board or VirtualBoard()
+        self.latency = latency
+        self.jitter = jitter
+        self.auto_calibration = auto_calibration
+        self.random = random.Random(seed)
+        self.stats = SimulatorStats()
+        self.received: Deque[str] = deque(maxlen=RECEIVED_COMMANDS_SIZE)
+
+        self.connection: Union[SocketConnection, PtyConnection] = None
+        self.server: socket.socket = None
+        self._buffer = bytearray()
+        self._busy_until = 0  # The board processes the commands one at a time.
+
+        self.loop = SelectorLoop('board simulator', on_stop=self._on_stop)
+
+    ### TRANSPORTS ###
+
+    def connect_socketpair(self) -> socket.socket:
+        """Returns the controller end of a socket pair connected to the simulator."""
+        controller_end, board_end = socket.socketpair()
+        self.loop.call(self._set_connection, SocketConnection(board_end))
+        return controller_end
+
+    def listen(self, host: str = SIMULATOR_HOST, port: int = 0) -> Tuple[str, int]:
+        """Accept tcp connections on `host:port` (a free port if 0). A new connection replaces the previous one."""
+        self.server = socket.create_server((host, port))
+        self.server.setblocking(False)
+        self.loop.call(self.loop.register, self.server, selectors.EVENT_READ, self._on_server)
+        address = self.server.getsockname()
+        logging.info(f'Board simulator listening on {address[0]}:{address[1]}.')
+        return address
+
+    def open_pty(self) -> str:
+        """Serve the simulator on a pseudo-terminal. Returns its path (e.g. /dev/pts/3)."""
+        connection = PtyConnection()
+        self.loop.call(self._set_connection, connection)
+        logging.info(f'Board simulator on {connection.path}.')
+        return connection.path
+
+    ### STREAMS ###
+
+    def play(self, events: Iterable[StreamEvent], rate: float = 1) -> Future:
+        """Play the events, `rate` events per second. Returns a Future resolved when the last event is sent."""
+        done = Future()
+        due = time.monotonic()
+        for event in events:
+            if event.kind == 'wait':
+                due += event.value
+                continue
+            due += 1 / rate
+            self.loop.call_at(due, lambda _event=event: self._play_event(_event))
+        self.loop.call_at(due, lambda: done.set_result(None))
+        return done
+
+    def send(self, *messages: str):
+        """Send messages as is (without delimiter) now."""
+        self.loop.call(self._send, list(messages))
+
+    def end_calibration(self, calibrated: bool = True):
+        """Leave the calibration mode (see VirtualBoard.end_calibration)."""
+        self.loop.call(lambda: self._send(self.board.end_calibration(calibrated)))
+
+    def drop_connection(self):
+        """Close the current connection (e.g. board turned off or out of range)."""
+        self.loop.call(self._close_connection)
+
+    def close(self):
+        self.loop.close()
+
+    ### SIMULATOR THREAD ###
+
+    def _on_stop(self):
+        self._close_connection()
+        if self.server is not None:
+            self.server.close()
+
+    def _on_server(self, server: socket.socket, mask: int):
+        try:
+            sock, address = server.accept()
+        except BlockingIOError:
+            return
+        logging.info(f'Board simulator: connection from {address}.')
+        self._set_connection(SocketConnection(sock))
+
+    def _set_connection(self, connection: Union[SocketConnection, PtyConnection]):
+        self._close_connection()
+        self.connection = connection
+        self._buffer.clear()
+        self.loop.register(connection, selectors.EVENT_READ, self._on_data)
+        self.stats.connections += 1
+
+    def _close_connection(self):
+        if self.connection is not None:
+            self.loop.unregister(self.connection)
+            self.connection.close()
+            self.connection = None
+
+    def _on_data(self, connection: Union[SocketConnection, PtyConnection], mask: int):
+        if not (data := connection.recv()):
+            logging.info('Board simulator: connection closed.')
+            self._close_connection()
+            return
+        self._buffer += data
+        *commands, remainder = self._buffer.split(b'#')
+        self._buffer = bytearray(remainder)
+        now = time.monotonic()
+        for command in commands:
+            if command := (command + b'#').decode(BOARD_MSG_ENCODING, errors='replace').strip():
+                self.received.append(command)
+                self.stats.commands += 1
+                self._busy_until = max(now, self._busy_until) + self.latency + self.random.uniform(0, self.jitter)
+                self.loop.call_at(self._busy_until, lambda _command=command: self._reply(_command))
+
+    def _reply(self, command: str):
+        calibrating = self.board.state.calibration_pt is not None
+        messages = self.board.handle_command(command)
+        self.stats.replies += len(messages)
+        self._send(messages)
+        if self.board.reboot_requested:
+            self.board.reboot_requested = False
+            self.loop.call_at(time.monotonic() + REBOOT_DELAY, self._close_connection)
+        elif self.auto_calibration is not None and not calibrating and self.board.state.calibration_pt is not None:
+            self.loop.call_at(time.monotonic() + self.auto_calibration,
+                              lambda: self._send(self.board.end_calibration(True)))
+
+    def _play_event(self, event: StreamEvent):
+        self.stats.stream_events += 1
+        match event.kind:
+            case 'length':
+                self._send(self.board.length(event.value))
+            case 'swipe':
+                self._send(self.board.swipe(event.value, event.distance))
+            case 'key':
+                self._send(self.board.key(event.value))
+            case 'raw':
+                self._send([event.value])
+
+    def _send(self, messages: List[str]):
+        if not messages:
+            return
+        if self.connection is None:
+            self.stats.dropped += len(messages)
+            return
+        data = ''.join(message + BOARD_MESSAGE_DELIMITER for message in messages).encode(BOARD_MSG_ENCODING)
+        try:
+            self.connection.send(data)
+            self.stats.messages += len(messages)
+        except OSError:
+            self.stats.dropped += len(messages)
+            self._close_connection()
@@ -15,5 +15,6 @@ setup(
     include_package_data=True,
     classifiers=["Programming Language :: Python :: 3"],
     python_requires="~=3.10",
+    entry_points={"console_scripts": ["dcs5=dcs5.cli:cli"]},
 )
 
@@ -0,0 +1,63 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from dcs5.bluetooth_client import TcpClient
+from dcs5.controller import Dcs5Controller
+from dcs5.controller_snapshot import load_snapshot
+from dcs5.simulator import BoardSimulator, VirtualBoard
+
+DEFAULT_CONFIGS = Path(__file__).resolve().parents[1].joinpath('dcs5/default_configs')
+DEVICES_SPECIFICATIONS_PATH = DEFAULT_CONFIGS.joinpath('xt_devices_specification.json')
+
+
+@pytest.fixture
+def simulator():
+    simulator = BoardSimulator(VirtualBoard('xt'))
+    yield simulator
+    simulator.close()
+
+
+@pytest.fixture
+def config_path(tmp_path, simulator):
+    host, _ = simulator.listen()
+    config = json.loads(DEFAULT_CONFIGS.joinpath('xt_controller_configuration.json').read_text())
+    config['launch_settings']['keyboard_backend'] = 'null'
+    config['client']['mac_address'] = host
+    path = tmp_path.joinpath('controller_configuration.json')
+    path.write_text(json.dumps(config))
+    return path
+
+
+def make_controller(config_path: Path, snapshot_path: Path, simulator: BoardSimulator) -> Dcs5Controller:
+    _, port = simulator.server.getsockname()
+    return Dcs5Controller(config_path, DEVICES_SPECIFICATIONS_PATH, snapshot_path=snapshot_path,
+                          client=TcpClient(base_port=port - 1))
+
+
+def test_backlight_restored_from_snapshot_on_connect(tmp_path, config_path, simulator):
+    snapshot_path = tmp_path.joinpath('snapshot.json')
+    launch_backlight = json.loads(config_path.read_text())['launch_settings']['backlighting_level']
+
+    controller = make_controller(config_path, snapshot_path, simulator)
+    controller.connect()
+    assert controller.is_sync
+    assert simulator.board.state.backlighting_level == launch_backlight
+    controller.c_set_backlighting_level(40).result(timeout=5)
+    controller.close_client()
+    assert load_snapshot(snapshot_path).runtime_settings.backlighting_level == 40
+
+    simulator.board.state.backlighting_level = launch_backlight  # e.g. the board was power cycled.
+    controller = make_controller(config_path, snapshot_path, simulator)
+    controller.connect()
+    try:
+        assert controller.is_sync
+        assert controller.persistent_backlight_level == 40
+        assert controller.internal_board_state.backlighting_level == 40
+        assert simulator.board.state.backlighting_level == 40
+
+        controller.init_controller_and_board(full=True)  # Later full syncs use the launch settings.
+        assert simulator.board.state.backlighting_level == launch_backlight
+    finally:
+        controller.close_client()